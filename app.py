@@ -26,6 +26,10 @@ for var in required_vars:
 
 app.secret_key = os.environ.get("SESSION_SECRET")
 
+# Large file downloads can be offloaded to the front-end server
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
+app.config["BACKUP_ACCEL_REDIRECT"] = os.environ.get("BACKUP_ACCEL_REDIRECT")
+
 try:
     logger.info("Initializing database...")
     init_db(app)
@@ -78,6 +82,26 @@ try:
             db.create_all()
             logger.info("Database tables created successfully")
 
+            # Start background jobs
+            from utils.stats_rollup import stats_rollup
+            from utils.platform_counters import platform_counters
+            from utils.audit_log import audit_writer
+            from utils.activity_archive import activity_archiver
+            from utils.catalog_cache import catalog_cache
+            from utils.service_search import service_search
+            from utils.system_sampler import system_sampler
+            from utils.offsite_replication import offsite_replicator
+            # Registers the listeners that invalidate cached settings on commit
+            import utils.settings_cache  # noqa: F401
+            stats_rollup.start(app)
+            platform_counters.start(app)
+            audit_writer.start(app)
+            activity_archiver.start(app)
+            offsite_replicator.start(app)
+            system_sampler.start()
+            catalog_cache.warm()
+            service_search.warm()
+
         except Exception as e:
             logger.error(f"Error during blueprint registration: {str(e)}")
             logger.error(traceback.format_exc())
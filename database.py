@@ -1,17 +1,190 @@
+import itertools
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import sqlalchemy as sa
+from flask import has_request_context, request, session as flask_session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase
 
+from db_pool import engine_options, pool_stats
+
+logger = logging.getLogger(__name__)
+
+REPLICA_PREFIX = 'replica_'
+_STICKY_KEY = '_db_primary_until'
+_READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Seconds a PostgreSQL standby is behind; 0 when it has replayed everything it received
+_PG_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+
+class ReplicaRouter:
+    """Pick a read replica that is up and not too far behind the primary
+
+    Replicas come from ``DATABASE_REPLICA_URLS`` (comma separated) and are
+    registered as ``replica_<n>`` binds. Each one's lag is measured at most
+    every ``REPLICA_CHECK_INTERVAL`` seconds; replicas more than
+    ``REPLICA_MAX_LAG`` seconds behind, or that failed their last check or a
+    query with a disconnect, are skipped until the next check. When none is
+    usable reads go to the primary.
+    """
+
+    def __init__(self):
+        self.max_lag = float(os.environ.get('REPLICA_MAX_LAG', 5))
+        self.check_interval = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))
+        self.sticky_seconds = float(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+        self._state: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def replica_keys(self) -> List[str]:
+        return sorted(key for key in db.engines if key and key.startswith(REPLICA_PREFIX))
+
+    def measure_lag(self, engine) -> float:
+        with engine.connect() as connection:
+            if engine.dialect.name == 'postgresql':
+                return float(connection.execute(sa.text(_PG_LAG_QUERY)).scalar() or 0)
+            # Nothing to measure without streaming replication, e.g. two local SQLite files
+            connection.execute(sa.text('SELECT 1'))
+            return 0.0
+
+    def _check(self, key: str) -> dict:
+        state = {'checked_at': time.monotonic(), 'lag': None, 'healthy': False}
+        try:
+            state['lag'] = self.measure_lag(db.engines[key])
+            state['healthy'] = state['lag'] <= self.max_lag
+            if not state['healthy']:
+                logger.warning(f"Replica {key} is {state['lag']:.1f}s behind, reading from the primary")
+        except Exception as e:
+            logger.warning(f"Replica {key} is unavailable: {str(e)}")
+        self._state[key] = state
+        return state
+
+    def choose(self):
+        """The engine for the next read, None when the primary should serve it"""
+        keys = self.replica_keys()
+        if not keys:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            healthy = []
+            for key in keys:
+                state = self._state.get(key)
+                if state is None or now - state['checked_at'] >= self.check_interval:
+                    state = self._check(key)
+                if state['healthy']:
+                    healthy.append(key)
+            if not healthy:
+                return None
+            return db.engines[healthy[next(self._turn) % len(healthy)]]
+
+    def mark_failed(self, engine) -> None:
+        with self._lock:
+            for key in self.replica_keys():
+                if db.engines[key] is engine:
+                    self._state[key] = {'checked_at': time.monotonic(), 'lag': None, 'healthy': False}
+
+    def status(self) -> Dict[str, dict]:
+        with self._lock:
+            return {key: {'lag': state['lag'], 'healthy': state['healthy']}
+                    for key, state in self._state.items()}
+
+
+class RoutingSession(Session):
+    """Send plain reads made while serving GET requests to a replica
+
+    Everything else uses the primary: flushes, INSERT/UPDATE/DELETE and raw
+    SQL, SELECT ... FOR UPDATE, work outside a request (background jobs,
+    scripts), reads in a session that has already written, and reads from a
+    client that wrote within the last ``REPLICA_STICKY_SECONDS`` so it sees
+    its own changes. ``use_primary()`` forces the primary for a block.
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self.primary_only = False
+        self.wrote = False
+
+    def _replica_allowed(self, clause) -> bool:
+        if self.primary_only or self.wrote or self._flushing:
+            return False
+        if not isinstance(clause, sa.sql.expression.SelectBase):
+            return False
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        if not has_request_context() or request.method not in _READ_METHODS:
+            return False
+        return flask_session.get(_STICKY_KEY, 0) < time.time()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._replica_allowed(clause):
+            engine = replica_router.choose()
+            if engine is not None:
+                return engine
+        if self._flushing or not isinstance(clause, sa.sql.expression.SelectBase):
+            self.wrote = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_to_primary(session):
+    # Keep this client's next reads on the primary until replicas have its write
+    if session.wrote and replica_router.replica_keys() and has_request_context():
+        flask_session[_STICKY_KEY] = time.time() + replica_router.sticky_seconds
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, e.g. right after another worker's write"""
+    session = db.session()
+    previous = session.primary_only
+    session.primary_only = True
+    try:
+        yield
+    finally:
+        session.primary_only = previous
+
+
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
+replica_router = ReplicaRouter()
+
 
 def init_db(app):
-    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-        "pool_recycle": 300,
-        "pool_pre_ping": True,
-    }
+    database_url = os.environ.get("DATABASE_URL")
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_url)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Optional read replicas, e.g. DATABASE_REPLICA_URLS=sqlite:///replica.db for local testing
+    replica_urls = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    if replica_urls:
+        app.config["SQLALCHEMY_BINDS"] = {f"{REPLICA_PREFIX}{i}": url for i, url in enumerate(replica_urls)}
     db.init_app(app)
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            pool_stats.register(key or 'primary', engine)
+        for key in replica_router.replica_keys():
+            event.listen(db.engines[key], 'handle_error', _replica_error)
+
+
+def _replica_error(context):
+    if context.is_disconnect and context.engine is not None:
+        replica_router.mark_failed(context.engine)
@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Sizing per kind of process, picked with DB_POOL_PROFILE
+POOL_PROFILES = {
+    # One request at a time; the extra room is for this process's background threads
+    'sync': {'pool_size': 2, 'max_overflow': 4, 'pool_timeout': 10},
+    # Roughly one connection per request thread, overflow absorbs bursts
+    'threaded': {'pool_size': 10, 'max_overflow': 5, 'pool_timeout': 30},
+    # Job runners: few connections, rather wait than open more
+    'background': {'pool_size': 2, 'max_overflow': 0, 'pool_timeout': 60},
+}
+
+
+def engine_options(database_url: str) -> dict:
+    """Engine options for the configured pool profile
+
+    Connections are not pinged on every checkout. They are replaced once
+    they are ``DB_POOL_RECYCLE`` seconds old, one that sat idle for more than
+    ``DB_POOL_PING_IDLE`` seconds is pinged before it is handed out, and a
+    disconnect error invalidates the pool so the next checkout reconnects.
+    ``DB_POOL_SIZE``, ``DB_MAX_OVERFLOW`` and ``DB_POOL_TIMEOUT`` override the
+    profile.
+    """
+    options = {
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 300)),
+        "pool_pre_ping": False,
+    }
+    if database_url.startswith("sqlite") and (":memory:" in database_url or database_url.rstrip("/") == "sqlite:"):
+        # In-memory SQLite keeps a single connection and takes no sizing options
+        return options
+
+    name = os.environ.get("DB_POOL_PROFILE", "threaded")
+    if name not in POOL_PROFILES:
+        logger.warning(f"Unknown DB_POOL_PROFILE {name}, using 'threaded'")
+        name = "threaded"
+    profile = dict(POOL_PROFILES[name])
+    for option, variable in (("pool_size", "DB_POOL_SIZE"), ("max_overflow", "DB_MAX_OVERFLOW"),
+                             ("pool_timeout", "DB_POOL_TIMEOUT")):
+        if os.environ.get(variable):
+            profile[option] = int(os.environ[variable])
+
+    options.update(profile)
+    options["poolclass"] = InstrumentedQueuePool
+    # Reusing the most recent connection lets the surplus ones idle out and recycle
+    options["pool_use_lifo"] = True
+    return options
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waited for a connection"""
+
+    stats_label = None
+    # Log under SQLAlchemy's namespace so its WARN default applies
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.QueuePool'
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.record_timeout(self.stats_label)
+            raise
+        pool_stats.record_wait(self.stats_label, time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats_label = self.stats_label
+        return pool
+
+
+class PoolStats:
+    """Checkout, wait and liveness numbers for every engine's pool"""
+
+    def __init__(self):
+        self.ping_idle = float(os.environ.get("DB_POOL_PING_IDLE", 60))
+        self._engines = {}
+        self._counters: Dict[str, dict] = {}
+        self._waits: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def _counter(self, label: str) -> dict:
+        return self._counters.setdefault(label, {
+            'checkouts': 0, 'connects': 0, 'invalidations': 0, 'timeouts': 0,
+            'idle_pings': 0, 'ping_failures': 0, 'wait_total': 0.0, 'wait_max': 0.0,
+        })
+
+    def register(self, label: str, engine) -> None:
+        """Start collecting for ``engine``'s pool under ``label``"""
+        if label in self._engines:
+            return
+        self._engines[label] = engine
+        engine.pool.stats_label = label
+        with self._lock:
+            self._counter(label)
+            self._waits[label] = deque(maxlen=1000)
+
+        @event.listens_for(engine, 'connect')
+        def _connect(dbapi_connection, connection_record):
+            self._bump(label, 'connects')
+
+        @event.listens_for(engine, 'checkout')
+        def _checkout(dbapi_connection, connection_record, connection_proxy):
+            self._bump(label, 'checkouts')
+            checked_in_at = connection_record.info.get('checked_in_at')
+            if checked_in_at is not None and time.monotonic() - checked_in_at > self.ping_idle:
+                self._ping(label, dbapi_connection)
+
+        @event.listens_for(engine, 'checkin')
+        def _checkin(dbapi_connection, connection_record):
+            connection_record.info['checked_in_at'] = time.monotonic()
+
+        @event.listens_for(engine, 'invalidate')
+        def _invalidate(dbapi_connection, connection_record, exception):
+            self._bump(label, 'invalidations')
+
+    def _ping(self, label: str, dbapi_connection) -> None:
+        self._bump(label, 'idle_pings')
+        try:
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+        except Exception as e:
+            self._bump(label, 'ping_failures')
+            logger.info(f"Idle connection in the {label} pool is dead, reconnecting: {str(e)}")
+            # Makes the pool discard this connection and retry with a fresh one
+            raise exc.DisconnectionError() from e
+
+    def _bump(self, label: str, key: str) -> None:
+        with self._lock:
+            self._counter(label)[key] += 1
+
+    def record_wait(self, label: str, seconds: float) -> None:
+        if label is None:
+            return
+        with self._lock:
+            counter = self._counter(label)
+            counter['wait_total'] += seconds
+            counter['wait_max'] = max(counter['wait_max'], seconds)
+            self._waits.setdefault(label, deque(maxlen=1000)).append(seconds)
+
+    def record_timeout(self, label: str) -> None:
+        if label is not None:
+            self._bump(label, 'timeouts')
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Current occupancy and totals per pool"""
+        result = {}
+        with self._lock:
+            counters = {label: dict(values) for label, values in self._counters.items()}
+            waits = {label: sorted(values) for label, values in self._waits.items()}
+        for label, engine in self._engines.items():
+            pool = engine.pool
+            values = counters.get(label, {})
+            recent = waits.get(label) or [0.0]
+            checkouts = values.get('checkouts', 0)
+            result[label] = {
+                'pool': type(pool).__name__,
+                'size': pool.size() if hasattr(pool, 'size') else None,
+                'in_use': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+                'idle': pool.checkedin() if hasattr(pool, 'checkedin') else None,
+                'overflow': max(pool.overflow(), 0) if hasattr(pool, 'overflow') else None,
+                'max_overflow': getattr(pool, '_max_overflow', None),
+                'checkouts': checkouts,
+                'connects': values.get('connects', 0),
+                'invalidations': values.get('invalidations', 0),
+                'timeouts': values.get('timeouts', 0),
+                'idle_pings': values.get('idle_pings', 0),
+                'ping_failures': values.get('ping_failures', 0),
+                'wait_avg_ms': round(values.get('wait_total', 0.0) * 1000 / checkouts, 3) if checkouts else 0.0,
+                'wait_p95_ms': round(recent[int(len(recent) * 0.95) - 1 if len(recent) > 1 else 0] * 1000, 3),
+                'wait_max_ms': round(values.get('wait_max', 0.0) * 1000, 3),
+            }
+        return result
+
+
+# Create singleton instance
+pool_stats = PoolStats()
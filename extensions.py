@@ -16,16 +16,20 @@ login_manager.login_message_category = 'info'
 
 # Import models here to avoid circular imports
 def init_extensions(app, db):
-    from models import User
+    from utils.user_cache import user_cache
+    from utils.query_stats import query_stats
+    from utils.fragment_cache import fragment_cache
 
     @login_manager.user_loader
     def load_user(user_id):
         try:
-            return User.query.get(int(user_id))
+            return user_cache.get(int(user_id))
         except Exception as e:
             app.logger.error(f"Error loading user {user_id}: {str(e)}")
             return None
 
     # Initialize extensions with app
     login_manager.init_app(app)
-    limiter.init_app(app)
\ No newline at end of file
+    limiter.init_app(app)
+    query_stats.init_app(app)
+    fragment_cache.init_app(app)
\ No newline at end of file
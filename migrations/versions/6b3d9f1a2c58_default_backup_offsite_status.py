@@ -0,0 +1,34 @@
+"""Default backup offsite status to pending
+
+Revision ID: 6b3d9f1a2c58
+Revises: f0c6d2b8e413
+Create Date: 2026-10-19 16:42:18.503917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b3d9f1a2c58'
+down_revision = 'f0c6d2b8e413'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backups taken before offsite replication existed have no status yet
+    op.execute("UPDATE backup SET offsite_status = 'pending' WHERE offsite_status IS NULL")
+    with op.batch_alter_table('backup', schema=None) as batch_op:
+        batch_op.alter_column('offsite_status',
+               existing_type=sa.String(length=20),
+               server_default='pending',
+               existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('backup', schema=None) as batch_op:
+        batch_op.alter_column('offsite_status',
+               existing_type=sa.String(length=20),
+               server_default=None,
+               existing_nullable=True)
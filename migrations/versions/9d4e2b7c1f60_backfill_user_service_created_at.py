@@ -0,0 +1,39 @@
+"""Backfill user and service created_at and make it required
+
+Revision ID: 9d4e2b7c1f60
+Revises: 6b3d9f1a2c58
+Create Date: 2026-10-19 18:05:41.227310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4e2b7c1f60'
+down_revision = '6b3d9f1a2c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The admin listings page by (created_at, id); a NULL there never matches the cursor
+    # predicate, so undated rows count as the oldest of their table
+    for table in ('user', 'service'):
+        op.execute(f"""
+            UPDATE "{table}" SET created_at = COALESCE(
+                (SELECT MIN(created_at) FROM "{table}"), CURRENT_TIMESTAMP)
+            WHERE created_at IS NULL
+        """)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at',
+                   existing_type=sa.DateTime(),
+                   nullable=False)
+
+
+def downgrade():
+    for table in ('service', 'user'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at',
+                   existing_type=sa.DateTime(),
+                   nullable=True)
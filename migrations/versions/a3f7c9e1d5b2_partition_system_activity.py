@@ -0,0 +1,127 @@
+"""Partition system activity by month and add activity archives
+
+Revision ID: a3f7c9e1d5b2
+Revises: e81d5f2a9c47
+Create Date: 2026-10-19 15:06:38.641209
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f7c9e1d5b2'
+down_revision = 'e81d5f2a9c47'
+branch_labels = None
+depends_on = None
+
+
+def _next_month(day):
+    return day.replace(year=day.year + day.month // 12, month=day.month % 12 + 1, day=1)
+
+
+def _partition_postgresql():
+    """Rebuild system_activity as a table range-partitioned by month
+
+    The partition key has to be part of the primary key, so the table's key
+    becomes (id, timestamp); ids still come from the same sequence.
+    """
+    bind = op.get_bind()
+    op.execute('UPDATE system_activity SET timestamp = now() WHERE timestamp IS NULL')
+    op.execute('ALTER TABLE system_activity RENAME TO system_activity_unpartitioned')
+    op.execute('ALTER SEQUENCE system_activity_id_seq OWNED BY NONE')
+    op.execute("""
+        CREATE TABLE system_activity (
+            id INTEGER NOT NULL DEFAULT nextval('system_activity_id_seq'),
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            action VARCHAR(100) NOT NULL,
+            description TEXT,
+            user_id INTEGER REFERENCES "user" (id),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute('CREATE TABLE system_activity_default PARTITION OF system_activity DEFAULT')
+
+    oldest = bind.execute(sa.text('SELECT min(timestamp) FROM system_activity_unpartitioned')).scalar()
+    month = (oldest or datetime.utcnow()).date().replace(day=1)
+    last = _next_month(_next_month(datetime.utcnow().date().replace(day=1)))
+    while month <= last:
+        following = _next_month(month)
+        op.execute(
+            f"CREATE TABLE system_activity_p{month:%Y%m} PARTITION OF system_activity "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+        )
+        month = following
+
+    op.execute('INSERT INTO system_activity (id, timestamp, action, description, user_id) '
+               'SELECT id, timestamp, action, description, user_id FROM system_activity_unpartitioned')
+    op.execute('ALTER SEQUENCE system_activity_id_seq OWNED BY system_activity.id')
+    op.execute('DROP TABLE system_activity_unpartitioned')
+
+
+def _unpartition_postgresql():
+    op.execute('ALTER SEQUENCE system_activity_id_seq OWNED BY NONE')
+    op.execute('CREATE TABLE system_activity_plain AS SELECT * FROM system_activity')
+    op.execute('DROP TABLE system_activity CASCADE')
+    op.execute('ALTER TABLE system_activity_plain RENAME TO system_activity')
+    op.execute('ALTER TABLE system_activity ADD PRIMARY KEY (id)')
+    op.execute("ALTER TABLE system_activity ALTER COLUMN id SET DEFAULT nextval('system_activity_id_seq')")
+    op.execute('ALTER TABLE system_activity ADD FOREIGN KEY (user_id) REFERENCES "user" (id)')
+    op.execute('ALTER SEQUENCE system_activity_id_seq OWNED BY system_activity.id')
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('activity_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(length=7), nullable=False),
+    sa.Column('path', sa.String(length=500), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=True),
+    sa.Column('size', sa.BigInteger(), nullable=True),
+    sa.Column('checksum', sa.String(length=64), nullable=True),
+    sa.Column('first_timestamp', sa.DateTime(), nullable=True),
+    sa.Column('last_timestamp', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('activity_archive', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_activity_archive_period'), ['period'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # The old table and its timestamp index are replaced wholesale
+        _partition_postgresql()
+    else:
+        op.execute('UPDATE system_activity SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL')
+        with op.batch_alter_table('system_activity', schema=None) as batch_op:
+            batch_op.drop_index('ix_system_activity_timestamp')
+            batch_op.alter_column('timestamp', existing_type=sa.DateTime(), nullable=False)
+
+    with op.batch_alter_table('system_activity', schema=None) as batch_op:
+        batch_op.create_index('ix_system_activity_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_system_activity_user_timestamp', ['user_id', 'timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_system_activity_action_timestamp', ['action', 'timestamp', 'id'], unique=False)
+
+    # ### end Alembic commands ###
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('system_activity', schema=None) as batch_op:
+        batch_op.drop_index('ix_system_activity_action_timestamp')
+        batch_op.drop_index('ix_system_activity_user_timestamp')
+        batch_op.drop_index('ix_system_activity_timestamp_id')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        _unpartition_postgresql()
+
+    with op.batch_alter_table('system_activity', schema=None) as batch_op:
+        batch_op.alter_column('timestamp', existing_type=sa.DateTime(), nullable=True)
+        batch_op.create_index('ix_system_activity_timestamp', ['timestamp'], unique=False)
+
+    with op.batch_alter_table('activity_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_activity_archive_period'))
+
+    op.drop_table('activity_archive')
+    # ### end Alembic commands ###
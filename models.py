@@ -14,16 +14,22 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     stripe_customer_id = db.Column(db.String(120), unique=True)
     reset_token = db.Column(db.String(100), unique=True)
     reset_token_expiry = db.Column(db.DateTime)
     two_factor_secret = db.Column(db.String(32))
     two_factor_enabled = db.Column(db.Boolean, default=False)
+    auth_version = db.Column(db.Integer, default=0, nullable=False)  # bumped when credentials or rights change
     profile = db.relationship('CustomerProfile', backref='user', uselist=False)
     containers = db.relationship('Container', backref='user', lazy='dynamic')
     subscriptions = db.relationship('Subscription', backref='user', lazy='dynamic')
 
+    __table_args__ = (
+        # Sort key of the admin user list
+        db.Index('ix_user_created_at_id', 'created_at', 'id'),
+    )
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -103,7 +109,7 @@ class Service(db.Model):
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     stripe_price_id = db.Column(db.String(120))
     stripe_product_id = db.Column(db.String(120))
     container_image = db.Column(db.String(200))
@@ -119,6 +125,10 @@ class Service(db.Model):
     backup_enabled = db.Column(db.Boolean, default=True)
     backup_frequency = db.Column(db.String(20), default='daily')  
     backup_retention_days = db.Column(db.Integer, default=7)
+    backup_keep_hourly = db.Column(db.Integer)  # grandfather-father-son tiers, unset tiers keep nothing
+    backup_keep_daily = db.Column(db.Integer)
+    backup_keep_weekly = db.Column(db.Integer)
+    backup_keep_monthly = db.Column(db.Integer)
     last_backup_at = db.Column(db.DateTime)
     backup_storage_path = db.Column(db.String(255))
     monitoring_enabled = db.Column(db.Boolean, default=True)
@@ -127,6 +137,13 @@ class Service(db.Model):
     subscriptions = db.relationship('Subscription', backref='service', lazy='dynamic')
     containers = db.relationship('Container', backref='service', lazy='dynamic')
 
+    __table_args__ = (
+        # Sort keys of the admin service list
+        db.Index('ix_service_name_id', 'name', 'id'),
+        db.Index('ix_service_price_id', 'price', 'id'),
+        db.Index('ix_service_created_at_id', 'created_at', 'id'),
+    )
+
     def initialize_backup_config(self):
         if not self.backup_storage_path:
             self.backup_storage_path = f"/backups/{self.name.lower()}"
@@ -140,7 +157,7 @@ class Container(db.Model):
     container_id = db.Column(db.String(64), unique=True)
     name = db.Column(db.String(100), nullable=False)
     status = db.Column(db.String(20), default='created')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     service_id = db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False)
     port = db.Column(db.Integer)
@@ -150,6 +167,50 @@ class Container(db.Model):
     storage_usage = db.Column(db.Integer, default=0)
     last_backup = db.Column(db.DateTime)
     last_monitored = db.Column(db.DateTime)
+    domain = db.Column(db.String(255))
+    parent_id = db.Column(db.Integer, db.ForeignKey('container.id'))  # set on staging clones
+
+    clones = db.relationship('Container', backref=db.backref('parent', remote_side=[id]), lazy=True)
+
+    __table_args__ = (
+        # Ownership lookups filter on all three, usually with an equality on each
+        db.Index('ix_container_user_service_status', 'user_id', 'service_id', 'status'),
+    )
+
+class Backup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    service_id = db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False)
+    container_id = db.Column(db.Integer, db.ForeignKey('container.id'))
+    filename = db.Column(db.String(255), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    size = db.Column(db.BigInteger, default=0)
+    checksum = db.Column(db.String(64))  # sha256 of the archive file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    offsite_status = db.Column(db.String(20), default='pending', server_default='pending')  # pending, uploading, complete, failed
+    offsite_key = db.Column(db.String(500))
+    offsite_upload_id = db.Column(db.String(255))
+    offsite_completed_at = db.Column(db.DateTime)
+    service = db.relationship('Service', backref=db.backref('backups', lazy='dynamic'))
+    upload_parts = db.relationship('BackupUploadPart', backref='backup', lazy='dynamic',
+                                   cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.UniqueConstraint('service_id', 'filename', name='uq_backup_service_filename'),
+    )
+
+class BackupUploadPart(db.Model):
+    """A part of an in-progress offsite multipart upload, kept so uploads can resume"""
+    id = db.Column(db.Integer, primary_key=True)
+    backup_id = db.Column(db.Integer, db.ForeignKey('backup.id'), nullable=False)
+    upload_id = db.Column(db.String(255), nullable=False)
+    part_number = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    etag = db.Column(db.String(100), nullable=False)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('backup_id', 'upload_id', 'part_number', name='uq_backup_upload_part'),
+    )
 
 class Subscription(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -162,22 +223,38 @@ class Subscription(db.Model):
     cancelled_at = db.Column(db.DateTime)
 
 class SystemActivity(db.Model):
+    # Range-partitioned by month on PostgreSQL, see utils/activity_archive.py
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     action = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     user = db.relationship('User', backref=db.backref('activities', lazy='dynamic'))
 
+    __table_args__ = (
+        # Keyset pagination walks (timestamp, id), optionally within one user or action
+        db.Index('ix_system_activity_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_system_activity_user_timestamp', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_system_activity_action_timestamp', 'action', 'timestamp', 'id'),
+    )
+
     @classmethod
     def log_activity(cls, action, description, user=None):
-        activity = cls(
-            action=action,
-            description=description,
-            user_id=user.id if user else None
-        )
-        db.session.add(activity)
-        db.session.commit()
+        """Record an activity; it is written once the caller's session commits"""
+        from utils.audit_log import audit_writer
+        audit_writer.log(action, description, user.id if user else None)
+
+class ActivityArchive(db.Model):
+    """A month of SystemActivity moved out of the database into a compressed file"""
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(7), nullable=False, index=True)  # YYYY-MM
+    path = db.Column(db.String(500), nullable=False)
+    rows = db.Column(db.Integer, default=0)
+    size = db.Column(db.BigInteger, default=0)
+    checksum = db.Column(db.String(64))  # sha256 of the file
+    first_timestamp = db.Column(db.DateTime)
+    last_timestamp = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class SystemAlert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -189,6 +266,13 @@ class SystemAlert(db.Model):
     resolved_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     resolved_by = db.relationship('User', backref=db.backref('resolved_alerts', lazy='dynamic'))
 
+    __table_args__ = (
+        # Only open alerts are listed, and they are a small share of all alerts
+        db.Index('ix_system_alert_unresolved', 'timestamp',
+                 postgresql_where=db.text('resolved_at IS NULL'),
+                 sqlite_where=db.text('resolved_at IS NULL')),
+    )
+
     @classmethod
     def create_alert(cls, title, message, level='info'):
         alert = cls(
@@ -205,6 +289,22 @@ class SystemAlert(db.Model):
         self.resolved_by = user
         db.session.commit()
 
+class DailyStat(db.Model):
+    """End-of-day totals behind the admin growth charts, written once a day is over"""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, unique=True, nullable=False)
+    signups = db.Column(db.Integer, default=0)
+    total_users = db.Column(db.Integer, default=0)
+    running_containers = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PlatformCounter(db.Model):
+    """A running platform total kept current by model events"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class SystemSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(100), unique=True, nullable=False)
@@ -214,13 +314,18 @@ class SystemSettings(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    def __repr__(self):
+        value = '********' if self.is_secret and self.value else self.value
+        return f"<SystemSettings {self.key}={value!r}>"
+
     @classmethod
     def get_setting(cls, key, default=None):
-        setting = cls.query.filter_by(key=key).first()
-        return setting.value if setting else default
+        from utils.settings_cache import settings_cache
+        return settings_cache.get(key, default)
 
     @classmethod
     def set_setting(cls, key, value, description=None, is_secret=False):
+        # The settings cache is invalidated when this commits
         setting = cls.query.filter_by(key=key).first()
         if not setting:
             setting = cls(key=key, description=description, is_secret=is_secret)
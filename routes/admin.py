@@ -1,14 +1,29 @@
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for
+from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for, send_file, \
+    Response, abort, stream_with_context
 from flask_login import login_required, current_user
-from models import User, Service, Container, SystemActivity, SystemAlert, SystemSettings
+from models import User, Service, Container, SystemActivity, SystemAlert, SystemSettings, ActivityArchive
 from utils import admin_required
 from utils.podman import podman_manager
-from database import db
+from utils.backup_manager import backup_manager
+from utils.stats_rollup import stats_rollup
+from utils.platform_counters import platform_counters
+from utils.user_cache import user_cache
+from utils.page_cache import page_cache
+from utils.fragment_cache import fragment_cache
+from utils.query_stats import query_stats
+from db_pool import pool_stats
+from utils.activity_archive import browse_activity
+from utils.pagination import keyset_paginate, estimate_count
+from utils.service_search import service_search
+from utils.bulk_transfer import bulk_transfer, EXPORTS, FORMATS, IMPORTS
+from utils.system_sampler import system_sampler
+from database import db, replica_router
+from sqlalchemy import func, or_
 from extensions import limiter
 import logging
 import json
-import psutil
+import os
 from forms import SMTPSettingsForm
 
 # Configure logging for admin actions
@@ -47,38 +62,32 @@ def health_dashboard():
 @login_required
 @admin_required
 def health_metrics():
-    """Get current health metrics"""
+    """Get current health metrics, with recent history when ``window`` (seconds) is given"""
     try:
-        logger.info("Collecting health metrics...")
-        # Get basic system metrics
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-
-        # Calculate uptime
-        boot_time = datetime.fromtimestamp(psutil.boot_time())
-        uptime = datetime.now() - boot_time
-
-        # Get disk and network info
-        disk = psutil.disk_usage('/')
-        network = psutil.net_io_counters()
+        logger.debug("Collecting health metrics...")
+        sample = system_sampler.latest()
 
         metrics = {
             'status': 'ok',
-            'cpu': cpu_percent,
-            'memory': memory.percent,
-            'uptime': str(timedelta(seconds=int(uptime.total_seconds()))),
-            'disk': {
-                'total': disk.total,
-                'used': disk.used,
-                'free': disk.free,
-                'percent': disk.percent
-            },
-            'network': {
-                'bytes_sent': network.bytes_sent,
-                'bytes_recv': network.bytes_recv
-            }
+            'cpu': sample['cpu'],
+            'memory': sample['memory'],
+            'uptime': str(timedelta(seconds=int(system_sampler.uptime()))),
+            'sampled_at': datetime.utcfromtimestamp(sample['timestamp']).isoformat(),
+            'disk': sample['disk'],
+            'network': sample['network']
         }
 
+        window = request.args.get('window', type=int)
+        if window:
+            metrics['history'] = [{
+                'timestamp': datetime.utcfromtimestamp(point['timestamp']).isoformat(),
+                'cpu': point['cpu'],
+                'memory': point['memory'],
+                'disk': point['disk']['percent'],
+                'sent_per_sec': point['network']['sent_per_sec'],
+                'recv_per_sec': point['network']['recv_per_sec']
+            } for point in system_sampler.window(min(window, 3600))]
+
         logger.debug(f"Health metrics collected successfully: {json.dumps(metrics)}")
         return jsonify(metrics)
     except Exception as e:
@@ -92,6 +101,8 @@ def health_metrics():
 def admin_dashboard():
     try:
         metrics = get_system_metrics()
+        # Filling a gap in the rollup commits, which would expire rows loaded before it
+        chart_data = get_chart_data()
         branding = {
             'default_theme': request.cookies.get('theme', 'light'),
             'brand_color': request.cookies.get('brandColor', '#007AFF'),
@@ -101,7 +112,7 @@ def admin_dashboard():
                            metrics=metrics,
                            recent_activities=get_recent_activities(),
                            system_alerts=get_system_alerts(),
-                           chart_data=get_chart_data(),
+                           chart_data=chart_data,
                            **branding)
     except Exception as e:
         logger.error(f"Error accessing admin dashboard: {str(e)}")
@@ -134,6 +145,7 @@ def update_branding():
             description=f"Updated branding settings",
             user=current_user
         )
+        db.session.commit()
 
         return response
     except Exception as e:
@@ -142,11 +154,12 @@ def update_branding():
 
 # Helper functions
 def get_system_metrics():
+    counters = platform_counters.snapshot()
     return {
-        'total_users': User.query.count(),
-        'active_services': Service.query.filter_by(is_active=True).count(),
-        'total_containers': Container.query.count(),
-        'system_health': podman_manager.get_system_health()
+        'total_users': counters.get('users', 0),
+        'active_services': counters.get('services.active', 0),
+        'total_containers': counters.get('containers', 0),
+        'system_health': platform_counters.system_health()
     }
 
 def get_empty_metrics():
@@ -166,7 +179,9 @@ def get_default_branding():
 
 def get_recent_activities():
     try:
-        return SystemActivity.query.order_by(
+        return SystemActivity.query.options(
+            db.joinedload(SystemActivity.user)
+        ).order_by(
             SystemActivity.timestamp.desc()
         ).limit(5).all()
     except Exception:
@@ -180,59 +195,279 @@ def get_system_alerts():
     except Exception:
         return []
 
-def get_chart_data():
+def get_chart_data(days=7):
     try:
+        rows, start, end = stats_rollup.series(days)
+        by_day = {row.day: row for row in rows}
+
         labels = []
         users_data = []
         services_data = []
 
-        for i in range(7, 0, -1):
-            date = datetime.utcnow() - timedelta(days=i)
-            labels.append(date.strftime('%Y-%m-%d'))
-
-            users_count = User.query.filter(
-                User.created_at <= date
-            ).count()
-            users_data.append(users_count)
-
-            services_count = Container.query.filter(
-                Container.status == 'running',
-                Container.created_at <= date
-            ).count()
-            services_data.append(services_count)
+        # Days before the first rolled-up row had no users or containers yet
+        day = start
+        while day <= end:
+            row = by_day.get(day)
+            labels.append(day.strftime('%Y-%m-%d'))
+            users_data.append(row.total_users if row else 0)
+            services_data.append(row.running_containers if row else 0)
+            day += timedelta(days=1)
 
         return {
             'labels': labels,
             'users': users_data,
             'services': services_data
         }
-    except Exception:
+    except Exception as e:
+        logger.error(f"Error building chart data: {str(e)}")
         return {'labels': [], 'users': [], 'services': []}
 
+@admin.route('/chart-data')
+@login_required
+@admin_required
+def chart_data():
+    """Growth chart series for the last ``days`` finished days"""
+    days = min(max(request.args.get('days', 7, type=int), 1), 3660)
+    return jsonify(get_chart_data(days))
+
+@admin.route('/metrics/cache')
+@login_required
+@admin_required
+def cache_metrics():
+    """Hit rates of the in-process caches"""
+    return jsonify({'users': user_cache.stats(), 'pages': page_cache.stats(),
+                    'fragments': fragment_cache.stats()})
+
+@admin.route('/metrics/queries')
+@login_required
+@admin_required
+def query_metrics():
+    """SQL statements per endpoint in this worker, worst first"""
+    stats = query_stats.stats()
+    return jsonify(dict(sorted(stats.items(), key=lambda item: item[1]['avg_queries'], reverse=True)))
+
+@admin.route('/metrics/pool')
+@login_required
+@admin_required
+def pool_metrics():
+    """Connection pool occupancy, waits and liveness checks in this worker"""
+    return jsonify({'pools': pool_stats.snapshot(), 'replicas': replica_router.status()})
+
+@admin.route('/database')
+@login_required
+@admin_required
+def database_status():
+    try:
+        endpoints = sorted(query_stats.stats().items(), key=lambda item: item[1]['avg_queries'], reverse=True)
+        return render_template('admin/database.html',
+                               pools=pool_stats.snapshot(),
+                               replicas=replica_router.status(),
+                               profile=os.environ.get('DB_POOL_PROFILE', 'threaded'),
+                               endpoints=endpoints[:20])
+    except Exception as e:
+        logger.error(f"Error loading database status: {str(e)}")
+        flash('Error loading database status', 'danger')
+        return redirect(url_for('admin.admin_dashboard'))
+
+# Sortable columns for the admin listings; each ends in a unique column
+USER_SORTS = {
+    'created': [User.created_at, User.id],
+    'username': [User.username],
+    'email': [User.email],
+}
+SERVICE_SORTS = {
+    'name': [Service.name, Service.id],
+    'price': [Service.price, Service.id],
+    'created': [Service.created_at, Service.id],
+}
+
+def _listing_args(sorts, default_sort, default_dir):
+    sort = request.args.get('sort', default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    direction = request.args.get('dir', default_dir if sort == default_sort else 'asc')
+    before = request.args.get('before')
+    return {
+        'sort': sort,
+        'dir': 'desc' if direction == 'desc' else 'asc',
+        'cursor': before or request.args.get('after'),
+        'backwards': bool(before),
+    }
+
 @admin.route('/users')
 @login_required
 @admin_required
 def manage_users():
     try:
-        users = User.query.all()
-        return render_template('admin/users.html', users=users)
+        args = _listing_args(USER_SORTS, 'created', 'desc')
+        q = request.args.get('q', '').strip()
+        role = request.args.get('role', '')
+
+        query = User.query
+        if q:
+            query = query.filter(or_(User.username.startswith(q, autoescape=True),
+                                     User.email.startswith(q, autoescape=True)))
+        if role in ('admin', 'customer'):
+            query = query.filter(User.is_admin.is_(role == 'admin'))
+
+        page = keyset_paginate(query, USER_SORTS[args['sort']], args['dir'] == 'desc',
+                               args['cursor'], args['backwards'])
+        if q or role:
+            total = estimate_count(query)
+        else:
+            total = {'count': platform_counters.snapshot().get('users', 0), 'estimated': False}
+
+        return render_template('admin/users.html',
+                               users=page['items'],
+                               next_cursor=page['next_cursor'],
+                               prev_cursor=page['prev_cursor'],
+                               total=total,
+                               q=q,
+                               role=role,
+                               sort=args['sort'],
+                               dir=args['dir'])
     except Exception as e:
         logger.error(f"Error managing users: {str(e)}")
         flash('Error loading user data', 'danger')
         return redirect(url_for('admin.admin_dashboard'))
 
+@admin.route('/users/<int:user_id>/details')
+@login_required
+@admin_required
+def user_details(user_id):
+    """Per-row details for the user list, loaded when a row is expanded"""
+    user = User.query.get_or_404(user_id)
+    containers = dict(db.session.query(Container.status, func.count())
+                      .filter(Container.user_id == user.id).group_by(Container.status).all())
+    services = [name for name, in db.session.query(Service.name).join(Container)
+                .filter(Container.user_id == user.id).distinct().limit(20)]
+    last_activity = db.session.query(func.max(SystemActivity.timestamp)) \
+        .filter(SystemActivity.user_id == user.id).scalar()
+    return jsonify({
+        'containers': containers,
+        'services': services,
+        'subscriptions': user.subscriptions.filter_by(status='active').count(),
+        'two_factor_enabled': bool(user.two_factor_enabled),
+        'last_activity': last_activity.isoformat() if last_activity else None,
+    })
+
 @admin.route('/services')
 @login_required
 @admin_required
 def manage_services():
     try:
-        services = Service.query.all()
-        return render_template('admin/services.html', services=services)
+        args = _listing_args(SERVICE_SORTS, 'name', 'asc')
+        q = request.args.get('q', '').strip()
+        status = request.args.get('status', '')
+
+        query = Service.query
+        if q:
+            query = query.filter(Service.name.startswith(q, autoescape=True))
+        if status in ('active', 'inactive'):
+            query = query.filter(Service.is_active.is_(status == 'active'))
+
+        page = keyset_paginate(query, SERVICE_SORTS[args['sort']], args['dir'] == 'desc',
+                               args['cursor'], args['backwards'])
+
+        return render_template('admin/services.html',
+                               services=page['items'],
+                               next_cursor=page['next_cursor'],
+                               prev_cursor=page['prev_cursor'],
+                               total=estimate_count(query),
+                               q=q,
+                               status=status,
+                               sort=args['sort'],
+                               dir=args['dir'])
     except Exception as e:
         logger.error(f"Error managing services: {str(e)}")
         flash('Error loading service data', 'danger')
         return redirect(url_for('admin.admin_dashboard'))
 
+@admin.route('/services/search')
+@login_required
+@admin_required
+def search_services():
+    """Search every service, inactive ones included"""
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    return jsonify(service_search.search(request.args.get('q', ''), limit=limit, include_inactive=True))
+
+@admin.route('/services/<int:service_id>/details')
+@login_required
+@admin_required
+def service_details(service_id):
+    """Per-row details for the service list, loaded when a row is expanded"""
+    service = Service.query.get_or_404(service_id)
+    containers = dict(db.session.query(Container.status, func.count())
+                      .filter(Container.service_id == service.id).group_by(Container.status).all())
+    return jsonify({
+        'containers': containers,
+        'subscribers': service.subscriptions.filter_by(status='active').count(),
+        'backups': service.backups.count(),
+        'last_backup_at': service.last_backup_at.isoformat() if service.last_backup_at else None,
+        'domain': service.domain,
+        'domain_status': service.domain_status,
+    })
+
+@admin.route('/data')
+@login_required
+@admin_required
+def data_transfer():
+    """Export and import pages for bulk data"""
+    try:
+        return render_template('admin/data_transfer.html',
+                               exports=list(EXPORTS),
+                               imports=IMPORTS,
+                               formats=list(FORMATS))
+    except Exception as e:
+        logger.error(f"Error accessing data transfer: {str(e)}")
+        flash('Error loading data transfer page', 'danger')
+        return redirect(url_for('admin.admin_dashboard'))
+
+@admin.route('/data/export/<entity>.<fmt>')
+@login_required
+@admin_required
+def export_data(entity, fmt):
+    """Stream a whole table as CSV or JSON lines"""
+    if entity not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    logger.info(f"Admin {current_user.username} exporting {entity} as {fmt}")
+    filename = f"{entity}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    return Response(stream_with_context(bulk_transfer.export(entity, fmt)),
+                    mimetype=FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@admin.route('/data/import/<entity>', methods=['POST'])
+@login_required
+@admin_required
+def import_data(entity):
+    """Validate and insert an uploaded CSV or JSON lines file, returns a per-row report"""
+    if entity not in IMPORTS:
+        abort(404)
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'status': 'error', 'message': 'No file uploaded'}), 400
+    fmt = request.form.get('format') or os.path.splitext(upload.filename)[1].lstrip('.').lower()
+    if fmt == 'ndjson':
+        fmt = 'jsonl'
+    if fmt not in FORMATS:
+        return jsonify({'status': 'error', 'message': 'Upload a .csv or .jsonl file'}), 400
+
+    try:
+        report = bulk_transfer.import_file(entity, upload.stream, fmt,
+                                           dry_run=request.form.get('dry_run') == '1')
+        if not report['dry_run']:
+            SystemActivity.log_activity(
+                action="bulk_import",
+                description=f"Imported {report['inserted']} {entity} from {upload.filename} "
+                            f"({report['failed']} rows rejected)",
+                user=current_user
+            )
+            db.session.commit()
+        return jsonify({'status': 'ok', **report})
+    except Exception as e:
+        logger.error(f"Error importing {entity}: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @admin.route('/monitoring')
 @login_required
 @admin_required
@@ -256,6 +491,65 @@ def backup_management():
         flash('Error loading backup data', 'danger')
         return redirect(url_for('admin.admin_dashboard'))
 
+@admin.route('/backups/prune', methods=['POST'])
+@login_required
+@admin_required
+def prune_backups():
+    """Apply backup retention policies across all services"""
+    try:
+        report = backup_manager.prune_backups(dry_run=request.form.get('dry_run') == '1')
+        logger.info(f"Backup pruning run by admin {current_user.username}: {report}")
+        return jsonify({'status': 'ok', **report})
+    except Exception as e:
+        logger.error(f"Error pruning backups: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@admin.route('/activity')
+@login_required
+@admin_required
+def activity_log():
+    """Browse the activity log, newest first"""
+    try:
+        user_filter = request.args.get('user', '').strip()
+        action = request.args.get('action', '').strip()
+
+        user_id = None
+        if user_filter:
+            user = User.query.filter_by(username=user_filter).first()
+            if user is None and user_filter.isdigit():
+                user = db.session.get(User, int(user_filter))
+            user_id = user.id if user else -1
+
+        page = browse_activity(
+            user_id=user_id,
+            action=action or None,
+            before=request.args.get('before'),
+            after=request.args.get('after')
+        )
+        archives = ActivityArchive.query.order_by(ActivityArchive.period.desc()).limit(24).all()
+        return render_template('admin/activity.html',
+                               user_filter=user_filter,
+                               action=action,
+                               archives=archives,
+                               **page)
+    except Exception as e:
+        logger.error(f"Error browsing activity: {str(e)}")
+        flash('Error loading activity log', 'danger')
+        return redirect(url_for('admin.admin_dashboard'))
+
+@admin.route('/activity/archives/<int:archive_id>/download')
+@login_required
+@admin_required
+def download_activity_archive(archive_id):
+    """Download an archived month of activity"""
+    archive = ActivityArchive.query.get_or_404(archive_id)
+    if not os.path.isfile(archive.path):
+        flash('Archive file is missing', 'danger')
+        return redirect(url_for('admin.activity_log'))
+    return send_file(archive.path, as_attachment=True,
+                     download_name=os.path.basename(archive.path),
+                     mimetype='application/gzip')
+
 @admin.route('/settings')
 @login_required
 @admin_required
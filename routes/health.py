@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, Response
-import psutil
 import json
 import logging
+from utils.system_sampler import system_sampler
 
 logger = logging.getLogger(__name__)
 health = Blueprint('health', __name__)
@@ -10,12 +10,11 @@ health = Blueprint('health', __name__)
 def status():
     """Simple health check endpoint"""
     try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
+        sample = system_sampler.latest()
         return json.dumps({
             'status': 'ok',
-            'cpu': cpu_percent,
-            'memory': memory.percent
+            'cpu': sample['cpu'],
+            'memory': sample['memory']
         }), 200
     except Exception as e:
         logger.error(f"Error in status endpoint: {str(e)}", exc_info=True)
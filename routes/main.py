@@ -1,17 +1,22 @@
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from database import db
 from models import Service, Container
+from utils.dashboard_data import get_dashboard_data
+from utils.catalog_cache import catalog_cache
+from utils.page_cache import page_cache
+from utils.service_search import service_search
 import logging
 
 main = Blueprint('main', __name__)
 logger = logging.getLogger(__name__)
 
 @main.route('/')
+@page_cache.cached
 def index():
     """Display landing page with featured services"""
     try:
-        services = Service.query.filter_by(is_active=True).order_by(Service.price).all()
+        services = catalog_cache.active_services()
         logger.info(f"Successfully loaded {len(services)} services for index page")
         return render_template('index.html', 
                             services=services,
@@ -28,30 +33,27 @@ def index():
 def dashboard():
     """Display user dashboard without sidebar"""
     try:
-        services = Service.query.filter_by(is_active=True).all()
-        total_cpu_usage = sum(container.cpu_usage for container in current_user.containers)
-        total_memory_usage = sum(container.memory_usage for container in current_user.containers)
-        total_storage_usage = sum(container.storage_usage for container in current_user.containers)
-
-        return render_template('dashboard.html',
-                            services=services,
-                            total_cpu_usage=total_cpu_usage,
-                            total_memory_usage=total_memory_usage,
-                            total_storage_usage=total_storage_usage)
+        return render_template('dashboard.html', **get_dashboard_data(current_user.id, all_active=True))
     except Exception as e:
         logger.error(f"Error loading dashboard: {str(e)}")
         flash('Error loading dashboard. Please try again later.', 'danger')
         return render_template('dashboard.html', services=[])
 
 @main.route('/services/catalog')
+@page_cache.cached
 def service_catalog():
     """Display full service catalog"""
     try:
         logger.debug("Fetching services for catalog")
-        services = Service.query.filter_by(is_active=True).all()
+        q = request.args.get('q', '').strip()
+        if q:
+            services = service_search.search(q, limit=100)['results']
+        else:
+            services = catalog_cache.active_services()
         logger.info(f"Successfully found {len(services)} services")
         return render_template('services/catalog.html', 
                             services=services,
+                            q=q,
                             current_user=current_user)
     except Exception as e:
         logger.error(f"Error loading service catalog: {str(e)}")
@@ -71,6 +73,7 @@ def deploy_service(service_id):
         existing = Container.query.filter_by(
             user_id=current_user.id,
             service_id=service_id,
+            parent_id=None,
             status='running'
         ).first()
 
@@ -1,33 +1,54 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, jsonify, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, jsonify, session, Response, current_app
 from flask_login import login_required, current_user
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 from database import db
 from models import Service, Container, SystemActivity
 from utils.backup_manager import backup_manager
+from utils.dashboard_data import get_dashboard_data
+from utils.offsite_replication import offsite_replicator
 from utils.podman import podman_manager
+from utils.stack_clone import stack_cloner
+from utils.catalog_cache import catalog_cache
+from utils.page_cache import page_cache
+from utils.solution_ranker import solution_ranker
+from utils.service_search import service_search
 from datetime import datetime
+from urllib.parse import quote
 import logging
 import os
+import unicodedata
 
 # Initialize blueprint and logger
 service = Blueprint('service', __name__)
 logger = logging.getLogger(__name__)
 
+def _set_attachment(response, filename):
+    """Content-Disposition for a download, quoted the way send_file does it"""
+    # Archive member names may hold quotes, newlines or anything else but a slash
+    filename = ''.join(ch for ch in filename if ch.isprintable()) or 'backup'
+    try:
+        filename.encode('ascii')
+        names = {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+    return response
+
 @service.route('/dashboard')
 @login_required
 def dashboard():
     """Display user's service dashboard"""
     try:
-        # Get user's active services with their containers
-        services = Service.query.join(Container).filter(
-            Container.user_id == current_user.id
-        ).all()
-        logger.debug(f"Found {len(services)} services for user {current_user.id}")
+        # Get user's services with their container state and usage
+        data = get_dashboard_data(current_user.id)
+        logger.debug(f"Found {len(data['services'])} services for user {current_user.id}")
 
         # Note: dashboard template should not include sidebar
         return render_template('dashboard.html',
-                          services=services,
                           current_user=current_user,
-                          hide_sidebar=True)
+                          hide_sidebar=True,
+                          **data)
     except Exception as e:
         logger.error(f"Error loading dashboard: {str(e)}")
         flash('An error occurred while loading the dashboard', 'danger')
@@ -44,6 +65,7 @@ def deploy_service(service_id):
         existing_container = Container.query.filter_by(
             user_id=current_user.id,
             service_id=service_id,
+            parent_id=None,
             status='running'
         ).first()
 
@@ -87,7 +109,8 @@ def update_domain(service_id):
         service = Service.query.get_or_404(service_id)
         container = Container.query.filter_by(
             user_id=current_user.id,
-            service_id=service_id
+            service_id=service_id,
+            parent_id=None
         ).first()
 
         if not container:
@@ -117,6 +140,46 @@ def update_domain(service_id):
         flash('Failed to update domain settings', 'danger')
         return redirect(url_for('service.dashboard'))
 
+@service.route('/services/<int:service_id>/clone', methods=['POST'])
+@login_required
+def clone_service(service_id):
+    """Create a staging copy of a deployed service"""
+    try:
+        service = Service.query.get_or_404(service_id)
+        container = Container.query.filter_by(
+            user_id=current_user.id,
+            service_id=service_id,
+            parent_id=None,
+            status='running'
+        ).first()
+
+        if not container:
+            flash('No active container found for this service', 'danger')
+            return redirect(url_for('service.dashboard'))
+
+        clone, message = stack_cloner.clone(service, container)
+        if not clone:
+            flash(message, 'danger')
+            return redirect(url_for('service.dashboard'))
+
+        db.session.add(clone)
+
+        # Log the activity
+        SystemActivity.log_activity(
+            action="service_clone",
+            description=f"Staging copy of {service.name} created at {clone.domain}",
+            user=current_user
+        )
+
+        db.session.commit()
+        flash(f'Staging copy available at {clone.domain}', 'success')
+        return redirect(url_for('service.dashboard'))
+
+    except Exception as e:
+        logger.error(f"Error cloning service: {str(e)}")
+        flash('Failed to create staging copy', 'danger')
+        return redirect(url_for('service.dashboard'))
+
 @service.route('/services/<int:service_id>/status')
 @login_required
 def get_service_status(service_id):
@@ -124,7 +187,8 @@ def get_service_status(service_id):
     try:
         container = Container.query.filter_by(
             user_id=current_user.id,
-            service_id=service_id
+            service_id=service_id,
+            parent_id=None
         ).first()
 
         if not container:
@@ -148,6 +212,7 @@ def create_backup(service_id):
         container = Container.query.filter_by(
             user_id=current_user.id,
             service_id=service_id,
+            parent_id=None,
             status='running'
         ).first()
 
@@ -161,6 +226,11 @@ def create_backup(service_id):
         if success:
             flash('Backup created successfully', 'success')
             db.session.commit()  # Save the updated last_backup_at timestamp
+
+            # Copy the finished backup offsite without holding up the request
+            record = backup_manager.get_backup_record(service, message)
+            if record:
+                offsite_replicator.submit(current_app._get_current_object(), record.id)
         else:
             flash(f'Backup failed: {message}', 'danger')
 
@@ -171,6 +241,216 @@ def create_backup(service_id):
         flash('An error occurred while creating the backup', 'danger')
         return redirect(url_for('service.dashboard'))
 
+@service.route('/services/<int:service_id>/backup/restore', methods=['POST'])
+@login_required
+def restore_backup(service_id):
+    """Restore a service from one of its backups"""
+    try:
+        service = Service.query.get_or_404(service_id)
+
+        # Ensure the service belongs to the current user
+        container = Container.query.filter_by(
+            user_id=current_user.id,
+            service_id=service_id,
+            parent_id=None
+        ).first()
+
+        if not container:
+            flash('No container found for this service', 'danger')
+            return redirect(url_for('service.dashboard'))
+
+        backup_file = backup_manager.get_backup_path(service, request.args.get('backup_file'))
+        if not backup_file:
+            flash('Backup not found', 'danger')
+            return redirect(url_for('service.list_backups', service_id=service_id))
+
+        success, message = backup_manager.restore_backup(service, container, backup_file)
+
+        if success:
+            SystemActivity.log_activity(
+                action="backup_restore",
+                description=f"Restored {os.path.basename(backup_file)} for service {service.name}",
+                user=current_user
+            )
+            db.session.commit()
+            flash('Backup restored successfully', 'success')
+        else:
+            flash(f'Restore failed: {message}', 'danger')
+
+        return redirect(url_for('service.list_backups', service_id=service_id))
+
+    except Exception as e:
+        logger.error(f"Error restoring backup: {str(e)}")
+        flash('An error occurred while restoring the backup', 'danger')
+        return redirect(url_for('service.list_backups', service_id=service_id))
+
+@service.route('/services/<int:service_id>/backups/<backup_file>/download')
+@login_required
+def download_backup(service_id, backup_file):
+    """Download a backup archive"""
+    try:
+        service = Service.query.get_or_404(service_id)
+        container = Container.query.filter_by(
+            user_id=current_user.id,
+            service_id=service_id,
+            parent_id=None
+        ).first()
+
+        if not container:
+            flash('No container found for this service', 'danger')
+            return redirect(url_for('service.dashboard'))
+
+        path = backup_manager.get_backup_path(service, backup_file)
+        if not path:
+            flash('Backup not found', 'danger')
+            return redirect(url_for('service.list_backups', service_id=service_id))
+
+        filename = os.path.basename(path)
+        record = backup_manager.get_backup_record(service, path)
+        checksum = record.checksum if record else None
+
+        # Let the front-end proxy serve the file when it is configured to
+        accel_prefix = current_app.config.get('BACKUP_ACCEL_REDIRECT')
+        if accel_prefix:
+            response = Response(mimetype='application/gzip')
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{service.id}/{filename}"
+            _set_attachment(response, filename)
+            if checksum:
+                response.set_etag(checksum)
+            return response
+
+        # send_file handles Range, If-Range and If-None-Match, and hands the
+        # file to the server's sendfile support (or X-Sendfile) when possible
+        response = send_file(path,
+                             mimetype='application/gzip',
+                             as_attachment=True,
+                             download_name=filename,
+                             conditional=True,
+                             etag=checksum or True,
+                             max_age=0)
+        response.headers['Cache-Control'] = 'private, no-transform'
+        return response
+
+    except RequestedRangeNotSatisfiable:
+        # A resuming download client needs the 416, not the backups page
+        raise
+    except Exception as e:
+        logger.error(f"Error downloading backup: {str(e)}")
+        flash('An error occurred while downloading the backup', 'danger')
+        return redirect(url_for('service.list_backups', service_id=service_id))
+
+@service.route('/services/<int:service_id>/backups/<backup_file>/contents')
+@login_required
+def browse_backup(service_id, backup_file):
+    """List the files inside a backup"""
+    try:
+        service = Service.query.get_or_404(service_id)
+        container = Container.query.filter_by(
+            user_id=current_user.id,
+            service_id=service_id,
+            parent_id=None
+        ).first()
+
+        if not container:
+            flash('No container found for this service', 'danger')
+            return redirect(url_for('service.dashboard'))
+
+        path = backup_manager.get_backup_path(service, backup_file)
+        if not path:
+            flash('Backup not found', 'danger')
+            return redirect(url_for('service.list_backups', service_id=service_id))
+
+        members = backup_manager.list_backup_contents(path)
+        if members is None:
+            flash('This backup was created before backups could be browsed', 'info')
+            return redirect(url_for('service.list_backups', service_id=service_id))
+
+        return render_template('services/backup_contents.html',
+                             service=service,
+                             backup_file=os.path.basename(path),
+                             members=members)
+
+    except Exception as e:
+        logger.error(f"Error browsing backup: {str(e)}")
+        flash('An error occurred while reading the backup', 'danger')
+        return redirect(url_for('service.list_backups', service_id=service_id))
+
+@service.route('/services/<int:service_id>/backups/<backup_file>/contents/download')
+@login_required
+def download_backup_path(service_id, backup_file):
+    """Download a single file, or a directory as a .tar.gz, from a backup"""
+    try:
+        service = Service.query.get_or_404(service_id)
+        container = Container.query.filter_by(
+            user_id=current_user.id,
+            service_id=service_id,
+            parent_id=None
+        ).first()
+
+        if not container:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        path = backup_manager.get_backup_path(service, backup_file)
+        member = request.args.get('path', '')
+        result = backup_manager.stream_backup_path(path, member) if path else None
+        if not result:
+            return jsonify({'error': 'Not found'}), 404
+
+        kind, chunks = result
+        filename = os.path.basename(member.rstrip('/')) or 'backup'
+        if kind == 'archive':
+            filename += '.tar.gz'
+        return _set_attachment(Response(chunks,
+                                        mimetype='application/gzip' if kind == 'archive'
+                                        else 'application/octet-stream'),
+                               filename)
+
+    except Exception as e:
+        logger.error(f"Error downloading from backup: {str(e)}")
+        return jsonify({'error': 'Failed to read backup'}), 500
+
+@service.route('/services/<int:service_id>/backups/<backup_file>/contents/restore', methods=['POST'])
+@login_required
+def restore_backup_path(service_id, backup_file):
+    """Restore a single file or directory from a backup"""
+    try:
+        service = Service.query.get_or_404(service_id)
+        container = Container.query.filter_by(
+            user_id=current_user.id,
+            service_id=service_id,
+            parent_id=None
+        ).first()
+
+        if not container:
+            flash('No container found for this service', 'danger')
+            return redirect(url_for('service.dashboard'))
+
+        path = backup_manager.get_backup_path(service, backup_file)
+        if not path:
+            flash('Backup not found', 'danger')
+            return redirect(url_for('service.list_backups', service_id=service_id))
+
+        member = request.form.get('path', '')
+        success, message = backup_manager.restore_backup_path(service, container, path, member)
+
+        if success:
+            SystemActivity.log_activity(
+                action="backup_restore",
+                description=f"Restored {member} from {os.path.basename(path)} for service {service.name}",
+                user=current_user
+            )
+            db.session.commit()
+            flash(message, 'success')
+        else:
+            flash(f'Restore failed: {message}', 'danger')
+
+        return redirect(url_for('service.browse_backup', service_id=service_id, backup_file=backup_file))
+
+    except Exception as e:
+        logger.error(f"Error restoring from backup: {str(e)}")
+        flash('An error occurred while restoring from the backup', 'danger')
+        return redirect(url_for('service.list_backups', service_id=service_id))
+
 @service.route('/services/<int:service_id>/backups', methods=['GET'])
 @login_required
 def list_backups(service_id):
@@ -180,7 +460,8 @@ def list_backups(service_id):
         # Ensure the service belongs to the current user
         container = Container.query.filter_by(
             user_id=current_user.id,
-            service_id=service_id
+            service_id=service_id,
+            parent_id=None
         ).first()
 
         if not container:
@@ -205,7 +486,8 @@ def update_backup_settings(service_id):
         service = Service.query.get_or_404(service_id)
         container = Container.query.filter_by(
             user_id=current_user.id,
-            service_id=service_id
+            service_id=service_id,
+            parent_id=None
         ).first()
 
         if not container:
@@ -218,6 +500,9 @@ def update_backup_settings(service_id):
         retention_days = request.form.get('retention_days')
         if retention_days and retention_days.isdigit():
             service.backup_retention_days = int(retention_days)
+        for tier in ('hourly', 'daily', 'weekly', 'monthly'):
+            keep = request.form.get(f'keep_{tier}', '')
+            setattr(service, f'backup_keep_{tier}', int(keep) if keep.isdigit() and int(keep) > 0 else None)
 
         db.session.commit()
         flash('Backup settings updated successfully', 'success')
@@ -229,11 +514,12 @@ def update_backup_settings(service_id):
         flash('An error occurred while updating backup settings', 'danger')
         return redirect(url_for('service.list_backups', service_id=service_id))
 @service.route('/catalog')
+@page_cache.cached
 def service_catalog():
     """Display available services"""
     try:
         logger.debug("Fetching services for catalog")
-        services = Service.query.all()
+        services = catalog_cache.active_services()
         logger.debug(f"Found {len(services)} services")
 
         return render_template(
@@ -246,6 +532,16 @@ def service_catalog():
         flash('An error occurred while loading the service catalog', 'danger')
         return redirect(url_for('main.index'))
 
+@service.route('/search')
+def search_services():
+    """Search active services, e.g. ?q=wordpress memory>=2048 price<50"""
+    try:
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        return jsonify(service_search.search(request.args.get('q', ''), limit=limit))
+    except Exception as e:
+        logger.error(f"Error searching services: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
+
 @service.route('/solution-finder')
 def solution_finder():
     """Interactive quiz to help users find the right service"""
@@ -293,66 +589,10 @@ def solution_finder():
 def solution_finder_result():
     """Process quiz answers and recommend services"""
     try:
-        answers = request.get_json()
-
-        # Initialize base query
-        query = Service.query
-
-        # Apply filters based on website type
-        if answers.get('1') == 'enterprise':
-            query = query.filter(
-                Service.cpu_quota >= 2,
-                Service.memory_quota >= 2048,
-                Service.backup_enabled == True
-            )
-        elif answers.get('1') == 'business':
-            query = query.filter(
-                Service.cpu_quota >= 1,
-                Service.memory_quota >= 1024
-            )
-
-        # Apply filters based on traffic expectations
-        if answers.get('2') == 'large':
-            query = query.filter(Service.memory_quota >= 2048)
-        elif answers.get('2') == 'medium':
-            query = query.filter(Service.memory_quota >= 1024)
-
-        # Apply filters based on features
-        if answers.get('3') == 'security':
-            query = query.filter(Service.backup_enabled == True)
-        elif answers.get('3') == 'performance':
-            query = query.filter(Service.cpu_quota >= 1)
-
-        # Apply budget filter
-        if answers.get('4') == 'basic':
-            query = query.filter(Service.price <= 30)
-        elif answers.get('4') == 'standard':
-            query = query.filter(Service.price.between(30, 100))
-        elif answers.get('4') == 'premium':
-            query = query.filter(Service.price > 100)
-
-        # Get matching services
-        matching_services = query.all()
-
-        # If no exact matches, get closest alternatives
-        if not matching_services:
-            matching_services = Service.query.order_by(Service.price).limit(3).all()
-
-        return jsonify({
-            'services': [{
-                'id': service.id,
-                'name': service.name,
-                'description': service.description,
-                'price': float(service.price),
-                'features': [
-                    f"{service.cpu_quota} CPU Cores",
-                    f"{service.memory_quota}MB Memory",
-                    f"{service.storage_quota}MB Storage",
-                    "Daily Backups" if service.backup_enabled else None
-                ]
-            } for service in matching_services]
-        })
+        answers = request.get_json() or {}
 
+        # Every active service is scored; the best matches come first
+        return jsonify({'services': solution_ranker.rank(answers, top_k=3)})
     except Exception as e:
         logger.error(f"Error in solution finder: {str(e)}")
         return jsonify({'error': 'Failed to find matching services'}), 500
\ No newline at end of file
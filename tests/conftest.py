@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix='portal-tests-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_tmp, 'test.db')}")
+os.environ.setdefault('SESSION_SECRET', 'test')
+os.environ.setdefault('CACHE_STAMP_DIR', os.path.join(_tmp, 'stamps'))
+os.environ.setdefault('JOB_LOCK_DIR', os.path.join(_tmp, 'locks'))
+# Keep the background jobs out of the test process
+for _interval in ('STATS_ROLLUP_INTERVAL', 'COUNTER_RECONCILE_INTERVAL', 'ACTIVITY_ARCHIVE_INTERVAL',
+                  'OFFSITE_RETRY_INTERVAL', 'SYSTEM_SAMPLE_INTERVAL'):
+    os.environ.setdefault(_interval, '0')
+os.environ.setdefault('AUDIT_SYNC', '1')
+# Every request loads its user, so query counts don't depend on test order
+os.environ.setdefault('USER_CACHE_TTL', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from database import db  # noqa: E402
+from models import User  # noqa: E402
+from utils.catalog_cache import catalog_cache  # noqa: E402
+from utils.page_cache import page_cache  # noqa: E402
+from utils.service_search import service_search  # noqa: E402
+from utils.settings_cache import settings_cache  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False)
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Each test starts from an empty database
+        catalog_cache.invalidate()
+        service_search.invalidate()
+        settings_cache.invalidate()
+        page_cache.clear()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(username='customer', is_admin=False):
+        user = User(username=username, email=f"{username}@example.com", is_admin=is_admin)
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def client_for(app):
+    """A test client signed in as ``user``"""
+    def client_for(user):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+        return client
+    return client_for
@@ -0,0 +1,86 @@
+import importlib.util
+import os
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from database import db
+from models import Service, User
+from routes.admin import SERVICE_SORTS, USER_SORTS
+from utils.pagination import keyset_paginate
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations', 'versions')
+
+
+def walk(query, columns, descending, per_page=3):
+    """Every page forward from the start, then every page back from the end"""
+    forward, pages, cursor = [], 0, None
+    while True:
+        page = keyset_paginate(query, columns, descending, cursor, per_page=per_page)
+        forward.extend(row.id for row in page['items'])
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    backward, cursor = [row.id for row in page['items']], page['prev_cursor']
+    while cursor is not None:
+        page = keyset_paginate(query, columns, descending, cursor, backwards=True, per_page=per_page)
+        backward[:0] = [row.id for row in page['items']]
+        cursor = page['prev_cursor']
+    return forward, backward, pages
+
+
+@pytest.fixture
+def listed(app):
+    # Several rows share each timestamp, so the id breaks most ties
+    start = datetime(2026, 1, 1)
+    db.session.add_all([User(username=f"user{i:02d}", email=f"user{i:02d}@example.com", password_hash='x',
+                             created_at=start + timedelta(days=i // 4)) for i in range(20)])
+    db.session.add_all([Service(name=f"Plan {i:02d}", price=10, container_image='img',
+                                created_at=start + timedelta(days=i % 3)) for i in range(11)])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('model, columns', [(User, USER_SORTS['created']), (Service, SERVICE_SORTS['created'])])
+@pytest.mark.parametrize('descending', [False, True])
+def test_every_row_is_listed_exactly_once(listed, model, columns, descending):
+    expected = [row.id for row in model.query.order_by(*[c.desc() if descending else c for c in columns])]
+
+    forward, backward, pages = walk(model.query, columns, descending)
+
+    assert forward == expected
+    assert backward == expected
+    assert pages == -(-len(expected) // 3)
+
+
+def test_migration_dates_undated_rows_and_requires_created_at(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql('CREATE TABLE "user" (id INTEGER PRIMARY KEY, created_at DATETIME)')
+        connection.exec_driver_sql('CREATE TABLE service (id INTEGER PRIMARY KEY, created_at DATETIME)')
+        connection.exec_driver_sql("INSERT INTO \"user\" VALUES (1, '2025-03-01 09:00:00'), (2, NULL), "
+                                   "(3, '2024-11-20 12:30:00')")
+        connection.exec_driver_sql("INSERT INTO service VALUES (1, NULL)")
+
+    path = os.path.join(MIGRATIONS, '9d4e2b7c1f60_backfill_user_service_created_at.py')
+    spec = importlib.util.spec_from_file_location('backfill_created_at', path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            migration.upgrade()
+
+    with engine.connect() as connection:
+        users = dict(connection.exec_driver_sql('SELECT id, created_at FROM "user"').all())
+        services = connection.exec_driver_sql('SELECT created_at FROM service').scalars().all()
+        columns = {table: {column['name']: column for column in sa.inspect(connection).get_columns(table)}
+                   for table in ('user', 'service')}
+    assert users[2] == '2024-11-20 12:30:00'
+    assert services[0] is not None
+    assert not columns['user']['created_at']['nullable']
+    assert not columns['service']['created_at']['nullable']
+    engine.dispose()
@@ -0,0 +1,119 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from database import db
+from models import SystemActivity, User
+from utils.audit_log import AuditWriter
+
+
+def written():
+    """Activity rows visible outside the test's session"""
+    with db.engine.connect() as connection:
+        return connection.execute(db.select(db.func.count()).select_from(SystemActivity)).scalar()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+@pytest.fixture
+def background_writer(app):
+    writers = []
+
+    def background_writer(batch_size=100, flush_interval=60.0, max_buffer=10000):
+        writer = AuditWriter()
+        writer.synchronous = False
+        writer.batch_size = batch_size
+        writer.flush_interval = flush_interval
+        writer.max_buffer = max_buffer
+        writer.start(app)
+        writers.append(writer)
+        return writer
+
+    yield background_writer
+    for writer in writers:
+        writer.stop()
+
+
+def test_sync_record_joins_the_callers_transaction(app):
+    user = User(username='pending', email='pending@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+
+    SystemActivity.log_activity('signup', 'pending signed up', user)
+    assert written() == 0
+
+    db.session.commit()
+    assert written() == 1
+    assert SystemActivity.query.one().user_id == user.id
+
+
+def test_sync_record_is_dropped_with_a_rollback(app, make_user):
+    user = make_user()
+    SystemActivity.log_activity('domain_update', 'never happened', user)
+    db.session.rollback()
+    db.session.commit()
+    assert written() == 0
+
+
+def test_background_record_waits_for_the_commit(background_writer, make_user):
+    writer = background_writer(batch_size=1)
+    user = make_user()
+
+    writer.log('domain_update', 'rolled back', user.id)
+    db.session.rollback()
+    writer.log('domain_update', 'committed', user.id)
+    assert written() == 0
+
+    db.session.commit()
+    assert wait_for(lambda: written() == 1)
+    assert SystemActivity.query.one().description == 'committed'
+
+
+def test_full_batch_is_written_without_waiting_for_the_interval(background_writer):
+    writer = background_writer(batch_size=3)
+    for i in range(2):
+        writer.log('login', f"login {i}")
+    db.session.commit()
+    time.sleep(0.2)
+    assert written() == 0
+
+    writer.log('login', 'login 2')
+    db.session.commit()
+    assert wait_for(lambda: written() == 3)
+
+
+def test_partial_batch_is_written_after_the_interval(background_writer):
+    writer = background_writer(batch_size=100, flush_interval=0.1)
+    writer.log('login', 'only one')
+    db.session.commit()
+    assert wait_for(lambda: written() == 1)
+
+
+def test_stop_drains_the_buffer(background_writer):
+    writer = background_writer(batch_size=100, flush_interval=60.0)
+    for i in range(5):
+        writer.log('login', f"login {i}")
+    db.session.commit()
+
+    writer.stop()
+    assert written() == 5
+
+
+def test_full_buffer_drops_the_oldest_records(app):
+    writer = AuditWriter()
+    writer.max_buffer = 2
+    for i in range(3):
+        writer.enqueue({'action': 'login', 'description': f"login {i}", 'user_id': None,
+                        'timestamp': datetime.utcnow()})
+
+    assert writer.dropped == 1
+    assert writer.flush() == 2
+    assert [row.description for row in SystemActivity.query.order_by(SystemActivity.id)] == ['login 1', 'login 2']
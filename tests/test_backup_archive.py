@@ -0,0 +1,125 @@
+import hashlib
+import io
+import os
+import tarfile
+import zlib
+
+import pytest
+
+from utils.backup_archive import (INDEX_NAME, SeekableArchiveWriter, iter_member, iter_raw_members, read_index,
+                                  select_members)
+from utils.backup_manager import backup_manager
+
+BIG = os.urandom(300 * 1024) + b'x' * (3 * 1024 * 1024)
+
+
+class CountingFile(io.FileIO):
+    """A file that remembers how many bytes were read from it"""
+
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+@pytest.fixture
+def site(tmp_path):
+    root = tmp_path / 'site'
+    (root / 'wp-content' / 'uploads').mkdir(parents=True)
+    (root / 'index.php').write_bytes(b'<?php echo "home";')
+    (root / 'wp-content' / 'uploads' / 'big.bin').write_bytes(BIG)
+    (root / 'wp-content' / 'uploads' / 'logo.svg').write_bytes(b'<svg/>')
+    os.symlink('index.php', root / 'home.php')
+    return root
+
+
+@pytest.fixture
+def archive(site, tmp_path):
+    path = tmp_path / 'wordpress_backup_20260101_000000.tar.gz'
+    with SeekableArchiveWriter(str(path)) as writer:
+        for name in ('index.php', 'home.php', 'wp-content', 'wp-content/uploads', 'wp-content/uploads/big.bin',
+                     'wp-content/uploads/logo.svg'):
+            writer.add_path(str(site / name), f"html/{name}")
+        writer.add_bytes('database.sql', b'CREATE TABLE wp_posts (id int);\n', mtime=1767225600)
+        writer.close({'version': 2, 'created_at': '2026-01-01T00:00:00'})
+        checksum = writer.sha256
+    return path, checksum
+
+
+def test_index_describes_every_member(archive, site):
+    path, _ = archive
+    index = read_index(str(path))
+
+    assert index['version'] == 2
+    members = index['members']
+    assert set(members) == {'html/index.php', 'html/home.php', 'html/wp-content', 'html/wp-content/uploads',
+                            'html/wp-content/uploads/big.bin', 'html/wp-content/uploads/logo.svg',
+                            'database.sql'}
+    assert members['html/wp-content']['type'] == 'dir'
+    assert (members['html/home.php']['type'], members['html/home.php']['linkname']) == ('symlink', 'index.php')
+    assert members['html/wp-content/uploads/big.bin']['size'] == len(BIG)
+
+
+def test_archive_is_a_plain_tar_gz(archive, site, tmp_path):
+    path, checksum = archive
+    with open(path, 'rb') as f:
+        assert hashlib.sha256(f.read()).hexdigest() == checksum
+
+    with tarfile.open(path) as tar:
+        names = tar.getnames()
+        tar.extractall(tmp_path / 'out', filter='tar')
+    assert names[-1] == INDEX_NAME
+    assert (tmp_path / 'out' / 'html' / 'wp-content' / 'uploads' / 'big.bin').read_bytes() == BIG
+    assert os.readlink(tmp_path / 'out' / 'html' / 'home.php') == 'index.php'
+
+
+def test_one_member_is_read_by_seeking_to_it(archive):
+    path, _ = archive
+    index = read_index(str(path))
+    entry = index['members']['html/wp-content/uploads/logo.svg']
+
+    with CountingFile(str(path)) as f:
+        assert b''.join(iter_member(f, entry)) == b'<svg/>'
+        # Only that member's gzip member was read, not the 3MB file before it
+        assert f.bytes_read <= entry['length']
+
+    with open(path, 'rb') as f:
+        assert b''.join(iter_member(f, index['members']['html/wp-content/uploads/big.bin'])) == BIG
+
+
+def test_directory_is_copied_out_as_its_own_tar_gz(archive):
+    path, _ = archive
+    index = read_index(str(path))
+    names = select_members(index, '/html/wp-content/uploads/')
+    assert names == ['html/wp-content/uploads', 'html/wp-content/uploads/big.bin',
+                     'html/wp-content/uploads/logo.svg']
+
+    with open(path, 'rb') as f:
+        data = b''.join(iter_raw_members(f, index, names))
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.getnames() == names
+        assert tar.extractfile('html/wp-content/uploads/logo.svg').read() == b'<svg/>'
+
+
+def test_archive_without_an_index_falls_back_cleanly(site, tmp_path):
+    path = tmp_path / 'wordpress_backup_20250101_000000.tar.gz'
+    with tarfile.open(path, 'w:gz') as tar:
+        tar.add(site, arcname='html')
+
+    assert read_index(str(path)) is None
+    assert backup_manager.list_backup_contents(str(path)) is None
+    assert backup_manager.stream_backup_path(str(path), 'html/index.php') is None
+
+
+@pytest.mark.parametrize('damage', [
+    lambda data: data[:-10],
+    lambda data: data[:-28] + zlib.compress(b'', wbits=31)[:28].ljust(28, b'\0'),
+    lambda data: b'',
+])
+def test_damaged_footer_reads_as_no_index(archive, tmp_path, damage):
+    path, _ = archive
+    damaged = tmp_path / 'damaged.tar.gz'
+    damaged.write_bytes(damage(path.read_bytes()))
+    assert read_index(str(damaged)) is None
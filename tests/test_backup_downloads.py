@@ -0,0 +1,118 @@
+from werkzeug.http import parse_options_header
+
+import pytest
+
+from database import db
+from models import Backup, Container, Service
+from utils.backup_archive import SeekableArchiveWriter
+from utils.backup_manager import backup_manager
+
+BACKUP_FILE = 'wordpress_backup_20260101_000000.tar.gz'
+MEMBERS = {
+    'html/index.html': b'<h1>home</h1>' * 200,
+    'html/say "hi"\r\nSet-Cookie: x=1.txt': b'hi',
+    'html/café.txt': b'coffee',
+}
+
+
+@pytest.fixture
+def backup(app, tmp_path, monkeypatch, make_user, client_for):
+    monkeypatch.setattr(backup_manager, 'backup_base_path', str(tmp_path))
+    user = make_user()
+    service = Service(name='Blog', price=10, container_image='img')
+    db.session.add(service)
+    db.session.flush()
+    db.session.add(Container(container_id='blog-1', name='blog-1', user_id=user.id, service_id=service.id,
+                             port=80))
+
+    (tmp_path / str(service.id)).mkdir()
+    path = tmp_path / str(service.id) / BACKUP_FILE
+    with SeekableArchiveWriter(str(path)) as archive:
+        for name, data in MEMBERS.items():
+            archive.add_bytes(name, data, mtime=1767225600)
+        checksum = archive.sha256
+    db.session.add(Backup(service_id=service.id, filename=BACKUP_FILE, path=str(path),
+                          size=path.stat().st_size, checksum=checksum))
+    db.session.commit()
+
+    return {
+        'client': client_for(user),
+        'url': f"/service/services/{service.id}/backups/{BACKUP_FILE}/download",
+        'contents_url': f"/service/services/{service.id}/backups/{BACKUP_FILE}/contents/download",
+        'data': path.read_bytes(),
+        'etag': f'"{checksum}"',
+    }
+
+
+def disposition(response):
+    value, options = parse_options_header(response.headers['Content-Disposition'])
+    assert value == 'attachment'
+    return options
+
+
+def test_whole_backup_download(backup):
+    response = backup['client'].get(backup['url'])
+
+    assert response.status_code == 200
+    assert response.data == backup['data']
+    assert response.headers['ETag'] == backup['etag']
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert disposition(response) == {'filename': BACKUP_FILE}
+
+
+def test_range_request_gets_a_206(backup):
+    response = backup['client'].get(backup['url'], headers={'Range': 'bytes=10-109'})
+
+    assert response.status_code == 206
+    assert response.data == backup['data'][10:110]
+    assert response.headers['Content-Range'] == f"bytes 10-109/{len(backup['data'])}"
+
+
+def test_range_past_the_end_gets_a_416(backup):
+    size = len(backup['data'])
+    response = backup['client'].get(backup['url'], headers={'Range': f"bytes={size}-{size + 100}"})
+
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f"bytes */{size}"
+
+
+def test_matching_etag_gets_a_304(backup):
+    response = backup['client'].get(backup['url'], headers={'If-None-Match': backup['etag']})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_stale_if_range_gets_the_whole_file(backup):
+    response = backup['client'].get(backup['url'], headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+
+    assert response.status_code == 200
+    assert response.data == backup['data']
+
+
+def test_accel_redirect_hands_the_file_to_the_proxy(backup, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'BACKUP_ACCEL_REDIRECT', '/protected-backups/')
+    response = backup['client'].get(backup['url'])
+
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'].endswith(f"/{BACKUP_FILE}")
+    assert response.headers['ETag'] == backup['etag']
+    assert disposition(response) == {'filename': BACKUP_FILE}
+
+
+def test_member_named_with_quotes_and_newlines_gets_one_header(backup):
+    response = backup['client'].get(backup['contents_url'],
+                                     query_string={'path': 'html/say "hi"\r\nSet-Cookie: x=1.txt'})
+
+    assert response.status_code == 200
+    assert response.data == b'hi'
+    assert len(response.headers.getlist('Content-Disposition')) == 1
+    assert not any(cookie.startswith('x=') for cookie in response.headers.getlist('Set-Cookie'))
+    assert disposition(response) == {'filename': 'say "hi"Set-Cookie: x=1.txt'}
+
+
+def test_member_with_a_non_ascii_name(backup):
+    response = backup['client'].get(backup['contents_url'], query_string={'path': 'html/café.txt'})
+
+    assert response.data == b'coffee'
+    assert response.headers['Content-Disposition'] == "attachment; filename=cafe.txt; filename*=UTF-8''caf%C3%A9.txt"
@@ -0,0 +1,147 @@
+import io
+import json
+import os
+import sys
+import tarfile
+
+import pytest
+
+from utils.backup_archive import SeekableArchiveWriter
+from utils.backup_restore import StreamingRestore
+
+MEMBERS = {
+    'data/index.php': b'<?php echo "restored";',
+    'data/wp-content/uploads/photo.jpg': os.urandom(3 * 1024 * 1024),
+    'volumes/db-data/ibdata1': b'innodb' * 1000,
+    'database/dump.sql': b'INSERT INTO wp_posts VALUES (1);\n',
+}
+
+
+def seekable_archive(path, members=MEMBERS, tamper=None):
+    with SeekableArchiveWriter(str(path)) as writer:
+        for name, data in members.items():
+            writer.add_bytes(name, data, mtime=1767225600)
+        if tamper:
+            writer.members[tamper]['sha256'] = '0' * 64
+    return path
+
+
+def plain_archive(path, members=MEMBERS):
+    with tarfile.open(path, 'w:gz') as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return path
+
+
+def read_tree(root):
+    tree = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            with open(path, 'rb') as f:
+                tree[os.path.relpath(path, root)] = f.read()
+    return tree
+
+
+@pytest.fixture
+def live(tmp_path):
+    volumes = {'volume:': tmp_path / 'site' / '_data', 'volume:db-data': tmp_path / 'db-data' / '_data'}
+    for path in volumes.values():
+        path.mkdir(parents=True)
+    (volumes['volume:'] / 'index.php').write_bytes(b'<?php echo "live";')
+    (volumes['volume:'] / 'stale.txt').write_bytes(b'removed by a full restore')
+    (volumes['volume:db-data'] / 'ibdata1').write_bytes(b'live')
+    return {name: str(path) for name, path in volumes.items()}
+
+
+@pytest.fixture
+def database(tmp_path):
+    dump = tmp_path / 'imported.sql'
+    command = [sys.executable, '-c', f"import sys; open({str(dump)!r}, 'wb').write(sys.stdin.buffer.read())"]
+    return command, dump
+
+
+def assert_restored(live, dump):
+    assert read_tree(live['volume:']) == {'index.php': MEMBERS['data/index.php'],
+                                          'wp-content/uploads/photo.jpg': MEMBERS['data/wp-content/uploads/photo.jpg']}
+    assert read_tree(live['volume:db-data']) == {'ibdata1': MEMBERS['volumes/db-data/ibdata1']}
+    assert dump.read_bytes() == MEMBERS['database/dump.sql']
+
+
+@pytest.mark.parametrize('build', [seekable_archive, plain_archive])
+def test_every_volume_and_the_database_are_restored(tmp_path, live, database, build):
+    command, dump = database
+    engine = StreamingRestore(live, command)
+
+    written = engine.restore(str(build(tmp_path / 'backup.tar.gz')))
+
+    assert_restored(live, dump)
+    assert written['volume:'] == len(MEMBERS['data/index.php']) + len(MEMBERS['data/wp-content/uploads/photo.jpg'])
+    assert written['database'] == len(MEMBERS['database/dump.sql'])
+    # The previous data is kept beside the volume until the container is back up
+    old = [name for name in os.listdir(tmp_path / 'site') if name.startswith('_data.old-')]
+    assert len(old) == 1
+    assert read_tree(tmp_path / 'site' / old[0])['stale.txt'] == b'removed by a full restore'
+
+    engine.cleanup()
+    assert os.listdir(tmp_path / 'site') == ['_data']
+    assert os.listdir(tmp_path / 'db-data') == ['_data']
+
+
+def test_checksum_mismatch_leaves_the_volumes_alone(tmp_path, live):
+    before = {name: read_tree(path) for name, path in live.items()}
+    archive = seekable_archive(tmp_path / 'backup.tar.gz', tamper='data/wp-content/uploads/photo.jpg')
+
+    with pytest.raises(RuntimeError, match='Checksum mismatch for data/wp-content/uploads/photo.jpg'):
+        StreamingRestore(live).restore(str(archive))
+
+    assert {name: read_tree(path) for name, path in live.items()} == before
+    assert os.listdir(tmp_path / 'site') == ['_data']
+
+
+def test_manifest_listing_a_missing_member_fails(tmp_path, live):
+    members = dict(MEMBERS, **{'manifest.json': json.dumps({'members': {
+        'data/index.php': {'sha256': '0' * 64}, 'data/gone.php': {'sha256': '0' * 64}}}).encode()})
+
+    with pytest.raises(RuntimeError, match='missing 1 member'):
+        StreamingRestore(live).restore(str(plain_archive(tmp_path / 'backup.tar.gz', members)))
+    assert read_tree(live['volume:'])['index.php'] == b'<?php echo "live";'
+
+
+@pytest.mark.parametrize('client', [
+    "import sys; sys.stdin.read(); sys.exit('ERROR 1045: access denied')",
+    # Exits before reading a dump larger than the pipe buffer
+    "import sys; sys.exit('ERROR 1045: access denied')",
+])
+def test_failed_database_import_fails_the_restore(tmp_path, live, client):
+    members = dict(MEMBERS, **{'database/dump.sql': b'INSERT INTO wp_posts VALUES (1);\n' * 100000})
+    archive = seekable_archive(tmp_path / 'backup.tar.gz', members)
+    command = [sys.executable, '-c', client]
+
+    with pytest.raises(RuntimeError, match='access denied'):
+        StreamingRestore(live, command).restore(str(archive))
+    assert read_tree(live['volume:db-data']) == {'ibdata1': b'live'}
+
+
+def test_single_path_is_restored_in_place(tmp_path, live):
+    archive = seekable_archive(tmp_path / 'backup.tar.gz')
+
+    written = StreamingRestore(live).restore_path(str(archive), 'data/wp-content')
+
+    assert written == len(MEMBERS['data/wp-content/uploads/photo.jpg'])
+    assert read_tree(live['volume:']) == {
+        'index.php': b'<?php echo "live";',
+        'stale.txt': b'removed by a full restore',
+        'wp-content/uploads/photo.jpg': MEMBERS['data/wp-content/uploads/photo.jpg'],
+    }
+    assert os.listdir(tmp_path / 'site') == ['_data']
+
+
+def test_unsafe_member_paths_are_refused(tmp_path, live):
+    archive = plain_archive(tmp_path / 'backup.tar.gz', {'data/../../etc/passwd': b'root'})
+
+    with pytest.raises(ValueError, match='Unsafe member path'):
+        StreamingRestore(live).restore(str(archive))
+    assert not (tmp_path / 'etc').exists()
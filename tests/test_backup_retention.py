@@ -0,0 +1,109 @@
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from database import db
+from models import Backup, BackupUploadPart, Service
+from utils.backup_manager import backup_manager
+from utils.backup_retention import backups_to_keep
+
+# Newest first; 9 and 10 March share ISO week 11
+SERIES = [
+    (1, datetime(2026, 3, 10, 12)),
+    (2, datetime(2026, 3, 10, 6)),
+    (3, datetime(2026, 3, 9, 12)),
+    (4, datetime(2026, 3, 2, 12)),
+    (5, datetime(2026, 2, 20, 12)),
+    (6, datetime(2026, 1, 15, 12)),
+    (7, datetime(2025, 12, 15, 12)),
+]
+
+
+def series():
+    return [SimpleNamespace(id=backup_id, created_at=created_at) for backup_id, created_at in SERIES]
+
+
+@pytest.mark.parametrize('policy, kept', [
+    ({'daily': 2}, {1, 3}),
+    ({'weekly': 2}, {1, 4}),
+    ({'monthly': 3}, {1, 5, 6}),
+    ({'daily': 2, 'weekly': 2, 'monthly': 3}, {1, 3, 4, 5, 6}),
+    ({'hourly': 24}, {1, 2, 3, 4, 5, 6, 7}),
+    # No tiers (a count of 0 is unset): everything younger than retention_days
+    ({'daily': 0, 'retention_days': 1}, {1, 2}),
+    ({'retention_days': 30}, {1, 2, 3, 4, 5}),
+])
+def test_tiers_keep_the_newest_backup_of_each_period(policy, kept):
+    assert backups_to_keep(series(), policy, now=datetime(2026, 3, 11)) == kept
+
+
+def test_newest_backup_is_always_kept():
+    assert backups_to_keep(series(), {'retention_days': 1}, now=datetime(2027, 1, 1)) == {1}
+    assert backups_to_keep([], {'daily': 3}) == set()
+
+
+@pytest.fixture
+def fleet(app, tmp_path):
+    """Two services with a backup every day for ten days, files on disk"""
+    now = datetime.utcnow() - timedelta(minutes=1)
+    tiered = Service(name='Tiered', price=10, container_image='img', backup_keep_daily=3)
+    legacy = Service(name='Legacy', price=10, container_image='img', backup_retention_days=5)
+    db.session.add_all([tiered, legacy])
+    db.session.flush()
+    for service in (tiered, legacy):
+        for day in range(10):
+            path = tmp_path / f"{service.id}-{day}.tar.gz"
+            path.write_bytes(b'x' * (100 + day))
+            db.session.add(Backup(service_id=service.id, filename=path.name, path=str(path), size=100 + day,
+                                  created_at=now - timedelta(days=day)))
+    db.session.commit()
+    return {'tiered': tiered.id, 'legacy': legacy.id, 'dir': tmp_path}
+
+
+def remaining(service_id):
+    return sorted(int(backup.filename.split('-')[1].split('.')[0])
+                  for backup in Backup.query.filter_by(service_id=service_id))
+
+
+def test_prune_applies_every_service_policy_in_one_pass(fleet):
+    report = backup_manager.prune_backups(batch_size=4, pause=0)
+
+    assert report['services'] == 2
+    assert report['examined'] == 20
+    assert remaining(fleet['tiered']) == [0, 1, 2]
+    assert remaining(fleet['legacy']) == [0, 1, 2, 3, 4]
+    deleted_days = {fleet['tiered']: range(3, 10), fleet['legacy']: range(5, 10)}
+    assert report['deleted'] == 12
+    assert report['bytes_reclaimed'] == sum(100 + day for days in deleted_days.values() for day in days)
+    assert report['errors'] == 0
+    assert sorted(os.listdir(fleet['dir'])) == sorted(
+        [f"{fleet['tiered']}-{day}.tar.gz" for day in range(3)] +
+        [f"{fleet['legacy']}-{day}.tar.gz" for day in range(5)])
+
+
+def test_dry_run_reports_without_deleting(fleet):
+    report = backup_manager.prune_backups(dry_run=True)
+
+    assert (report['deleted'], report['bytes_reclaimed']) == (12, sum(range(103, 110)) + sum(range(105, 110)))
+    assert Backup.query.count() == 20
+    assert len(os.listdir(fleet['dir'])) == 20
+
+
+def test_backups_being_uploaded_and_missing_files(fleet):
+    uploading = Backup.query.filter_by(service_id=fleet['tiered'], filename=f"{fleet['tiered']}-9.tar.gz").one()
+    uploading.offsite_status = 'uploading'
+    db.session.add(BackupUploadPart(backup_id=uploading.id, upload_id='u', part_number=1, size=1, etag='e'))
+    gone = Backup.query.filter_by(service_id=fleet['tiered'], filename=f"{fleet['tiered']}-8.tar.gz").one()
+    db.session.commit()
+    os.remove(gone.path)
+
+    report = backup_manager.prune_backups(service_ids=[fleet['tiered']], pause=0)
+
+    # A file that is already gone still loses its row, but reclaims nothing
+    assert report['deleted'] == 6
+    assert report['bytes_reclaimed'] == sum(100 + day for day in range(3, 8))
+    assert remaining(fleet['tiered']) == [0, 1, 2, 9]
+    assert remaining(fleet['legacy']) == list(range(10))
+    assert BackupUploadPart.query.count() == 1
@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from database import db
+from models import CustomerProfile, Service, User
+from utils.bulk_transfer import UNUSABLE_PASSWORD, SERVICE_FIELDS, bulk_transfer
+
+
+def export(entity, fmt):
+    return ''.join(bulk_transfer.export(entity, fmt))
+
+
+def import_text(entity, text, fmt, dry_run=False):
+    return bulk_transfer.import_file(entity, io.BytesIO(text.encode()), fmt, dry_run=dry_run)
+
+
+def services():
+    return [{name: getattr(service, name) for name in SERVICE_FIELDS}
+            for service in Service.query.order_by(Service.name)]
+
+
+@pytest.fixture
+def catalog(app):
+    db.session.add_all([
+        Service(name='Starter', description='=HYPERLINK("http://evil.example","click")', price=10,
+                is_active=True, created_at=datetime(2026, 1, 2, 3, 4, 5), container_image='nginx',
+                container_port=80, environment_vars={'MODE': '-prod'}, alert_phone='+1 555 0100'),
+        Service(name='@team plan', description="'=already quoted", price=25, is_active=False,
+                created_at=datetime(2026, 2, 3), cpu_quota=2, memory_quota=2048, backup_enabled=False,
+                alert_email='ops@example.com'),
+    ])
+    db.session.commit()
+
+
+def test_csv_export_quotes_cells_a_spreadsheet_would_run(catalog):
+    rows = {row['name']: row for row in csv.DictReader(io.StringIO(export('services', 'csv')))}
+
+    assert rows["'@team plan"]['description'] == "''=already quoted"
+    starter = rows['Starter']
+    assert starter['description'] == '\'=HYPERLINK("http://evil.example","click")'
+    assert starter['alert_phone'] == "'+1 555 0100"
+    assert starter['environment_vars'] == '{"MODE": "-prod"}'
+    assert starter['price'] == '10.0'
+
+
+def test_jsonl_export_keeps_values_as_they_are(catalog):
+    rows = [json.loads(line) for line in export('services', 'jsonl').splitlines()]
+    assert [row['name'] for row in rows] == ['Starter', '@team plan']
+    assert rows[0]['description'].startswith('=HYPERLINK')
+    assert rows[0]['created_at'] == '2026-01-02T03:04:05'
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+def test_services_survive_an_export_and_import(catalog, fmt):
+    before = services()
+    exported = export('services', fmt)
+    Service.query.delete()
+    db.session.commit()
+
+    report = import_text('services', exported, fmt)
+
+    assert (report['processed'], report['inserted'], report['failed']) == (2, 2, 0)
+    assert report['ignored_columns'] == []
+    assert services() == before
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+def test_customers_survive_an_export_and_import(app, fmt):
+    user = User(username='-dash', email='dash@example.com', created_at=datetime(2026, 3, 4),
+                stripe_customer_id='cus_123')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(CustomerProfile(user_id=user.id, company_name='=Acme', phone='+44 20 7946 0000'))
+    db.session.commit()
+    exported = export('customers', fmt)
+    CustomerProfile.query.delete()
+    User.query.delete()
+    db.session.commit()
+
+    report = import_text('customers', exported, fmt)
+
+    assert report['inserted'] == 1, report['errors']
+    user = User.query.one()
+    assert (user.username, user.email, user.stripe_customer_id) == ('-dash', 'dash@example.com', 'cus_123')
+    assert user.created_at == datetime(2026, 3, 4)
+    # Hashes are never exported, so imported customers reset their password
+    assert user.password_hash == UNUSABLE_PASSWORD
+    assert (user.profile.company_name, user.profile.phone) == ('=Acme', '+44 20 7946 0000')
+
+
+def test_dry_run_reports_without_inserting(app):
+    report = import_text('services', 'name,price\nStarter,10\nBusiness,25\n', 'csv', dry_run=True)
+
+    assert report['dry_run']
+    assert (report['processed'], report['inserted'], report['failed']) == (2, 2, 0)
+    assert Service.query.count() == 0
+
+
+def test_rejected_rows_are_reported_by_line(app, make_user):
+    make_user('taken')
+    text = ('username,email,company_name,favourite_colour\n'
+            'alice,alice@example.com,Acme,blue\n'
+            'taken,other@example.com,,\n'
+            ',nobody@example.com,,\n'
+            'bob,not-an-email,,\n'
+            'alice,alice2@example.com,,\n'
+            'carol,carol@example.com,,,extra\n')
+
+    report = import_text('customers', text, 'csv')
+
+    assert (report['processed'], report['inserted'], report['failed']) == (6, 1, 5)
+    assert report['ignored_columns'] == ['favourite_colour']
+    assert report['errors'] == [
+        {'line': 3, 'error': 'username taken already exists'},
+        {'line': 4, 'error': 'username is required'},
+        {'line': 5, 'error': 'email: is not a valid email address'},
+        {'line': 6, 'error': 'username alice already exists'},
+        {'line': 7, 'error': 'more values than columns'},
+    ]
+    assert not report['truncated']
+    assert [user.username for user in User.query.order_by(User.id)] == ['taken', 'alice']
+
+
+def test_rejected_json_lines_are_reported(app):
+    text = ('{"name": "Starter", "price": 10}\n'
+            'not json\n'
+            '["a", "list"]\n'
+            '\n'
+            '{"name": "Pro", "price": -1, "memory_quota": 1.5}\n')
+
+    report = import_text('services', text, 'jsonl')
+
+    assert (report['processed'], report['inserted'], report['failed']) == (4, 1, 3)
+    assert report['errors'][0]['line'] == 2
+    assert report['errors'][0]['error'].startswith('invalid JSON')
+    assert report['errors'][1:] == [
+        {'line': 3, 'error': 'not a JSON object'},
+        {'line': 5, 'error': 'price: must not be negative; memory_quota: must be a whole number'},
+    ]
@@ -0,0 +1,87 @@
+import pytest
+
+from database import db
+from models import Service
+from utils.catalog_cache import catalog_cache
+from utils.page_cache import page_cache
+from utils.query_stats import query_budget
+
+
+@pytest.fixture
+def catalog(app):
+    db.session.add_all([
+        Service(name='Starter', price=10, is_active=True, container_image='img'),
+        Service(name='Business', price=25, is_active=True, container_image='img'),
+        Service(name='Retired', price=5, is_active=False, container_image='img'),
+    ])
+    db.session.commit()
+    catalog_cache.warm()
+
+
+def names():
+    return [service['name'] for service in catalog_cache.active_services()]
+
+
+def service(name):
+    return Service.query.filter_by(name=name).one()
+
+
+def test_warm_cache_serves_without_queries(catalog):
+    loads = catalog_cache.loads
+    with query_budget(0):
+        assert names() == ['Starter', 'Business']
+        assert catalog_cache.version
+    assert catalog_cache.loads == loads
+
+
+def test_catalog_pages_run_no_query(catalog, app):
+    client = app.test_client()
+    for path in ('/', '/services/catalog'):
+        page_cache.clear()
+        with query_budget(0):
+            response = client.get(path)
+        assert response.status_code == 200
+        assert b'Business' in response.data
+
+
+def test_price_change_is_served_after_commit(catalog):
+    version = catalog_cache.version
+    service('Business').price = 5
+    db.session.flush()
+    assert names() == ['Starter', 'Business']
+
+    db.session.commit()
+    assert names() == ['Business', 'Starter']
+    assert catalog_cache.active_services()[0]['price'] == 5
+    assert catalog_cache.version != version
+
+
+def test_activation_changes_are_served(catalog):
+    service('Retired').is_active = True
+    db.session.commit()
+    assert names() == ['Retired', 'Starter', 'Business']
+
+    service('Starter').is_active = False
+    db.session.commit()
+    assert names() == ['Retired', 'Business']
+
+
+def test_new_and_deleted_services_are_served(catalog):
+    db.session.add(Service(name='Enterprise', price=150, is_active=True, container_image='img'))
+    db.session.commit()
+    assert names() == ['Starter', 'Business', 'Enterprise']
+
+    db.session.delete(service('Starter'))
+    db.session.commit()
+    assert names() == ['Business', 'Enterprise']
+
+
+def test_rolled_back_change_keeps_the_cache(catalog):
+    loads = catalog_cache.loads
+    service('Business').price = 5
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+
+    assert names() == ['Starter', 'Business']
+    assert catalog_cache.loads == loads
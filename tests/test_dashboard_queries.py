@@ -0,0 +1,63 @@
+import pytest
+
+from database import db
+from models import Container, Service
+from utils.query_stats import query_budget
+
+# The signed-in user, the grouped dashboard query and the user's profile for the avatar
+DASHBOARD_QUERIES = 3
+
+
+@pytest.fixture
+def customer(make_user):
+    """A customer running containers on two of three active services"""
+    user = make_user()
+    services = [Service(name=name, price=10, container_image='img', is_active=True)
+                for name in ('Blog', 'Shop', 'Wiki')]
+    db.session.add_all(services)
+    db.session.commit()
+    return user, services
+
+
+def deploy(user, service, count, status='running'):
+    db.session.add_all([
+        Container(name=f"{service.name}-{user.id}-{status}-{i}", container_id=f"{service.name}-{status}-{i}",
+                  status=status, user_id=user.id, service_id=service.id,
+                  cpu_usage=1.5, memory_usage=128, storage_usage=1024)
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('url', ['/dashboard', '/service/dashboard'])
+@pytest.mark.parametrize('containers', [1, 25])
+def test_dashboard_query_count_is_fixed(customer, client_for, url, containers):
+    user, services = customer
+    deploy(user, services[0], containers)
+    deploy(user, services[1], containers, status='stopped')
+    client = client_for(user)
+    db.session.expunge_all()
+
+    with query_budget(DASHBOARD_QUERIES, repeat_limit=1):
+        response = client.get(url)
+    assert response.status_code == 200
+    assert f"{containers}/{containers} running".encode() in response.data
+    assert f"0/{containers} running".encode() in response.data
+
+
+def test_main_dashboard_lists_every_active_service(customer, client_for):
+    user, services = customer
+    deploy(user, services[0], 2)
+
+    response = client_for(user).get('/dashboard')
+    for service in services:
+        assert service.name.encode() in response.data
+
+
+def test_service_dashboard_lists_deployed_services(customer, client_for):
+    user, services = customer
+    deploy(user, services[0], 2)
+
+    response = client_for(user).get('/service/dashboard')
+    assert b'Blog' in response.data
+    assert b'Wiki' not in response.data
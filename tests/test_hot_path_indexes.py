@@ -0,0 +1,51 @@
+"""The hot queries are planned on the indexes added in 2f6c8b4e7a15
+
+``ix_user_created_at`` and ``ix_system_activity_timestamp`` from that
+revision were later widened to ``ix_user_created_at_id`` and
+``ix_system_activity_timestamp_id``.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import db
+from models import Container, SystemActivity, SystemAlert, User
+
+
+def query_plan(query) -> str:
+    """EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL, as one string"""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'postgresql':
+        # The test tables are tiny; make the planner show whether an index applies
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = connection.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params)
+        return '\n'.join(row[0] for row in rows)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+    return '\n'.join(row[-1] for row in rows)
+
+
+def week_ago():
+    return datetime.utcnow() - timedelta(days=7)
+
+
+@pytest.mark.parametrize('query, index', [
+    # A customer's container for a service, behind every service route
+    (lambda: Container.query.filter_by(user_id=1, service_id=1, parent_id=None),
+     'ix_container_user_service_status'),
+    (lambda: Container.query.filter_by(user_id=1, service_id=1, parent_id=None, status='running'),
+     'ix_container_user_service_status'),
+    # Growth chart rollup
+    (lambda: User.query.filter(User.created_at >= week_ago()),
+     'ix_user_created_at_id'),
+    (lambda: Container.query.filter(Container.status == 'running', Container.created_at >= week_ago()),
+     'ix_container_created_at'),
+    # Admin dashboard panels
+    (lambda: SystemActivity.query.order_by(SystemActivity.timestamp.desc()).limit(5),
+     'ix_system_activity_timestamp_id'),
+    (lambda: SystemAlert.query.filter(SystemAlert.resolved_at.is_(None)).order_by(SystemAlert.timestamp.desc()),
+     'ix_system_alert_unresolved'),
+])
+def test_hot_query_uses_index(app, query, index):
+    assert index in query_plan(query())
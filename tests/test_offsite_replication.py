@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import itertools
+
+import pytest
+
+from database import db
+from models import Backup, BackupUploadPart, Service
+from utils.offsite_replication import MIN_PART_SIZE, OffsiteReplicator
+
+
+def md5_etag(data):
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+class FakeS3:
+    """Multipart uploads kept in memory, with S3's Content-MD5 check and ETags"""
+
+    def __init__(self):
+        self.uploads = {}
+        self.upload_ids = itertools.count(1)
+        self.objects = {}
+        self.sent = []
+        self.fail_parts = set()
+        self.head_etag = None
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f"upload-{next(self.upload_ids)}"
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        if PartNumber in self.fail_parts:
+            self.fail_parts.discard(PartNumber)
+            raise ConnectionError(f"Connection reset sending part {PartNumber}")
+        assert base64.b64decode(ContentMD5) == hashlib.md5(Body).digest()
+        self.sent.append(PartNumber)
+        self.uploads[UploadId][PartNumber] = Body
+        return {'ETag': md5_etag(Body)}
+
+    def get_paginator(self, operation):
+        assert operation == 'list_parts'
+        return self
+
+    def paginate(self, Bucket, Key, UploadId):
+        parts = self.uploads[UploadId]
+        yield {'Parts': [{'PartNumber': number, 'ETag': md5_etag(body)} for number, body in sorted(parts.items())]}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        assert [part['ETag'] for part in MultipartUpload['Parts']] == [md5_etag(parts[n]) for n in numbers]
+        combined = hashlib.md5(b''.join(hashlib.md5(parts[n]).digest() for n in numbers)).hexdigest()
+        self.objects[Key] = (b''.join(parts[n] for n in numbers), f'"{combined}-{len(numbers)}"')
+
+    def head_object(self, Bucket, Key):
+        body, etag = self.objects[Key]
+        return {'ContentLength': len(body), 'ETag': self.head_etag or etag}
+
+
+@pytest.fixture
+def s3():
+    return FakeS3()
+
+
+@pytest.fixture
+def replicator(s3):
+    return OffsiteReplicator(bucket='backups', prefix='offsite', part_size=MIN_PART_SIZE, concurrency=1,
+                             client=s3)
+
+
+@pytest.fixture
+def backup(app, tmp_path):
+    # Two full parts and a short third one
+    data = bytes(range(256)) * (2 * MIN_PART_SIZE // 256) + b'tail'
+    path = tmp_path / 'site.tar.gz'
+    path.write_bytes(data)
+    service = Service(name='Blog', price=10, container_image='img')
+    db.session.add(service)
+    db.session.flush()
+    backup = Backup(service_id=service.id, filename='site.tar.gz', path=str(path), size=len(data))
+    db.session.add(backup)
+    db.session.commit()
+    return backup
+
+
+def offsite_body(s3, backup):
+    return s3.objects[backup.offsite_key][0]
+
+
+def test_backup_is_uploaded_in_parts(replicator, s3, backup):
+    success, message = replicator.replicate(backup)
+
+    assert success, message
+    assert sorted(s3.sent) == [1, 2, 3]
+    assert backup.offsite_key == f"offsite/{backup.service_id}/site.tar.gz"
+    with open(backup.path, 'rb') as f:
+        assert offsite_body(s3, backup) == f.read()
+    assert backup.offsite_status == 'complete'
+    assert backup.offsite_upload_id is None
+    assert BackupUploadPart.query.count() == 0
+
+
+def test_interrupted_upload_resumes_with_the_remaining_parts(replicator, s3, backup):
+    s3.fail_parts = {3}
+    success, _ = replicator.replicate(backup)
+
+    assert not success
+    assert backup.offsite_status == 'failed'
+    assert sorted(part.part_number for part in BackupUploadPart.query) == [1, 2]
+
+    s3.sent.clear()
+    success, message = replicator.replicate(backup)
+    assert success, message
+    assert s3.sent == [3]
+    with open(backup.path, 'rb') as f:
+        assert offsite_body(s3, backup) == f.read()
+
+
+def test_part_with_a_different_etag_is_sent_again(replicator, s3, backup):
+    s3.fail_parts = {3}
+    replicator.replicate(backup)
+    # S3 holds something else under part 1 than what was recorded
+    s3.uploads[backup.offsite_upload_id][1] = b'overwritten'
+
+    s3.sent.clear()
+    success, message = replicator.replicate(backup)
+    assert success, message
+    assert sorted(s3.sent) == [1, 3]
+    with open(backup.path, 'rb') as f:
+        assert offsite_body(s3, backup) == f.read()
+
+
+def test_object_etag_mismatch_fails_and_is_retried(replicator, s3, backup):
+    s3.head_etag = f'"{"0" * 32}-3"'
+    success, message = replicator.replicate(backup)
+
+    assert not success
+    assert 'does not match the uploaded parts' in message
+    assert backup.offsite_status == 'failed'
+
+    # The completed upload is gone, so the retry starts a new one
+    s3.head_etag = None
+    s3.sent.clear()
+    assert replicator.replicate_pending() == 1
+    assert backup.offsite_status == 'complete'
+    assert sorted(s3.sent) == [1, 2, 3]
@@ -0,0 +1,172 @@
+from markupsafe import Markup
+
+from database import db
+from models import Service
+from utils.catalog_cache import CatalogCache
+from utils.fragment_cache import fragment_cache
+from utils.page_cache import page_cache
+from utils.version_stamp import VersionStamp
+
+
+def add_service(name, price):
+    service = Service(name=name, price=price, description=f"{name} plan", is_active=True, container_image='img')
+    db.session.add(service)
+    db.session.commit()
+    return service
+
+
+def test_bump_is_seen_by_every_stamp_on_the_file(tmp_path):
+    writer = VersionStamp('things', check_interval=0, directory=str(tmp_path))
+    reader = VersionStamp('things', check_interval=0, directory=str(tmp_path))
+    assert reader.changed()
+    assert not reader.changed()
+    assert reader.modified_at() is None
+
+    writer.bump()
+    assert reader.changed()
+    assert not reader.changed()
+    assert writer.changed()
+    assert reader.modified_at() is not None
+
+
+def test_stamp_checks_are_throttled(tmp_path):
+    writer = VersionStamp('things', directory=str(tmp_path))
+    reader = VersionStamp('things', check_interval=3600, directory=str(tmp_path))
+    reader.changed()
+
+    writer.bump()
+    assert not reader.changed()
+    reader._checked_at = 0.0
+    assert reader.changed()
+
+
+def test_service_write_reloads_the_catalog_in_another_worker(app):
+    add_service('Starter', 10)
+    worker = CatalogCache()
+    worker._stamp.check_interval = 0
+    assert [service['name'] for service in worker.active_services()] == ['Starter']
+    version = worker.version
+    assert worker.loads == 1
+
+    worker.active_services()
+    assert worker.loads == 1
+
+    add_service('Business', 25)
+    assert [service['name'] for service in worker.active_services()] == ['Starter', 'Business']
+    assert worker.loads == 2
+    assert worker.version != version
+
+
+def test_anonymous_page_is_served_from_the_cache(app):
+    add_service('Starter', 10)
+    client = app.test_client()
+    hits, misses = page_cache.hits, page_cache.misses
+
+    first = client.get('/services/catalog')
+    assert first.status_code == 200
+    assert (page_cache.hits, page_cache.misses) == (hits, misses + 1)
+
+    second = client.get('/services/catalog')
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert (page_cache.hits, page_cache.misses) == (hits + 1, misses + 1)
+
+
+def test_matching_etag_gets_a_304(app):
+    add_service('Starter', 10)
+    client = app.test_client()
+    etag = client.get('/services/catalog').headers['ETag']
+    not_modified = page_cache.not_modified
+
+    response = client.get('/services/catalog', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert page_cache.not_modified == not_modified + 1
+
+
+def test_service_change_renders_the_page_again(app):
+    add_service('Starter', 10)
+    client = app.test_client()
+    first = client.get('/services/catalog')
+    misses = page_cache.misses
+
+    add_service('Business', 25)
+    response = client.get('/services/catalog', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert b'Business' in response.data
+    assert response.headers['ETag'] != first.headers['ETag']
+    assert page_cache.misses == misses + 1
+
+
+def test_fragment_is_rendered_once_per_key(app):
+    fragment_cache.clear()
+    calls = []
+    template = app.jinja_env.from_string("{% cache 'greeting:' ~ name %}{{ render(name) }}{% endcache %}")
+
+    def render(name):
+        calls.append(name)
+        return f"Hello {name}"
+
+    hits, misses = fragment_cache.hits, fragment_cache.misses
+    with app.test_request_context('/'):
+        assert template.render(name='Ada', render=render) == 'Hello Ada'
+        assert template.render(name='Ada', render=render) == 'Hello Ada'
+        assert template.render(name='Bob', render=render) == 'Hello Bob'
+
+    assert calls == ['Ada', 'Bob']
+    assert (fragment_cache.hits, fragment_cache.misses) == (hits + 1, misses + 2)
+
+
+def test_fragments_are_evicted_to_stay_under_the_byte_budget(app, monkeypatch):
+    fragment_cache.clear()
+    monkeypatch.setattr(fragment_cache, 'max_bytes', 100)
+    evictions = fragment_cache.evictions
+    for key in ('a', 'b', 'c', 'd', 'e'):
+        fragment_cache.set(key, Markup('x' * 24))
+
+    assert fragment_cache.size == 96
+    assert fragment_cache.get('a') is None
+    assert fragment_cache.get('e') == 'x' * 24
+    assert fragment_cache.evictions == evictions + 1
+    # Larger than a quarter of the budget
+    fragment_cache.set('big', Markup('x' * 26))
+    assert fragment_cache.get('big') is None
+    fragment_cache.clear()
+
+
+def test_cached_page_headers_let_a_cdn_reuse_it(app):
+    add_service('Starter', 10)
+    response = app.test_client().get('/')
+
+    assert response.status_code == 200
+    assert response.cache_control.public
+    assert response.cache_control.max_age == page_cache.max_age
+    assert 'Cookie' in response.vary
+    assert response.last_modified is not None
+
+    since = response.headers['Last-Modified']
+    assert app.test_client().get('/', headers={'If-Modified-Since': since}).status_code == 304
+
+
+def test_theme_cookies_get_their_own_entry(app):
+    add_service('Starter', 10)
+    client = app.test_client()
+    client.get('/')
+    misses = page_cache.misses
+
+    client.set_cookie('theme', 'dark')
+    client.get('/')
+    client.get('/')
+    assert page_cache.misses == misses + 1
+
+
+def test_signed_in_users_bypass_the_cache(app, make_user, client_for):
+    add_service('Starter', 10)
+    client = client_for(make_user())
+    hits, misses = page_cache.hits, page_cache.misses
+
+    for _ in range(2):
+        response = client.get('/services/catalog')
+        assert response.status_code == 200
+        assert 'ETag' not in response.headers
+    assert (page_cache.hits, page_cache.misses) == (hits, misses)
@@ -0,0 +1,52 @@
+import pytest
+
+from database import db
+from models import SystemActivity, User
+from routes.admin import get_recent_activities
+from utils.query_stats import QueryBudgetExceeded, query_budget
+
+
+@pytest.fixture
+def admin_with_activity(make_user):
+    """An admin plus five recent activities, each by a different customer"""
+    admin_id = make_user('admin', is_admin=True).id
+    for i in range(5):
+        user = make_user(f"customer{i}")
+        db.session.add(SystemActivity(action='login', description=f"customer{i} signed in", user_id=user.id))
+    db.session.commit()
+    db.session.expunge_all()
+    return db.session.get(User, admin_id)
+
+
+def test_budget_catches_lazy_loaded_activity_users(admin_with_activity):
+    # The admin dashboard's recent activity panel as it was: one user SELECT per row
+    with pytest.raises(QueryBudgetExceeded, match='Statement ran 5 times'):
+        with query_budget(10, repeat_limit=1):
+            activities = SystemActivity.query.order_by(SystemActivity.timestamp.desc()).limit(5).all()
+            [activity.user.username for activity in activities]
+
+
+def test_budget_counts_every_statement(admin_with_activity):
+    with pytest.raises(QueryBudgetExceeded, match='6 queries run, budget is 5'):
+        with query_budget(5):
+            activities = SystemActivity.query.order_by(SystemActivity.timestamp.desc()).limit(5).all()
+            [activity.user.username for activity in activities]
+
+
+def test_recent_activities_load_users_up_front(admin_with_activity):
+    with query_budget(1) as queries:
+        usernames = [activity.user.username for activity in get_recent_activities()]
+    assert queries.count == 1
+    assert sorted(usernames) == [f"customer{i}" for i in range(5)]
+
+
+def test_admin_dashboard_within_budget(admin_with_activity, client_for):
+    client = client_for(admin_with_activity)
+    # The first request rolls up the chart and seeds the platform counters
+    assert client.get('/admin/').status_code == 200
+    db.session.expunge_all()
+
+    with query_budget(4, repeat_limit=1):
+        response = client.get('/admin/')
+    assert response.status_code == 200
+    assert b'By customer0' in response.data
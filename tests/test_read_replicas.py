@@ -0,0 +1,95 @@
+"""Read/write routing with DATABASE_REPLICA_URLS pointing at a second SQLite file
+
+The two files are not replicated; each holds a different user, so every
+response shows which database served it.
+"""
+import time
+
+import pytest
+from flask import Flask, request
+
+from database import db, init_db, replica_router, use_primary
+from models import User
+
+
+@pytest.fixture
+def replicated_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', f"sqlite:///{tmp_path / 'replica.db'}")
+    monkeypatch.setattr(replica_router, 'sticky_seconds', 0.3)
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    init_db(app)
+
+    def usernames():
+        return ','.join(user.username for user in User.query.order_by(User.username))
+
+    @app.route('/users')
+    def list_users():
+        if request.args.get('primary'):
+            with use_primary():
+                return usernames()
+        return usernames()
+
+    @app.route('/users', methods=['POST'])
+    def add_user():
+        name = request.form['name']
+        db.session.add(User(username=name, email=f"{name}@example.com", password_hash='x'))
+        db.session.commit()
+        return usernames()
+
+    @app.route('/users/touch')
+    def touch():
+        # A GET handler that writes, then reads in the same request
+        db.session.add(User(username='touched', email='touched@example.com', password_hash='x'))
+        db.session.flush()
+        return usernames()
+
+    with app.app_context():
+        for key, name in ((None, 'on-primary'), ('replica_0', 'on-replica')):
+            engine = db.engines[key]
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(db.insert(User), {'username': name, 'email': f"{name}@example.com",
+                                                     'password_hash': 'x', 'auth_version': 0})
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    # init_app registered the replica bind's metadata on the shared db; the main app has no such bind
+    db.metadatas.pop('replica_0', None)
+
+
+def test_get_reads_from_the_replica(replicated_app):
+    client = replicated_app.test_client()
+    assert client.get('/users').text == 'on-replica'
+
+
+def test_use_primary_reads_from_the_primary(replicated_app):
+    client = replicated_app.test_client()
+    assert client.get('/users?primary=1').text == 'on-primary'
+
+
+def test_writes_go_to_the_primary(replicated_app):
+    client = replicated_app.test_client()
+    assert client.post('/users', data={'name': 'new'}).text == 'new,on-primary'
+    with replicated_app.app_context():
+        with db.engines['replica_0'].connect() as connection:
+            assert connection.execute(db.select(User.username)).scalars().all() == ['on-replica']
+
+
+def test_reads_after_a_write_in_a_get_stay_on_the_primary(replicated_app):
+    client = replicated_app.test_client()
+    assert client.get('/users/touch').text == 'on-primary,touched'
+
+
+def test_client_sticks_to_the_primary_right_after_writing(replicated_app):
+    client = replicated_app.test_client()
+    client.post('/users', data={'name': 'new'})
+    assert client.get('/users').text == 'new,on-primary'
+
+    # Another client never wrote, and this one goes back once the window passes
+    assert replicated_app.test_client().get('/users').text == 'on-replica'
+    time.sleep(0.4)
+    assert client.get('/users').text == 'on-replica'
@@ -0,0 +1,114 @@
+import pytest
+
+from database import db
+from models import Service
+from utils.query_stats import query_budget
+from utils.service_search import ServiceSearch, service_search
+
+
+@pytest.fixture
+def catalog(app):
+    db.session.add_all([
+        Service(name='WordPress Starter', description='Managed blogging', price=10, memory_quota=512,
+                storage_quota=1024, backup_enabled=False, is_active=True, container_image='img'),
+        Service(name='WordPress Business', description='Managed blogging with staging', price=25,
+                memory_quota=2048, storage_quota=10240, is_active=True, container_image='img'),
+        Service(name='Ghost Publisher', description='Newsletters and blogging', price=15, memory_quota=1024,
+                storage_quota=5120, is_active=True, container_image='img'),
+        Service(name='WordPress Legacy', description='Retired plan', price=5, is_active=False,
+                container_image='img'),
+    ])
+    db.session.commit()
+    service_search.warm()
+
+
+def names(query, **kwargs):
+    return [result['name'] for result in service_search.search(query, **kwargs)['results']]
+
+
+def service(name):
+    return Service.query.filter_by(name=name).one()
+
+
+def test_name_matches_rank_above_description_matches(catalog):
+    assert names('ghost') == ['Ghost Publisher']
+    assert names('blogging') == ['WordPress Starter', 'Ghost Publisher', 'WordPress Business']
+    # Ties on score go to the cheaper plan
+    assert names('wordpress') == ['WordPress Starter', 'WordPress Business']
+    assert service_search.search('wordpress', limit=1)['total'] == 2
+
+
+def test_prefixes_and_typos_match(catalog):
+    assert names('word bus') == ['WordPress Business']
+    assert names('publisehr') == ['Ghost Publisher']
+    assert names('wrodpress starter') == ['WordPress Starter']
+    assert names('nothing') == []
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('memory>=2048', ['WordPress Business']),
+    ('mem>=1gb', ['Ghost Publisher', 'WordPress Business']),
+    ('price<20', ['WordPress Starter', 'Ghost Publisher']),
+    ('storage:5120', ['Ghost Publisher']),
+    ('blogging price>=15', ['Ghost Publisher', 'WordPress Business']),
+    ('backups:no', ['WordPress Starter']),
+])
+def test_filters_narrow_the_results(catalog, query, expected):
+    assert names(query) == expected
+
+
+def test_inactive_services_only_when_asked(catalog):
+    assert 'WordPress Legacy' not in names('wordpress')
+    assert 'WordPress Legacy' in names('wordpress', include_inactive=True)
+    assert names('active:no', include_inactive=True) == ['WordPress Legacy']
+
+
+def test_warm_index_searches_without_queries(catalog):
+    with query_budget(0):
+        assert names('ghost') == ['Ghost Publisher']
+
+
+def test_committed_changes_are_applied_in_place(catalog):
+    service('Ghost Publisher').name = 'Ghost Newsroom'
+    db.session.add(Service(name='Drupal Enterprise', price=99, is_active=True, container_image='img'))
+    db.session.delete(service('WordPress Starter'))
+    db.session.flush()
+    # Nothing changes until the commit
+    assert names('ghost') == ['Ghost Publisher']
+    db.session.commit()
+
+    with query_budget(0):
+        assert names('ghost') == ['Ghost Newsroom']
+        assert names('publisher') == []
+        assert names('drupal') == ['Drupal Enterprise']
+        assert names('wordpress') == ['WordPress Business']
+    assert 'starter' not in service_search._postings
+
+
+def test_rolled_back_changes_are_ignored(catalog):
+    service('Ghost Publisher').name = 'Ghost Newsroom'
+    db.session.flush()
+    db.session.rollback()
+
+    assert names('ghost') == ['Ghost Publisher']
+    db.session.commit()
+    assert names('newsroom') == []
+
+
+def test_other_workers_rebuild_after_a_change(catalog):
+    worker = ServiceSearch()
+    worker._stamp.check_interval = 0
+    assert [result['name'] for result in worker.search('ghost')['results']] == ['Ghost Publisher']
+
+    with query_budget(0):
+        worker.search('ghost')
+
+    service('Ghost Publisher').is_active = False
+    db.session.commit()
+    assert worker.search('ghost')['results'] == []
+
+
+def test_search_endpoint(catalog, app):
+    response = app.test_client().get('/service/search?q=word+bus')
+    assert response.status_code == 200
+    assert [result['name'] for result in response.get_json()['results']] == ['WordPress Business']
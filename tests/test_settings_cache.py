@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+
+from database import db
+from models import SystemSettings
+from utils.query_stats import query_budget
+from utils.settings_cache import REDACTED, SettingsCache, settings_cache
+
+
+@pytest.fixture
+def settings(app):
+    SystemSettings.set_setting('SMTP_SERVER', 'smtp.example.com')
+    SystemSettings.set_setting('SMTP_PORT', '587')
+    SystemSettings.set_setting('SMTP_PASSWORD', 'hunter2', is_secret=True)
+
+
+def other_worker():
+    worker = SettingsCache()
+    worker._stamp.check_interval = 0
+    return worker
+
+
+def test_all_settings_load_in_one_query_then_cost_none(settings):
+    worker = other_worker()
+    with query_budget(1):
+        assert worker.get('SMTP_SERVER') == 'smtp.example.com'
+    with query_budget(0):
+        assert worker.get('SMTP_PORT') == '587'
+        assert worker.get('MISSING', 'fallback') == 'fallback'
+        assert worker.all()['SMTP_PASSWORD'] == 'hunter2'
+
+
+def test_set_setting_is_seen_here_and_by_other_workers(settings):
+    worker = other_worker()
+    assert worker.get('SMTP_PORT') == '587'
+    assert SystemSettings.get_setting('SMTP_PORT') == '587'
+
+    SystemSettings.set_setting('SMTP_PORT', '2525')
+
+    assert SystemSettings.get_setting('SMTP_PORT') == '2525'
+    assert worker.get('SMTP_PORT') == '2525'
+
+
+def test_orm_writes_invalidate_at_commit(settings):
+    worker = other_worker()
+    assert worker.get('SMTP_SERVER') == 'smtp.example.com'
+
+    SystemSettings.query.filter_by(key='SMTP_SERVER').one().value = 'mail.example.com'
+    db.session.flush()
+    assert worker.get('SMTP_SERVER') == 'smtp.example.com'
+    db.session.commit()
+    assert worker.get('SMTP_SERVER') == 'mail.example.com'
+
+    db.session.delete(SystemSettings.query.filter_by(key='SMTP_SERVER').one())
+    db.session.commit()
+    assert worker.get('SMTP_SERVER') is None
+    assert settings_cache.get('SMTP_SERVER') is None
+
+
+def test_rolled_back_write_keeps_the_cache(settings):
+    worker = other_worker()
+    assert worker.get('SMTP_PORT') == '587'
+    SystemSettings.query.filter_by(key='SMTP_PORT').one().value = '25'
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+
+    with query_budget(0):
+        assert worker.get('SMTP_PORT') == '587'
+
+
+def test_secret_values_stay_out_of_logs(settings, caplog):
+    caplog.set_level(logging.DEBUG)
+    worker = other_worker()
+
+    assert worker.get('SMTP_PASSWORD') == 'hunter2'
+    assert worker.redacted() == {'SMTP_SERVER': 'smtp.example.com', 'SMTP_PORT': '587',
+                                 'SMTP_PASSWORD': REDACTED}
+    assert 'hunter2' not in repr(SystemSettings.query.filter_by(key='SMTP_PASSWORD').one())
+    assert 'hunter2' not in caplog.text
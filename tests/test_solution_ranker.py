@@ -0,0 +1,65 @@
+import pytest
+
+from database import db
+from models import Service
+from utils.solution_ranker import SolutionRanker
+
+CATALOG = [
+    # name, cpu, memory MB, storage MB, price, backups
+    ('Starter', 0.5, 512, 10240, 10, False),
+    ('Business', 1, 1024, 20480, 25, True),
+    ('Pro', 2, 2048, 51200, 60, True),
+    ('Enterprise', 4, 4096, 102400, 150, True),
+]
+
+
+@pytest.fixture
+def ranker(app):
+    db.session.add_all([
+        Service(name=name, price=price, cpu_quota=cpu, memory_quota=memory, storage_quota=storage,
+                backup_enabled=backups, is_active=True, container_image='img')
+        for name, cpu, memory, storage, price, backups in CATALOG
+    ])
+    db.session.commit()
+    return SolutionRanker()
+
+
+def ranked(results):
+    return [(result['name'], result['score']) for result in results]
+
+
+def test_small_blog_on_a_basic_budget(ranker):
+    # cpu 1, memory 2, storage 1 and price 3 out of 7; Pro and Enterprise are over the $30 budget
+    results = ranker.rank({'1': 'blog', '2': 'small', '3': 'support', '4': 'basic'})
+    assert ranked(results) == [('Business', 89), ('Starter', 87), ('Pro', 71)]
+    assert results[0]['reasons'] == [
+        'Meets the 0.5 CPU cores your site needs',
+        'Meets the 512MB memory for your traffic',
+        '$25.00/month fits your budget',
+    ]
+    assert results[2]['reasons'][-1] == '$60.00/month is above your $30 budget'
+
+
+def test_large_secure_enterprise_on_a_premium_budget(ranker):
+    # Anything under $100 fits the premium budget at 0.9
+    results = ranker.rank({'1': 'enterprise', '2': 'large', '3': 'security', '4': 'premium'}, top_k=4)
+    assert ranked(results) == [('Enterprise', 100), ('Pro', 98), ('Business', 71), ('Starter', 29)]
+    assert '1 of the 2 CPU cores your site needs' in results[2]['reasons']
+    assert 'No daily backups' in results[3]['reasons']
+
+
+def test_without_answers_the_cheapest_wins(ranker):
+    results = ranker.rank({})
+    assert ranked(results) == [('Starter', 0), ('Business', 0), ('Pro', 0)]
+
+
+def test_matrix_follows_catalog_changes(ranker):
+    ranker.rank({})
+    assert ranker.rebuilds == 1
+    ranker.rank({'1': 'blog'})
+    assert ranker.rebuilds == 1
+
+    Service.query.filter_by(name='Enterprise').one().price = 5
+    db.session.commit()
+    assert ranked(ranker.rank({}))[0] == ('Enterprise', 0)
+    assert ranker.rebuilds == 2
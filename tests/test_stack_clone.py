@@ -0,0 +1,113 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+from models import Container, Service
+from utils import stack_clone
+from utils.stack_clone import StackCloner
+
+HEX_ID = '4f2a9c0d1e7b' + '0' * 52
+
+
+class FakePodman:
+    """Answers the podman commands a clone runs, from a fixed set of containers"""
+
+    def __init__(self, tmp_path, containers):
+        self.root = tmp_path
+        self.containers = containers
+        self.commands = []
+
+    def mountpoint(self, volume):
+        return str(self.root / volume)
+
+    def __call__(self, command, **kwargs):
+        self.commands.append(command)
+        args = command[1:]
+        stdout = ''
+        if args[0] == 'ps':
+            stdout = '\n'.join(self.containers)
+        elif args[0] == 'inspect':
+            stdout = json.dumps([self.containers[args[1]]])
+        elif args[:2] == ['volume', 'create']:
+            os.makedirs(self.mountpoint(args[2]), exist_ok=True)
+        elif args[:2] == ['volume', 'inspect']:
+            stdout = self.mountpoint(args[-1])
+        return subprocess.CompletedProcess(command, 0, stdout=stdout if kwargs.get('text') else stdout.encode(),
+                                           stderr='' if kwargs.get('text') else b'')
+
+    def created(self):
+        return {command[3]: command for command in self.commands if command[1] == 'create'}
+
+
+def inspected(name, container_id, volume, destination):
+    return {
+        'Id': container_id,
+        'Name': name,
+        'State': {'Running': True},
+        'Config': {'Env': ['APP_ENV=production']},
+        'Mounts': [{'Type': 'volume', 'Name': volume, 'Destination': destination}],
+        'ImageName': 'docker.io/library/nginx:latest',
+    }
+
+
+@pytest.fixture
+def podman(tmp_path, monkeypatch):
+    def podman(containers):
+        fake = FakePodman(tmp_path, containers)
+        for volume in {mount['Name'] for info in containers.values() for mount in info['Mounts']}:
+            os.makedirs(fake.mountpoint(volume))
+            with open(os.path.join(fake.mountpoint(volume), 'index.html'), 'w') as f:
+                f.write(volume)
+        monkeypatch.setattr(stack_clone.subprocess, 'run', fake)
+        monkeypatch.setattr(StackCloner, '_allocate_port', staticmethod(lambda: 18080))
+        return fake
+    return podman
+
+
+def test_clone_of_a_plain_deploy_stored_by_hex_id(podman):
+    fake = podman({
+        'blog-1': inspected('blog-1', HEX_ID, 'blog-1-data', '/usr/share/nginx/html'),
+        'blog-12': inspected('blog-12', 'f' * 64, 'blog-12-data', '/usr/share/nginx/html'),
+    })
+    service = Service(id=3, name='Blog')
+    container = Container(id=9, container_id=HEX_ID, name='blog-1', user_id=1, service_id=3, port=80)
+
+    clone, message = StackCloner().clone(service, container)
+
+    assert clone is not None, message
+    assert clone.container_id == 'blog-1-staging1'
+    assert clone.port == 18080
+    created = fake.created()
+    assert list(created) == ['blog-1-staging1']
+    command = created['blog-1-staging1']
+    assert command[command.index('-p') + 1] == '18080:80'
+    assert command[command.index('-v') + 1] == 'blog-1-staging1-data:/usr/share/nginx/html'
+    with open(fake.mountpoint('blog-1-staging1-data') + '/index.html') as f:
+        assert f.read() == 'blog-1-data'
+
+
+def test_clone_of_a_named_stack_skips_earlier_clones(podman):
+    fake = podman({
+        'shop-2-nginx': inspected('shop-2-nginx', 'a' * 64, 'shop-2-html', '/var/www/html'),
+        'shop-2-db': inspected('shop-2-db', 'b' * 64, 'shop-2-mysql', '/var/lib/mysql'),
+        'shop-2-staging1-nginx': inspected('shop-2-staging1-nginx', 'c' * 64, 'shop-2-staging1-html',
+                                           '/var/www/html'),
+    })
+    service = Service(id=4, name='Shop')
+    container = Container(id=11, container_id='shop-2-nginx', name='shop-2', user_id=2, service_id=4,
+                          port=8080, environment={'stack_name': 'shop-2'})
+
+    clone, message = StackCloner().clone(service, container)
+
+    assert clone is not None, message
+    assert clone.name == 'shop-2-staging2'
+    assert clone.container_id == 'shop-2-staging2-nginx'
+    assert clone.environment['stack_name'] == 'shop-2-staging2'
+    created = fake.created()
+    assert sorted(created) == ['shop-2-staging2-db', 'shop-2-staging2-nginx']
+    assert '18080:8080' in created['shop-2-staging2-nginx']
+    assert '-p' not in created['shop-2-staging2-db']
+    paused = next(command for command in fake.commands if command[1] == 'pause')
+    assert sorted(paused[2:]) == ['shop-2-db', 'shop-2-nginx']
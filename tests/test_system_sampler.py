@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import psutil
+import pytest
+
+from utils import system_sampler as sampler_module
+from utils.system_sampler import SystemSampler, system_sampler
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    """Network counters that the test moves forward by hand"""
+    state = SimpleNamespace(sent=0, recv=0)
+    monkeypatch.setattr(psutil, 'net_io_counters', lambda: SimpleNamespace(bytes_sent=state.sent,
+                                                                            bytes_recv=state.recv))
+    return state
+
+
+@pytest.fixture
+def sampler(monkeypatch, counters):
+    monkeypatch.setenv('SYSTEM_SAMPLE_INTERVAL', '60')
+    monkeypatch.setenv('SYSTEM_SAMPLE_HISTORY', '3')
+    return SystemSampler()
+
+
+def test_samples_are_kept_in_a_ring_buffer(sampler, counters, monkeypatch):
+    clock = iter(range(1000, 1005))
+    monkeypatch.setattr(sampler_module.time, 'time', lambda: next(clock))
+    first = sampler.sample()
+    assert first['network']['sent_per_sec'] == 0
+    assert 0 <= first['cpu'] <= 100
+    assert first['disk']['total'] > 0
+
+    counters.sent, counters.recv = 4000, 1000
+    second = sampler.sample()
+    assert (second['network']['sent_per_sec'], second['network']['recv_per_sec']) == (4000, 1000)
+
+    sampler.sample()
+    sampler.sample()
+    assert [sample['timestamp'] for sample in sampler._samples] == [1001, 1002, 1003]
+
+
+def test_latest_reuses_a_fresh_sample(sampler):
+    first = sampler.latest()
+    assert sampler.latest() is first
+    assert len(sampler._samples) == 1
+
+    first['timestamp'] -= sampler.interval
+    assert sampler.latest() is not first
+    assert len(sampler._samples) == 2
+
+
+def test_window_returns_recent_samples_oldest_first(sampler):
+    old = sampler.sample()
+    old['timestamp'] -= 600
+    recent = sampler.sample()
+
+    assert sampler.window(300) == [recent]
+    assert sampler.window(3600) == [old, recent]
+
+
+def test_background_thread_fills_the_buffer(monkeypatch, counters):
+    monkeypatch.setenv('SYSTEM_SAMPLE_INTERVAL', '0.01')
+    sampler = SystemSampler()
+    sampler.start()
+    try:
+        deadline = time.time() + 5
+        while len(sampler._samples) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(sampler._samples) >= 3
+        # Reads take the thread's latest sample rather than sampling inline
+        sampled = threading.Event()
+        monkeypatch.setattr(sampler, 'sample', lambda: sampled.set())
+        assert sampler.latest()['cpu'] is not None
+        assert not sampled.is_set()
+    finally:
+        sampler.stop()
+        sampler._thread.join(timeout=5)
+    assert not sampler._thread.is_alive()
+
+
+def test_health_endpoints_read_the_latest_sample(app, make_user, client_for, monkeypatch):
+    sample = system_sampler.sample()
+    monkeypatch.setattr(system_sampler, 'interval', 3600)
+
+    def blocking(*args, **kwargs):
+        raise AssertionError('sampled during a request')
+    monkeypatch.setattr(system_sampler, 'sample', blocking)
+
+    response = app.test_client().get('/health/status')
+    assert response.status_code == 200
+    assert json.loads(response.data) == {'status': 'ok', 'cpu': sample['cpu'], 'memory': sample['memory']}
+
+    metrics = client_for(make_user('admin', is_admin=True)).get('/admin/health/metrics?window=60').get_json()
+    assert metrics['status'] == 'ok'
+    assert (metrics['cpu'], metrics['disk']) == (sample['cpu'], sample['disk'])
+    assert metrics['history'][-1]['cpu'] == sample['cpu']
@@ -0,0 +1,106 @@
+import pytest
+
+from database import db
+from models import User
+from utils.query_stats import query_budget
+from utils.user_cache import UserCache, user_cache
+
+
+@pytest.fixture
+def cache(app, monkeypatch):
+    # conftest turns the cache off so query counts elsewhere don't depend on test order
+    monkeypatch.setattr(user_cache, 'ttl', 60)
+    user_cache._entries.clear()
+    return user_cache
+
+
+@pytest.fixture
+def other_worker(app):
+    worker = UserCache()
+    worker._stamp.check_interval = 0
+    return worker
+
+
+def cached_user(cache, user_id):
+    db.session.expunge_all()
+    return cache.get(user_id)
+
+
+def test_second_lookup_runs_no_query(cache, make_user):
+    user_id = make_user().id
+    hits = cache.hits
+
+    assert cached_user(cache, user_id).username == 'customer'
+    with query_budget(0):
+        user = cached_user(cache, user_id)
+    assert user.username == 'customer'
+    assert cache.hits == hits + 1
+    # Merged into the session, so it behaves like any loaded user
+    assert user in db.session
+
+
+def test_password_change_is_never_served_from_cache(cache, other_worker, make_user):
+    user_id = make_user().id
+    cached_user(cache, user_id)
+    cached_user(other_worker, user_id)
+    old_hash = cache.get(user_id).password_hash
+
+    user = db.session.get(User, user_id)
+    user.set_password('new password')
+    db.session.commit()
+
+    assert user.auth_version == 1
+    assert cached_user(cache, user_id).password_hash != old_hash
+    revalidations = other_worker.revalidations
+    fresh = cached_user(other_worker, user_id)
+    assert fresh.password_hash != old_hash
+    assert fresh.auth_version == 1
+    assert other_worker.revalidations == revalidations + 1
+
+
+def test_admin_flag_change_reaches_other_workers(cache, other_worker, make_user):
+    user_id = make_user().id
+    assert not cached_user(other_worker, user_id).is_admin
+
+    db.session.get(User, user_id).is_admin = True
+    db.session.commit()
+
+    assert cached_user(other_worker, user_id).is_admin
+
+
+def test_profile_change_is_evicted_here(cache, make_user):
+    user_id = make_user().id
+    cached_user(cache, user_id)
+
+    db.session.get(User, user_id).email = 'changed@example.com'
+    db.session.commit()
+
+    assert cached_user(cache, user_id).email == 'changed@example.com'
+    assert db.session.get(User, user_id).auth_version == 0
+
+
+def test_rolled_back_change_keeps_the_entry(cache, make_user):
+    user_id = make_user().id
+    cached_user(cache, user_id)
+    evictions = cache.evictions
+
+    db.session.get(User, user_id).is_admin = True
+    db.session.flush()
+    db.session.rollback()
+
+    assert cache.evictions == evictions
+    with query_budget(0):
+        assert not cached_user(cache, user_id).is_admin
+
+
+def test_deleted_user_is_dropped(cache, other_worker, make_user):
+    user_id = make_user().id
+    cached_user(cache, user_id)
+    cached_user(other_worker, user_id)
+
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+
+    assert cached_user(cache, user_id) is None
+    assert cached_user(other_worker, user_id) is None
+
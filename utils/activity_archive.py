@@ -0,0 +1,265 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, text, tuple_
+
+from database import db
+from models import ActivityArchive, SystemActivity
+from utils.job_lock import job_lock
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 50
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return day.replace(year=day.year + day.month // 12, month=day.month % 12 + 1, day=1)
+
+
+def encode_cursor(activity: SystemActivity) -> str:
+    return f"{activity.timestamp.isoformat()}_{activity.id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        timestamp, activity_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(activity_id)
+    except ValueError:
+        return None
+
+
+def browse_activity(user_id: Optional[int] = None, action: Optional[str] = None,
+                    before: Optional[str] = None, after: Optional[str] = None,
+                    per_page: int = PAGE_SIZE) -> dict:
+    """One page of activity, newest first, using keyset pagination on (timestamp, id)
+
+    ``before`` continues with older rows and ``after`` goes back to newer
+    ones; both take the cursor of the row at the edge of the current page.
+    Each page is an index range scan no matter how deep it is.
+    """
+    # A row-value comparison lets the database seek straight into the index
+    keyset = tuple_(SystemActivity.timestamp, SystemActivity.id)
+    query = SystemActivity.query.options(db.joinedload(SystemActivity.user))
+    if user_id:
+        query = query.filter(SystemActivity.user_id == user_id)
+    if action:
+        query = query.filter(SystemActivity.action == action)
+
+    newer = decode_cursor(after)
+    older = decode_cursor(before)
+    if newer:
+        timestamp, activity_id = newer
+        query = query.filter(keyset > tuple_(timestamp, activity_id)) \
+            .order_by(SystemActivity.timestamp.asc(), SystemActivity.id.asc())
+    else:
+        if older:
+            timestamp, activity_id = older
+            query = query.filter(keyset < tuple_(timestamp, activity_id))
+        query = query.order_by(SystemActivity.timestamp.desc(), SystemActivity.id.desc())
+
+    # One extra row tells whether another page exists in that direction
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if newer:
+        rows.reverse()
+
+    return {
+        'activities': rows,
+        'older': encode_cursor(rows[-1]) if rows and (more or newer) else None,
+        'newer': encode_cursor(rows[0]) if rows and (older or (newer and more)) else None,
+    }
+
+
+class ActivityArchiver:
+    """Move old SystemActivity months out of the database into gzip'd JSON lines
+
+    On PostgreSQL the table is range-partitioned by month (see the
+    ``partition_system_activity`` migration): partitions are created ahead of
+    time, and an archived month's partition is detached and dropped, which
+    costs the same however many rows it held. Elsewhere, or for rows that
+    landed in the default partition, archived rows are deleted in batches.
+    Months older than ``ACTIVITY_RETENTION_DAYS`` are archived to
+    ``ACTIVITY_ARCHIVE_DIR`` and recorded in ActivityArchive.
+    """
+
+    def __init__(self):
+        self.retention_days = int(os.environ.get('ACTIVITY_RETENTION_DAYS', 90))
+        self.archive_dir = os.environ.get('ACTIVITY_ARCHIVE_DIR', '/backups/activity')
+        self.interval = int(os.environ.get('ACTIVITY_ARCHIVE_INTERVAL', 86400))
+        self.months_ahead = 2
+        self.batch_size = 5000
+        self._thread = None
+        self._stop = threading.Event()
+
+    def is_partitioned(self) -> bool:
+        if db.engine.dialect.name != 'postgresql':
+            return False
+        return bool(db.session.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = 'system_activity'"
+        )).scalar())
+
+    def ensure_partitions(self) -> None:
+        """Create the monthly partitions for the current and the next few months"""
+        if not self.is_partitioned():
+            return
+        month = _month_start(datetime.utcnow().date())
+        for _ in range(self.months_ahead + 1):
+            following = _next_month(month)
+            try:
+                db.session.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS system_activity_p{month:%Y%m} PARTITION OF system_activity "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+                ))
+                db.session.commit()
+            except Exception as e:
+                # Rows for this month already sit in the default partition
+                db.session.rollback()
+                logger.warning(f"Could not create activity partition for {month:%Y-%m}: {str(e)}")
+            month = following
+
+    def archive(self) -> List[ActivityArchive]:
+        """Archive every month that ended before the retention window"""
+        cutoff = _month_start((datetime.utcnow() - timedelta(days=self.retention_days)).date())
+        oldest = db.session.query(db.func.min(SystemActivity.timestamp)).scalar()
+        archived = []
+        month = _month_start(oldest.date()) if oldest else cutoff
+        while month < cutoff:
+            record = self.archive_month(month)
+            if record:
+                archived.append(record)
+            month = _next_month(month)
+        return archived
+
+    def archive_month(self, month: date) -> Optional[ActivityArchive]:
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(_next_month(month), datetime.min.time())
+        in_month = and_(SystemActivity.timestamp >= start, SystemActivity.timestamp < end)
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        path = os.path.join(self.archive_dir, f"system_activity-{month:%Y-%m}-{stamp}.jsonl.gz")
+        tmp_path = f"{path}.tmp"
+
+        rows = 0
+        first = last = None
+        last_id = None
+        columns = (SystemActivity.id, SystemActivity.timestamp, SystemActivity.action,
+                   SystemActivity.description, SystemActivity.user_id)
+        query = db.session.query(*columns).filter(in_month) \
+            .order_by(SystemActivity.timestamp, SystemActivity.id) \
+            .execution_options(yield_per=self.batch_size)
+        try:
+            with open(tmp_path, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                    for activity_id, timestamp, action, description, user_id in query:
+                        f.write(json.dumps({
+                            'id': activity_id,
+                            'timestamp': timestamp.isoformat(),
+                            'action': action,
+                            'description': description,
+                            'user_id': user_id,
+                        }, separators=(',', ':')).encode() + b'\n')
+                        rows += 1
+                        first = first or timestamp
+                        last, last_id = timestamp, activity_id
+                raw.flush()
+                os.fsync(raw.fileno())
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if not rows:
+            os.remove(tmp_path)
+            return None
+
+        os.replace(tmp_path, path)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+
+        # Only rows that made it into the file are removed
+        exported = and_(in_month, or_(SystemActivity.timestamp < last,
+                                      and_(SystemActivity.timestamp == last, SystemActivity.id <= last_id)))
+        self._remove_month(month, exported)
+
+        record = ActivityArchive(
+            period=f"{month:%Y-%m}",
+            path=path,
+            rows=rows,
+            size=os.path.getsize(path),
+            checksum=digest.hexdigest(),
+            first_timestamp=first,
+            last_timestamp=last
+        )
+        db.session.add(record)
+        db.session.commit()
+        logger.info(f"Archived {rows} activity records for {month:%Y-%m} to {path}")
+        return record
+
+    def _remove_month(self, month: date, exported) -> None:
+        partition = f"system_activity_p{month:%Y%m}"
+        if self.is_partitioned() and db.session.execute(
+                text("SELECT to_regclass(:name)"), {'name': partition}).scalar():
+            remaining = db.session.query(db.func.count()).select_from(SystemActivity) \
+                .filter(SystemActivity.timestamp >= datetime.combine(month, datetime.min.time()),
+                        SystemActivity.timestamp < datetime.combine(_next_month(month), datetime.min.time()),
+                        ~exported).scalar()
+            if not remaining:
+                db.session.execute(text(f"ALTER TABLE system_activity DETACH PARTITION {partition}"))
+                db.session.execute(text(f"DROP TABLE {partition}"))
+                db.session.commit()
+                return
+
+        while True:
+            ids = [row[0] for row in db.session.query(SystemActivity.id).filter(exported)
+                   .limit(self.batch_size)]
+            if not ids:
+                break
+            SystemActivity.query.filter(SystemActivity.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+    def start(self, app) -> None:
+        """Create partitions and archive old months from a background thread"""
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, args=(app,), name='activity-archive', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, app) -> None:
+        while not self._stop.is_set():
+            with app.app_context():
+                try:
+                    # Every worker starts this thread; one of them archives
+                    with job_lock('activity-archive') as acquired:
+                        if acquired:
+                            self.ensure_partitions()
+                            self.archive()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Activity archival failed: {str(e)}")
+                finally:
+                    db.session.remove()
+            self._stop.wait(self.interval)
+
+
+# Create singleton instance
+activity_archiver = ActivityArchiver()
@@ -0,0 +1,140 @@
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import db
+from models import SystemActivity
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = 'audit_pending'
+
+
+class AuditWriter:
+    """Buffer SystemActivity records and write them with bulk INSERTs
+
+    ``log`` holds a record on the caller's session until it commits, so a
+    rolled-back change is never audited; the commit then appends it to an
+    in-memory buffer. A background thread writes the buffer on its own
+    connection once ``AUDIT_BATCH_SIZE`` records are queued or
+    ``AUDIT_FLUSH_INTERVAL`` seconds have passed, so request handlers no
+    longer pay a round trip or commit their own pending changes early. The
+    buffer is drained at interpreter shutdown. With ``AUDIT_SYNC=1``, or
+    before ``start`` was called, the record is added to the caller's session
+    instead and written by its commit, which keeps tests and scripts
+    deterministic.
+    """
+
+    def __init__(self):
+        self.batch_size = int(os.environ.get('AUDIT_BATCH_SIZE', 100))
+        self.flush_interval = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 2))
+        self.max_buffer = int(os.environ.get('AUDIT_MAX_BUFFER', 10000))
+        self.synchronous = os.environ.get('AUDIT_SYNC') == '1'
+        self._buffer: deque = deque()
+        self._condition = threading.Condition()
+        self._app = None
+        self._thread = None
+        self._stopping = False
+        self.dropped = 0
+
+    def log(self, action: str, description: str, user_id: Optional[int] = None) -> None:
+        record = {
+            'action': action,
+            'description': description,
+            'user_id': user_id,
+            'timestamp': datetime.utcnow(),
+        }
+        session = db.session()
+        if self.synchronous or self._thread is None:
+            session.add(SystemActivity(**record))
+            return
+        session.info.setdefault(_PENDING_KEY, []).append((self, record))
+
+    def enqueue(self, record: Dict) -> None:
+        """Buffer a committed record for the next batch"""
+        with self._condition:
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(record)
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def _write(self, records: List[Dict]) -> None:
+        # Runs off the request thread, on a connection of its own
+        with db.engine.begin() as connection:
+            connection.execute(db.insert(SystemActivity), records)
+
+    def flush(self) -> int:
+        """Write everything buffered so far, returns how many records were written"""
+        with self._condition:
+            records = list(self._buffer)
+            self._buffer.clear()
+        if not records:
+            return 0
+
+        try:
+            if self._app is not None:
+                with self._app.app_context():
+                    self._write(records)
+            else:
+                self._write(records)
+        except Exception as e:
+            logger.error(f"Failed to write {len(records)} audit records: {str(e)}")
+            with self._condition:
+                # Put them back in order so the next flush retries them
+                room = self.max_buffer - len(self._buffer)
+                self.dropped += max(len(records) - room, 0)
+                self._buffer.extendleft(reversed(records[-room:] if room > 0 else []))
+            return 0
+        return len(records)
+
+    def start(self, app) -> None:
+        """Flush from a background thread and drain the buffer at shutdown"""
+        if self._thread is not None or self.synchronous:
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._stopping and len(self._buffer) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+
+@event.listens_for(Session, 'after_commit')
+def _queue_committed(session):
+    for writer, record in session.info.pop(_PENDING_KEY, []):
+        writer.enqueue(record)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# Create singleton instance
+audit_writer = AuditWriter()
@@ -0,0 +1,237 @@
+import hashlib
+import io
+import json
+import os
+import stat
+import struct
+import tarfile
+import zlib
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+INDEX_NAME = 'manifest.json'
+CHUNK_SIZE = 1024 * 1024
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+# The footer is an empty gzip member whose FEXTRA field ('CI' subfield) holds
+# the offset and length of the gzip member that contains the index. gzip and
+# tar readers see zero bytes of payload, so the file stays a plain .tar.gz.
+_FOOTER = struct.Struct('<4BIBBH2sHQQ2BII')
+_FOOTER_SUBFIELD = b'CI'
+
+
+def _footer(index_offset: int, index_length: int) -> bytes:
+    return _FOOTER.pack(
+        0x1f, 0x8b, 8, 4, 0, 0, 255,  # magic, deflate, FEXTRA, mtime, xfl, os
+        20, _FOOTER_SUBFIELD, 16, index_offset, index_length,
+        3, 0,  # empty final deflate block
+        0, 0  # crc32 and size of the empty payload
+    )
+
+
+class SeekableArchiveWriter:
+    """Write a .tar.gz where every member is its own gzip member
+
+    Each tar header and its data are compressed independently and their byte
+    range is recorded in a trailing index, so a reader can seek straight to a
+    member and decompress only that member. Concatenated gzip members are
+    valid gzip, so ``tar -xzf`` still extracts the file as usual.
+    """
+
+    def __init__(self, path: str, compresslevel: int = 6):
+        self.path = path
+        self.compresslevel = compresslevel
+        self.members: Dict[str, dict] = {}
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(path, 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    @property
+    def sha256(self) -> str:
+        """Checksum of the whole archive file as written so far"""
+        return self._digest.hexdigest()
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._digest.update(data)
+        self.size += len(data)
+
+    def add_bytes(self, name: str, data: bytes, mtime: Optional[int] = None) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(mtime or 0)
+        self.add(info, io.BytesIO(data))
+
+    def add_path(self, path: str, arcname: str) -> None:
+        """Add a file, directory or symlink from disk"""
+        st = os.lstat(path)
+        info = tarfile.TarInfo(arcname)
+        info.mode = stat.S_IMODE(st.st_mode)
+        info.mtime = int(st.st_mtime)
+        info.uid, info.gid = st.st_uid, st.st_gid
+        if stat.S_ISREG(st.st_mode):
+            info.size = st.st_size
+        elif stat.S_ISDIR(st.st_mode):
+            info.type = tarfile.DIRTYPE
+        elif stat.S_ISLNK(st.st_mode):
+            info.type = tarfile.SYMTYPE
+            info.linkname = os.readlink(path)
+        else:
+            return
+
+        if info.isfile():
+            with open(path, 'rb') as f:
+                self.add(info, f)
+        elif info.isdir() or info.issym():
+            self.add(info)
+
+    def add(self, info: tarfile.TarInfo, fileobj: Optional[BinaryIO] = None) -> None:
+        offset = self.size
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 31)
+        header = info.tobuf(tarfile.PAX_FORMAT, tarfile.ENCODING, 'surrogateescape')
+        self._write(compressor.compress(header))
+
+        digest = hashlib.sha256()
+        remaining = info.size if info.isfile() else 0
+        while remaining > 0:
+            chunk = fileobj.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise OSError(f"{info.name} shrank while it was being archived")
+            digest.update(chunk)
+            self._write(compressor.compress(chunk))
+            remaining -= len(chunk)
+
+        padding = -info.size % BLOCK_SIZE if info.isfile() else 0
+        self._write(compressor.compress(b'\0' * padding) + compressor.flush())
+
+        entry = {
+            'type': 'file' if info.isfile() else 'dir' if info.isdir() else 'symlink',
+            'size': info.size if info.isfile() else 0,
+            'mode': info.mode,
+            'mtime': int(info.mtime),
+            'offset': offset,
+            'length': self.size - offset,
+            'header': len(header),
+        }
+        if info.isfile():
+            entry['sha256'] = digest.hexdigest()
+        if info.issym():
+            entry['linkname'] = info.linkname
+        self.members[info.name] = entry
+
+    def close(self, extra: Optional[dict] = None) -> None:
+        """Write the index member, the end-of-archive blocks and the footer"""
+        if self._file.closed:
+            return
+        index = dict(extra or {})
+        index['members'] = self.members
+        data = json.dumps(index, separators=(',', ':')).encode()
+
+        info = tarfile.TarInfo(INDEX_NAME)
+        info.size = len(data)
+        offset = self.size
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 31)
+        payload = info.tobuf(tarfile.PAX_FORMAT) + data + b'\0' * (-len(data) % BLOCK_SIZE)
+        self._write(compressor.compress(payload) + compressor.flush())
+        length = self.size - offset
+
+        eof = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 31)
+        self._write(eof.compress(b'\0' * BLOCK_SIZE * 2) + eof.flush())
+        self._write(_footer(offset, length))
+        self._file.close()
+
+
+def read_index(path: str) -> Optional[dict]:
+    """Return the member index of a seekable archive, or None for a plain .tar.gz"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < _FOOTER.size:
+                return None
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            fields = _FOOTER.unpack(f.read(_FOOTER.size))
+            if fields[:4] != (0x1f, 0x8b, 8, 4) or fields[8] != _FOOTER_SUBFIELD:
+                return None
+            offset, length = fields[10], fields[11]
+            f.seek(offset)
+            payload = zlib.decompress(f.read(length), 31)
+    except (OSError, zlib.error, struct.error):
+        return None
+
+    with tarfile.open(fileobj=io.BytesIO(payload + b'\0' * BLOCK_SIZE * 2)) as archive:
+        member = archive.next()
+        if member is None or member.name != INDEX_NAME:
+            return None
+        return json.load(archive.extractfile(member))
+
+
+def member_info(name: str, entry: dict) -> tarfile.TarInfo:
+    """Rebuild a TarInfo from an index entry"""
+    info = tarfile.TarInfo(name)
+    info.type = {'file': tarfile.REGTYPE, 'dir': tarfile.DIRTYPE,
+                 'symlink': tarfile.SYMTYPE}[entry['type']]
+    info.size = entry['size']
+    info.mode = entry['mode']
+    info.mtime = entry['mtime']
+    info.linkname = entry.get('linkname', '')
+    return info
+
+
+def iter_member(f: BinaryIO, entry: dict) -> Iterator[bytes]:
+    """Yield the data of one member, decompressing only its own gzip member"""
+    f.seek(entry['offset'])
+    decompressor = zlib.decompressobj(31)
+    skip = entry['header']
+    remaining = entry['size']
+    compressed = entry['length']
+    while remaining > 0:
+        if decompressor.unconsumed_tail:
+            raw = decompressor.unconsumed_tail
+        else:
+            raw = f.read(min(CHUNK_SIZE, compressed)) if compressed > 0 else b''
+            if not raw:
+                break
+            compressed -= len(raw)
+        # Bound each step so highly compressible data cannot balloon in memory
+        data = decompressor.decompress(raw, CHUNK_SIZE)
+        if skip:
+            dropped = min(skip, len(data))
+            data = data[dropped:]
+            skip -= dropped
+        if data:
+            data = data[:remaining]
+            remaining -= len(data)
+            yield data
+    if remaining:
+        raise OSError("Archive member is truncated")
+
+
+def iter_raw_members(f: BinaryIO, index: dict, names: List[str]) -> Iterator[bytes]:
+    """Yield a .tar.gz of the selected members by copying their gzip members verbatim"""
+    members = index['members']
+    for name in names:
+        f.seek(members[name]['offset'])
+        remaining = members[name]['length']
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise OSError("Archive member is truncated")
+            remaining -= len(chunk)
+            yield chunk
+    yield zlib.compress(b'\0' * BLOCK_SIZE * 2, wbits=31)
+
+
+def select_members(index: dict, path: str) -> List[str]:
+    """Names of the members at ``path`` or below it, in archive order"""
+    path = path.strip('/')
+    members = index.get('members', {})
+    return [name for name in members
+            if name == path or name.startswith(path + '/')]
@@ -1,14 +1,23 @@
 import logging
 import os
-import shutil
-from datetime import datetime, timedelta
-from typing import Optional, Tuple, List
-from models import Service, Container
+import subprocess
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+from itertools import groupby
+from typing import Optional, Tuple, List, Dict, Iterator
+from database import db
+from models import Service, Container, Backup, BackupUploadPart
+from utils.backup_archive import SeekableArchiveWriter, read_index, select_members, iter_member, iter_raw_members
+from utils.backup_restore import StreamingRestore, DATABASE_MEMBER
+from utils.backup_retention import backups_to_keep, retention_policy
 
 class BackupManager:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.backup_base_path = "/backups"
+        self.volume_base_path = "/var/lib/containers/storage/volumes"
 
     def create_backup(self, service: Service, container: Container) -> Tuple[bool, str]:
         """Create a backup for a WordPress service"""
@@ -24,27 +33,42 @@ class BackupManager:
             timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
             backup_file = os.path.join(backup_dir, f"wordpress_backup_{timestamp}.tar.gz")
 
-            # Create a simple backup file with service information
             try:
-                # Create a temporary directory for the backup
-                temp_dir = os.path.join(backup_dir, f"temp_{timestamp}")
-                os.makedirs(temp_dir, exist_ok=True)
-
-                # Create backup info file
-                with open(os.path.join(temp_dir, "backup_info.txt"), "w") as f:
-                    f.write(f"Backup created at: {timestamp}\n")
-                    f.write(f"Service: {service.name}\n")
-                    f.write(f"Domain: {service.domain}\n")
-                    f.write(f"Container ID: {container.container_id}\n")
-
-                # Create tar archive
-                os.system(f"cd {temp_dir} && tar -czf {backup_file} .")
-
-                # Clean up temp directory
-                shutil.rmtree(temp_dir)
+                # Every member is compressed on its own and indexed, so the
+                # backup can be browsed and partially restored later
+                with SeekableArchiveWriter(backup_file) as archive:
+                    info = (f"Backup created at: {timestamp}\n"
+                            f"Service: {service.name}\n"
+                            f"Domain: {service.domain}\n"
+                            f"Container ID: {container.container_id}\n").encode()
+                    archive.add_bytes('backup_info.txt', info, mtime=datetime.utcnow().timestamp())
+
+                    for target, path in self._stack_volumes(container).items():
+                        if not os.path.isdir(path):
+                            continue
+                        prefix = 'data' if target == 'volume:' else f"volumes/{target.split(':', 1)[1]}"
+                        self._add_tree(archive, path, prefix)
+
+                    dump_command = self._database_dump_command(container)
+                    if dump_command:
+                        self._add_database_dump(archive, dump_command, backup_dir)
+
+                    archive.close({'version': 2, 'created_at': timestamp})
+
+                # Recorded with the service update, the caller commits both
+                db.session.add(Backup(
+                    service_id=service.id,
+                    container_id=container.id,
+                    filename=os.path.basename(backup_file),
+                    path=backup_file,
+                    size=archive.size,
+                    checksum=archive.sha256
+                ))
 
             except Exception as e:
                 self.logger.error(f"Failed to create backup archive: {str(e)}")
+                if os.path.exists(backup_file):
+                    os.remove(backup_file)
                 return False, f"Backup creation failed: {str(e)}"
 
             # Update service backup timestamp
@@ -62,32 +86,27 @@ class BackupManager:
             if not os.path.exists(backup_file):
                 return False, "Backup file not found"
 
-            # Create temporary directory for restoration
-            temp_dir = os.path.join(self.backup_base_path, f"restore_temp_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}")
-            os.makedirs(temp_dir, exist_ok=True)
+            # Only restore into volumes that exist on this host
+            volumes = {target: path for target, path in self._stack_volumes(container).items()
+                       if os.path.isdir(os.path.dirname(path))}
+            engine = StreamingRestore(volumes, self._database_restore_command(container))
 
             try:
-                # Extract backup
-                subprocess.run(["tar", "-xzf", backup_file, "-C", temp_dir], check=True)
-
                 # Stop the container before restore
                 subprocess.run(["podman", "stop", container.container_id], check=True)
 
-                # Restore data to container volume
-                container_data_path = f"/var/lib/containers/storage/volumes/{container.name}/_data"
-                if os.path.exists(container_data_path):
-                    # Backup existing data
-                    backup_existing = os.path.join(temp_dir, "existing_data_backup")
-                    shutil.move(container_data_path, backup_existing)
-
-                    # Restore from backup
-                    shutil.copytree(os.path.join(temp_dir, "data"), container_data_path)
+                started = datetime.utcnow()
+                written = engine.restore(backup_file)
+                self.logger.info(
+                    f"Restored {sum(written.values())} bytes from {os.path.basename(backup_file)} "
+                    f"in {(datetime.utcnow() - started).total_seconds():.1f}s"
+                )
 
                 # Start the container
                 subprocess.run(["podman", "start", container.container_id], check=True)
 
-                # Clean up
-                shutil.rmtree(temp_dir)
+                # Previous data is only removed once the container is back up
+                engine.cleanup()
 
                 return True, "Backup restored successfully"
 
@@ -104,6 +123,129 @@ class BackupManager:
             self.logger.error(f"Backup restoration failed: {str(e)}")
             return False, str(e)
 
+    def _volume_path(self, volume_name: str) -> str:
+        return os.path.join(self.volume_base_path, volume_name, "_data")
+
+    def _stack_volumes(self, container: Container) -> Dict[str, str]:
+        """Restore targets for a container: its own volume plus any extra stack volumes"""
+        volumes = {'volume:': self._volume_path(container.name)}
+        for volume_name in (container.environment or {}).get('volumes', []):
+            volumes[f"volume:{volume_name}"] = self._volume_path(volume_name)
+        return volumes
+
+    def _database_command(self, container: Container, tools: Tuple[str, str], *args: str) -> Optional[List[str]]:
+        """A MySQL/MariaDB client command run inside the stack's database container
+
+        ``deploy_wordpress`` stacks keep their database in ``<stack>-mysql``
+        and record its password; ``deploy_lemp_stack`` creates ``<stack>-db``
+        from the mariadb image and records only the stack name. Either way the
+        root password and database name are read from the database
+        container's own environment. Newer mariadb images only ship the
+        ``mariadb-*`` names of the tools.
+        """
+        environment = container.environment or {}
+        stack_name = environment.get('stack_name')
+        if not stack_name:
+            return None
+        database = f"{stack_name}-mysql" if environment.get('db_password') else f"{stack_name}-db"
+        tool, legacy_tool = tools
+        script = ' '.join([f'exec "$(command -v {tool} || command -v {legacy_tool})"',
+                           '-uroot', '-p"$MYSQL_ROOT_PASSWORD"', *args, '"$MYSQL_DATABASE"'])
+        return ['podman', 'exec', '-i', database, 'sh', '-c', script]
+
+    def _database_dump_command(self, container: Container) -> Optional[List[str]]:
+        return self._database_command(container, ('mariadb-dump', 'mysqldump'), '--single-transaction')
+
+    def _database_restore_command(self, container: Container) -> Optional[List[str]]:
+        return self._database_command(container, ('mariadb', 'mysql'))
+
+    @staticmethod
+    def _add_tree(archive: SeekableArchiveWriter, root: str, prefix: str) -> None:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in dirnames + sorted(filenames):
+                path = os.path.join(dirpath, name)
+                archive.add_path(path, f"{prefix}/{os.path.relpath(path, root)}")
+
+    @staticmethod
+    def _add_database_dump(archive: SeekableArchiveWriter, command: List[str], work_dir: str) -> None:
+        # tar needs the member size up front, so the dump is spooled once
+        with tempfile.TemporaryFile(dir=work_dir) as spool:
+            result = subprocess.run(command, stdout=spool, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                raise RuntimeError(f"Database dump failed: {result.stderr.decode(errors='replace').strip()}")
+            info = tarfile.TarInfo(DATABASE_MEMBER)
+            info.size = spool.tell()
+            info.mtime = int(datetime.utcnow().timestamp())
+            spool.seek(0)
+            archive.add(info, spool)
+
+    def get_backup_path(self, service: Service, filename: str) -> Optional[str]:
+        """Resolve a backup filename to its path, refusing anything outside the service's directory"""
+        filename = os.path.basename(filename or '')
+        if not filename.startswith("wordpress_backup_") or not filename.endswith(".tar.gz"):
+            return None
+        path = os.path.join(self.backup_base_path, str(service.id), filename)
+        return path if os.path.isfile(path) else None
+
+    def get_backup_record(self, service: Service, backup_file: str) -> Optional[Backup]:
+        return Backup.query.filter_by(
+            service_id=service.id,
+            filename=os.path.basename(backup_file)
+        ).first()
+
+    def list_backup_contents(self, backup_file: str) -> Optional[List[dict]]:
+        """List the members of a backup from its index without decompressing it"""
+        index = read_index(backup_file)
+        if index is None:
+            return None
+        return [{
+            'name': name,
+            'type': entry['type'],
+            'size': entry['size'],
+            'modified_at': datetime.fromtimestamp(entry['mtime'])
+        } for name, entry in index['members'].items()]
+
+    def stream_backup_path(self, backup_file: str, path: str) -> Optional[Tuple[str, Iterator[bytes]]]:
+        """Stream one file, or a directory as a .tar.gz, out of an indexed backup
+
+        Returns the kind of stream ('file' or 'archive') and its chunks, or
+        None if the backup has no index or does not contain ``path``. Work is
+        proportional to the size of what is selected, not of the backup.
+        """
+        index = read_index(backup_file)
+        if index is None:
+            return None
+        names = select_members(index, path)
+        if not names:
+            return None
+
+        entry = index['members'].get(path.strip('/'))
+        if entry and entry['type'] == 'file':
+            def file_chunks():
+                with open(backup_file, 'rb') as f:
+                    yield from iter_member(f, entry)
+            return 'file', file_chunks()
+
+        # Directories are sent as the selected gzip members copied verbatim
+        def archive_chunks():
+            with open(backup_file, 'rb') as f:
+                yield from iter_raw_members(f, index, names)
+        return 'archive', archive_chunks()
+
+    def restore_backup_path(self, service: Service, container: Container, backup_file: str,
+                            path: str) -> Tuple[bool, str]:
+        """Restore a single file or directory from a backup into the running service"""
+        try:
+            volumes = {target: volume_path for target, volume_path in self._stack_volumes(container).items()
+                       if os.path.isdir(volume_path)}
+            written = StreamingRestore(volumes).restore_path(backup_file, path)
+            self.logger.info(f"Restored {path} ({written} bytes) from {os.path.basename(backup_file)}")
+            return True, f"Restored {path}"
+        except Exception as e:
+            self.logger.error(f"Failed to restore {path} from backup: {str(e)}")
+            return False, str(e)
+
     def list_backups(self, service: Service) -> List[dict]:
         """List all backups for a service"""
         try:
@@ -129,32 +271,81 @@ class BackupManager:
             self.logger.error(f"Failed to list backups: {str(e)}")
             return []
 
-    def cleanup_old_backups(self, service: Service) -> None:
-        """Remove backups older than retention period"""
-        try:
-            backup_dir = os.path.join(self.backup_base_path, str(service.id))
-            if not os.path.exists(backup_dir):
-                return
-
-            retention_days = service.backup_retention_days or 7
-            cutoff_date = datetime.utcnow() - timedelta(days=retention_days)
-
-            for backup_file in os.listdir(backup_dir):
-                if not backup_file.startswith("wordpress_backup_") or not backup_file.endswith(".tar.gz"):
-                    continue
+    def cleanup_old_backups(self, service: Service) -> Dict[str, int]:
+        """Apply the retention policy of a single service"""
+        return self.prune_backups(service_ids=[service.id])
 
-                file_path = os.path.join(backup_dir, backup_file)
-                file_mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
+    def prune_backups(self, service_ids: Optional[List[int]] = None, batch_size: int = 100,
+                      pause: float = 0.1, dry_run: bool = False) -> Dict[str, int]:
+        """Apply every service's retention policy in one pass over the backup index
 
-                if file_mtime < cutoff_date:
+        The backups of all services and their policies are read with a single
+        query. Files are removed in batches with a pause in between so pruning
+        does not starve the disk, and the index rows of each batch are deleted
+        together. Backups still being uploaded offsite are left for the next run.
+        """
+        report = {'services': 0, 'examined': 0, 'deleted': 0, 'bytes_reclaimed': 0, 'errors': 0}
+        try:
+            query = db.session.query(
+                Backup.id, Backup.service_id, Backup.path, Backup.size, Backup.created_at,
+                Backup.offsite_status, Service.backup_keep_hourly, Service.backup_keep_daily,
+                Service.backup_keep_weekly, Service.backup_keep_monthly, Service.backup_retention_days
+            ).join(Service, Service.id == Backup.service_id)
+            if service_ids is not None:
+                query = query.filter(Backup.service_id.in_(service_ids))
+            rows = query.order_by(Backup.service_id, Backup.created_at.desc()).all()
+
+            now = datetime.utcnow()
+            doomed = []
+            for _, group in groupby(rows, key=lambda row: row.service_id):
+                group = list(group)
+                report['services'] += 1
+                report['examined'] += len(group)
+                keep = backups_to_keep(group, retention_policy(group[0]), now)
+                doomed.extend(row for row in group
+                              if row.id not in keep and row.offsite_status != 'uploading')
+
+            if dry_run:
+                report['deleted'] = len(doomed)
+                report['bytes_reclaimed'] = sum(row.size or 0 for row in doomed)
+                return report
+
+            for start in range(0, len(doomed), batch_size):
+                batch = doomed[start:start + batch_size]
+                removed = []
+                for row in batch:
                     try:
-                        os.remove(file_path)
-                        self.logger.info(f"Removed old backup: {backup_file}")
-                    except Exception as e:
-                        self.logger.error(f"Failed to remove old backup {backup_file}: {str(e)}")
+                        size = os.stat(row.path).st_size
+                        os.remove(row.path)
+                        report['bytes_reclaimed'] += size
+                        removed.append(row.id)
+                    except FileNotFoundError:
+                        removed.append(row.id)
+                    except OSError as e:
+                        report['errors'] += 1
+                        self.logger.error(f"Failed to remove old backup {row.path}: {str(e)}")
+
+                if removed:
+                    BackupUploadPart.query.filter(BackupUploadPart.backup_id.in_(removed)).delete(
+                        synchronize_session=False)
+                    Backup.query.filter(Backup.id.in_(removed)).delete(synchronize_session=False)
+                    db.session.commit()
+                    report['deleted'] += len(removed)
+
+                if pause and start + batch_size < len(doomed):
+                    time.sleep(pause)
+
+            self.logger.info(
+                f"Pruned {report['deleted']} backups across {report['services']} services, "
+                f"reclaimed {report['bytes_reclaimed']} bytes"
+            )
+            return report
 
         except Exception as e:
-            self.logger.error(f"Backup cleanup failed: {str(e)}")
+            db.session.rollback()
+            self.logger.error(f"Backup pruning failed: {str(e)}")
+            report['errors'] += 1
+            return report
 
 # Create singleton instance
 backup_manager = BackupManager()
\ No newline at end of file
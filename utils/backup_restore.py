@@ -0,0 +1,416 @@
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import queue
+import shutil
+import subprocess
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.backup_archive import INDEX_NAME, iter_member, member_info, read_index, select_members
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = INDEX_NAME
+DATABASE_MEMBER = 'database/dump.sql'
+CHUNK_SIZE = 1024 * 1024
+QUEUE_DEPTH = 16
+
+_END = object()
+_DONE = object()
+_ABORT = object()
+
+
+def normalize_member(name: str) -> str:
+    """Strip the leading './' tar adds when archiving a directory"""
+    while name.startswith('./'):
+        name = name[2:]
+    return name
+
+
+def member_target(name: str) -> Optional[Tuple[str, str]]:
+    """Map an archive member name to (target, relative path)
+
+    ``data/...`` is the legacy layout and restores into the container's primary
+    volume, ``volumes/<name>/...`` restores into the named volume and
+    ``database/dump.sql`` is fed to the stack's database container.
+    """
+    name = posixpath.normpath(normalize_member(name))
+    if name.startswith('/') or name == '..' or name.startswith('../'):
+        raise ValueError(f"Unsafe member path in archive: {name}")
+    if name == DATABASE_MEMBER:
+        return 'database', ''
+    parts = name.split('/')
+    if parts[0] == 'data':
+        return 'volume:', '/'.join(parts[1:])
+    if parts[0] == 'volumes' and len(parts) >= 2:
+        return f"volume:{parts[1]}", '/'.join(parts[2:])
+    return None
+
+
+def _drain(work: queue.Queue) -> Iterator:
+    """Turn a writer queue into the item stream the writers consume"""
+    while True:
+        item = work.get()
+        if item is _ABORT:
+            raise RuntimeError("Restore cancelled")
+        if item is _DONE:
+            return
+        yield item
+
+
+def _indexed_items(backup_file: str, index: dict, names: List[str]) -> Iterator:
+    """Read members straight from a seekable archive using its own file handle"""
+    with open(backup_file, 'rb') as f:
+        for name in names:
+            entry = index['members'][name]
+            info = member_info(name, entry)
+            yield name, member_target(name)[1], info
+            if info.isfile():
+                yield from iter_member(f, entry)
+                yield _END
+
+
+class _VolumeWriter:
+    """Writes members of one volume into a staging directory beside the live data
+
+    With ``in_place`` the members are written into the live volume instead,
+    each file through a temporary name and ``os.replace``.
+    """
+
+    def __init__(self, name: str, live_path: str, stamp: str, in_place: bool = False):
+        self.name = name
+        self.live_path = live_path
+        self.in_place = in_place
+        self.staging_path = live_path if in_place else f"{live_path}.restore-{stamp}"
+        self.old_path = f"{live_path}.old-{stamp}"
+        self.queue = queue.Queue(maxsize=QUEUE_DEPTH)
+        self.digests: Dict[str, str] = {}
+        self.bytes_written = 0
+        self.received = False
+
+    def run(self, items: Iterable):
+        root = os.path.realpath(self.staging_path)
+        items = iter(items)
+        for archive_name, relpath, info in items:
+            if not self.received:
+                os.makedirs(self.staging_path, exist_ok=True)
+                self.received = True
+            dest = os.path.join(self.staging_path, relpath) if relpath else self.staging_path
+            parent = os.path.realpath(os.path.dirname(dest))
+            if relpath and parent != root and not parent.startswith(root + os.sep):
+                raise ValueError(f"Member {archive_name} escapes volume {self.name}")
+
+            if info.isdir():
+                os.makedirs(dest, exist_ok=True)
+                os.chmod(dest, info.mode)
+            elif info.issym():
+                link = posixpath.normpath(posixpath.join(posixpath.dirname(relpath), info.linkname))
+                if info.linkname.startswith('/') or link.startswith('..'):
+                    raise ValueError(f"Symlink {archive_name} points outside volume {self.name}")
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                os.symlink(info.linkname, dest)
+            elif info.isfile():
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                path = f"{dest}.restore-tmp" if self.in_place else dest
+                digest = hashlib.sha256()
+                with open(path, 'wb') as f:
+                    for chunk in items:
+                        if chunk is _END:
+                            break
+                        digest.update(chunk)
+                        f.write(chunk)
+                        self.bytes_written += len(chunk)
+                os.chmod(path, info.mode)
+                os.utime(path, (info.mtime, info.mtime))
+                if self.in_place:
+                    os.replace(path, dest)
+                self.digests[archive_name] = digest.hexdigest()
+
+    def swap(self):
+        """Replace the live data with the staged copy using renames only"""
+        if os.path.exists(self.live_path):
+            os.rename(self.live_path, self.old_path)
+        os.rename(self.staging_path, self.live_path)
+
+    def rollback(self):
+        if os.path.exists(self.old_path):
+            if os.path.exists(self.live_path):
+                os.rename(self.live_path, self.staging_path)
+            os.rename(self.old_path, self.live_path)
+
+    def discard(self, old_only: bool = False):
+        if self.in_place:
+            return
+        path = self.old_path if old_only else self.staging_path
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class _DatabaseWriter:
+    """Pipes the database dump into the stack's database client"""
+
+    name = 'database'
+
+    def __init__(self, command: List[str]):
+        self.command = command
+        self.queue = queue.Queue(maxsize=QUEUE_DEPTH)
+        self.digests: Dict[str, str] = {}
+        self.bytes_written = 0
+
+    def run(self, items: Iterable):
+        process = None
+        items = iter(items)
+        try:
+            for archive_name, _, info in items:
+                if not info.isfile():
+                    continue
+                process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                digest = hashlib.sha256()
+                exited = False
+                for chunk in items:
+                    if chunk is _END:
+                        break
+                    if exited:
+                        continue
+                    digest.update(chunk)
+                    try:
+                        process.stdin.write(chunk)
+                    except BrokenPipeError:
+                        # The client gave up; its exit status and stderr say why
+                        exited = True
+                        continue
+                    self.bytes_written += len(chunk)
+                # communicate() flushes and closes stdin itself
+                _, stderr = process.communicate()
+                if process.returncode != 0:
+                    raise RuntimeError(f"Database import failed: {stderr.decode(errors='replace').strip()}")
+                self.digests[archive_name] = digest.hexdigest()
+        finally:
+            if process and process.poll() is None:
+                process.kill()
+
+
+class StreamingRestore:
+    """Restore a backup archive by streaming members straight to their volumes
+
+    Seekable archives (see ``utils.backup_archive``) are read through their
+    member index: every destination (one per volume plus the database) gets a
+    thread with its own file handle that decompresses only its own members,
+    so volumes and the database dump are restored fully in parallel. Plain
+    .tar.gz files are decompressed once and their members are fanned out to
+    the same writer threads.
+
+    Files land in a staging directory on the same filesystem as the live
+    volume, are hashed while they are written and are checked against the
+    archive manifest. Only when every target finished and verified are the
+    staging directories swapped in with ``os.rename``.
+
+    The database dump cannot be staged, so it is imported as it streams; a
+    checksum failure still fails the restore and leaves the volumes untouched.
+    """
+
+    def __init__(self, volumes: Dict[str, str], database_command: Optional[List[str]] = None):
+        # Maps target names ('volume:' for the primary volume) to live paths
+        self.volumes = volumes
+        self.database_command = database_command
+        self._swapped: List[_VolumeWriter] = []
+
+    def restore(self, backup_file: str) -> Dict[str, int]:
+        stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')
+        writers = {name: _VolumeWriter(name, path, stamp) for name, path in self.volumes.items()}
+        if self.database_command:
+            writers['database'] = _DatabaseWriter(self.database_command)
+
+        volume_writers = [w for w in writers.values() if isinstance(w, _VolumeWriter)]
+        try:
+            index = read_index(backup_file)
+            if index is not None:
+                manifest = index
+                seen = self._run_indexed(backup_file, index, list(index['members']), writers)
+            else:
+                manifest, seen = self._stream(backup_file, writers)
+            self._verify(manifest, writers.values(), seen)
+        except Exception:
+            for writer in volume_writers:
+                writer.discard()
+            raise
+
+        # Volumes the backup has no data for are left alone
+        swapped = []
+        try:
+            for writer in [w for w in volume_writers if w.received]:
+                writer.swap()
+                swapped.append(writer)
+        except Exception:
+            for writer in reversed(swapped):
+                writer.rollback()
+            for writer in volume_writers:
+                writer.discard()
+            raise
+
+        self._swapped = volume_writers
+        return {name: writer.bytes_written for name, writer in writers.items()}
+
+    def restore_path(self, backup_file: str, path: str) -> int:
+        """Restore a single file or directory from a seekable archive into the live volume
+
+        Only the selected members are decompressed. Each file is replaced
+        atomically, the rest of the volume is left as it is.
+        """
+        index = read_index(backup_file)
+        if index is None:
+            raise ValueError("Backup has no member index; restore the full backup instead")
+        names = [name for name in select_members(index, path)
+                 if (member_target(name) or ('',))[0].startswith('volume:')]
+        if not names:
+            raise ValueError(f"{path} is not in this backup")
+
+        writers = {name: _VolumeWriter(name, live_path, '', in_place=True)
+                   for name, live_path in self.volumes.items()}
+        seen = self._run_indexed(backup_file, index, names, writers)
+        self._verify({'members': {name: index['members'][name] for name in seen}},
+                     writers.values(), seen)
+        return sum(writer.bytes_written for writer in writers.values())
+
+    def _run_indexed(self, backup_file: str, index: dict, names: List[str], writers: dict) -> set:
+        """Run one writer per target, each reading its own members from the archive"""
+        by_target: Dict[str, List[str]] = {}
+        seen = set()
+        for name in names:
+            target = member_target(name)
+            if not target:
+                continue
+            seen.add(name)
+            if target[0] not in writers:
+                logger.warning(f"No restore target for {name}, skipping")
+                continue
+            by_target.setdefault(target[0], []).append(name)
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(len(by_target), 1),
+                                thread_name_prefix='restore') as pool:
+            futures = {target: pool.submit(writers[target].run,
+                                           _indexed_items(backup_file, index, members))
+                       for target, members in by_target.items()}
+            for target, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(f"{target}: {str(e)}")
+        if errors:
+            raise RuntimeError('; '.join(errors))
+        return seen
+
+    def _stream(self, backup_file: str, writers: dict) -> Tuple[Optional[dict], set]:
+        """Decompress the archive once and fan members out to the writer threads"""
+        manifest = None
+        seen = set()
+        cancelled = False
+        with ThreadPoolExecutor(max_workers=max(len(writers), 1),
+                                thread_name_prefix='restore') as pool:
+            futures = {name: pool.submit(writer.run, _drain(writer.queue))
+                       for name, writer in writers.items()}
+            try:
+                with tarfile.open(backup_file, 'r|*') as archive:
+                    for info in archive:
+                        name = normalize_member(info.name)
+                        if name == MANIFEST_NAME:
+                            manifest = json.load(archive.extractfile(info))
+                            continue
+                        target = member_target(name)
+                        if not target:
+                            continue
+                        seen.add(name)
+                        writer = writers.get(target[0])
+                        if writer is None:
+                            logger.warning(f"No restore target for {name}, skipping")
+                            continue
+                        future = futures[target[0]]
+                        self._put(writer, (name, target[1], info), future)
+                        if info.isfile():
+                            source = archive.extractfile(info)
+                            while True:
+                                chunk = source.read(CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                self._put(writer, chunk, future)
+                            self._put(writer, _END, future)
+            except BaseException:
+                cancelled = True
+                raise
+            finally:
+                for name, writer in writers.items():
+                    if not futures[name].done():
+                        self._put(writer, _ABORT if cancelled else _DONE, futures[name], finishing=True)
+
+            errors = []
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(f"{name}: {str(e)}")
+            if errors:
+                raise RuntimeError('; '.join(errors))
+
+        return manifest, seen
+
+    def cleanup(self) -> None:
+        """Delete the data that was swapped out by the last restore"""
+        for writer in self._swapped:
+            writer.discard(old_only=True)
+        self._swapped = []
+
+    @staticmethod
+    def _put(writer, item, future, finishing=False):
+        """Queue an item for a writer, giving up if the writer thread died
+
+        When ``finishing``, a writer that already stopped needs no marker.
+        Only an abort marker may push queued data out of a full queue; the
+        done marker waits behind the data so every chunk is still written.
+        """
+        while True:
+            if future.done():
+                if finishing:
+                    return
+                future.result()
+                raise RuntimeError(f"Restore writer {writer.name} stopped")
+            try:
+                writer.queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if item is _ABORT:
+                    # Drain so a cancelled writer can reach the abort marker
+                    try:
+                        writer.queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    @staticmethod
+    def _verify(manifest: Optional[dict], writers, seen) -> None:
+        digests = {}
+        for writer in writers:
+            digests.update(writer.digests)
+
+        if manifest is None:
+            logger.warning("Backup has no manifest, restoring without checksum verification")
+            return
+
+        expected = manifest.get('members', {})
+        missing = [name for name in expected if name not in seen and
+                   member_target(name) is not None]
+        if missing:
+            raise RuntimeError(f"Backup is missing {len(missing)} member(s), e.g. {missing[0]}")
+
+        for name, digest in digests.items():
+            entry = expected.get(name)
+            if entry is None:
+                raise RuntimeError(f"Member {name} is not listed in the manifest")
+            if entry['sha256'] != digest:
+                raise RuntimeError(f"Checksum mismatch for {name}")
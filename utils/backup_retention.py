@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+# Each tier keeps the newest backup of its N most recent periods
+TIERS: Dict[str, Callable[[datetime], tuple]] = {
+    'hourly': lambda ts: (ts.year, ts.month, ts.day, ts.hour),
+    'daily': lambda ts: (ts.year, ts.month, ts.day),
+    'weekly': lambda ts: tuple(ts.isocalendar()[:2]),
+    'monthly': lambda ts: (ts.year, ts.month),
+}
+
+
+def retention_policy(service) -> Dict[str, Optional[int]]:
+    """Read a service's grandfather-father-son retention settings"""
+    return {
+        'hourly': service.backup_keep_hourly,
+        'daily': service.backup_keep_daily,
+        'weekly': service.backup_keep_weekly,
+        'monthly': service.backup_keep_monthly,
+        'retention_days': service.backup_retention_days,
+    }
+
+
+def backups_to_keep(backups: Iterable, policy: Dict[str, Optional[int]],
+                    now: Optional[datetime] = None) -> Set[int]:
+    """Return the ids of the backups a policy keeps
+
+    ``backups`` must be sorted newest first and have ``id`` and
+    ``created_at``. The newest backup is always kept. Services without any
+    tier configured keep everything younger than ``retention_days``, which is
+    how retention worked before tiers existed.
+    """
+    backups: List = list(backups)
+    if not backups:
+        return set()
+
+    keep = {backups[0].id}
+    tiers = {name: policy.get(name) for name in TIERS if policy.get(name)}
+
+    if not tiers:
+        cutoff = (now or datetime.utcnow()) - timedelta(days=policy.get('retention_days') or 7)
+        keep.update(backup.id for backup in backups if backup.created_at >= cutoff)
+        return keep
+
+    for name, count in tiers.items():
+        period_of = TIERS[name]
+        periods = set()
+        for backup in backups:
+            period = period_of(backup.created_at)
+            if period in periods:
+                continue
+            if len(periods) >= count:
+                break
+            periods.add(period)
+            keep.add(backup.id)
+    return keep
@@ -0,0 +1,412 @@
+import csv
+import io
+import json
+import logging
+import os
+import re
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db
+from models import Container, CustomerProfile, Service, Subscription, User
+from utils.catalog_cache import catalog_cache
+from utils.platform_counters import ACTIVE_SERVICES, USERS, platform_counters
+from utils.service_search import service_search
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+# What each export contains; secrets such as password hashes and 2FA seeds never leave
+EXPORTS = {
+    'services': (Service.id, [
+        Service.id, Service.name, Service.description, Service.price, Service.is_active,
+        Service.created_at, Service.stripe_price_id, Service.stripe_product_id, Service.container_image,
+        Service.container_port, Service.environment_vars, Service.cpu_quota, Service.memory_quota,
+        Service.storage_quota, Service.backup_enabled, Service.backup_frequency,
+        Service.backup_retention_days, Service.monitoring_enabled, Service.alert_email, Service.alert_phone,
+    ]),
+    'customers': (User.id, [
+        User.id, User.username, User.email, User.is_admin, User.created_at, User.stripe_customer_id,
+        User.two_factor_enabled, CustomerProfile.company_name, CustomerProfile.phone, CustomerProfile.address,
+    ]),
+    'containers': (Container.id, [
+        Container.id, Container.container_id, Container.name, Container.status, Container.created_at,
+        Container.user_id, Container.service_id, Container.port, Container.domain, Container.cpu_usage,
+        Container.memory_usage, Container.storage_usage, Container.parent_id,
+    ]),
+    'subscriptions': (Subscription.id, [
+        Subscription.id, Subscription.user_id, Subscription.service_id, Subscription.stripe_subscription_id,
+        Subscription.status, Subscription.current_period_end, Subscription.created_at,
+        Subscription.cancelled_at,
+    ]),
+}
+
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+# Hashes as werkzeug writes them; anything else could never match a password
+_PASSWORD_HASH = re.compile(r'^(scrypt|pbkdf2)(:[\w:]+)?\$[^$]+\$[0-9a-f]+$')
+# Stored for imported users without a hash: matches no password, so they reset it
+UNUSABLE_PASSWORD = '!'
+# A spreadsheet runs a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _text(max_length: int) -> Callable:
+    def convert(value):
+        value = str(value).strip()
+        if len(value) > max_length:
+            raise ValueError(f"longer than {max_length} characters")
+        return value
+    return convert
+
+
+def _number(value) -> float:
+    value = float(value)
+    if value < 0:
+        raise ValueError("must not be negative")
+    return value
+
+
+def _integer(value) -> int:
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError("must be a whole number")
+    value = int(value)
+    if value < 0:
+        raise ValueError("must not be negative")
+    return value
+
+
+def _boolean(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'y', 'on'):
+        return True
+    if text in ('0', 'false', 'no', 'n', 'off'):
+        return False
+    raise ValueError("must be true or false")
+
+
+def _timestamp(value) -> datetime:
+    return datetime.fromisoformat(str(value).strip()).replace(tzinfo=None)
+
+
+def _json_object(value) -> Dict:
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, dict):
+        raise ValueError("must be a JSON object")
+    return value
+
+
+def _email(value) -> str:
+    value = str(value).strip().lower()
+    if len(value) > 120 or not _EMAIL.match(value):
+        raise ValueError("is not a valid email address")
+    return value
+
+
+def _password_hash(value) -> str:
+    value = str(value).strip()
+    if not _PASSWORD_HASH.match(value):
+        raise ValueError("is not a werkzeug password hash")
+    return value
+
+
+def _default(column) -> Optional[object]:
+    default = column.default
+    return default.arg if default is not None and default.is_scalar else None
+
+
+# Importable fields: name -> (converter, required)
+SERVICE_FIELDS = {
+    'name': (_text(100), True),
+    'description': (_text(10000), False),
+    'price': (_number, True),
+    'is_active': (_boolean, False),
+    'created_at': (_timestamp, False),
+    'stripe_price_id': (_text(120), False),
+    'stripe_product_id': (_text(120), False),
+    'container_image': (_text(200), False),
+    'container_port': (_integer, False),
+    'environment_vars': (_json_object, False),
+    'cpu_quota': (_number, False),
+    'memory_quota': (_integer, False),
+    'storage_quota': (_integer, False),
+    'backup_enabled': (_boolean, False),
+    'backup_frequency': (_text(20), False),
+    'backup_retention_days': (_integer, False),
+    'monitoring_enabled': (_boolean, False),
+    'alert_email': (_email, False),
+    'alert_phone': (_text(20), False),
+}
+CUSTOMER_FIELDS = {
+    'username': (_text(64), True),
+    'email': (_email, True),
+    'password_hash': (_password_hash, False),
+    'created_at': (_timestamp, False),
+    'stripe_customer_id': (_text(120), False),
+    'company_name': (_text(120), False),
+    'phone': (_text(20), False),
+    'address': (_text(200), False),
+}
+PROFILE_FIELDS = ('company_name', 'phone', 'address')
+IMPORTS = {'services': SERVICE_FIELDS, 'customers': CUSTOMER_FIELDS}
+# Exported columns that an import recomputes rather than takes
+IGNORED_COLUMNS = {'id', 'is_admin', 'two_factor_enabled'}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _looks_like_formula(text: str) -> bool:
+    # Also true for text that already starts with the escaping quote, so unescaping is exact
+    return text.lstrip("'").startswith(FORMULA_PREFIXES)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    if isinstance(value, str) and _looks_like_formula(value):
+        return "'" + value
+    return value
+
+
+def _csv_text(value):
+    """Undo the quote ``_csv_value`` put in front of a would-be formula"""
+    if isinstance(value, str) and value.startswith("'") and _looks_like_formula(value[1:]):
+        return value[1:]
+    return value
+
+
+class BulkTransfer:
+    """Streaming exports and batched imports for the admin data pages
+
+    Exports select plain columns with ``yield_per``, which reads through a
+    server-side cursor where the driver has one, and are written out in
+    chunks of about ``EXPORT_CHUNK_BYTES``, so memory stays flat however many
+    rows a table holds. CSV cells that a spreadsheet would run as a formula
+    get a leading ``'``, which an import of the same file removes again. Imports read CSV or JSON lines one row at a time,
+    validate each row, check uniqueness against the file and the database a
+    batch at a time, and insert each batch with one executemany INSERT in
+    its own transaction. Rows that fail are reported by line number and
+    never stop the rest of the file.
+    """
+
+    def __init__(self):
+        self.batch_size = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+        self.export_chunk_bytes = int(os.environ.get('EXPORT_CHUNK_BYTES', 64 * 1024))
+        self.max_reported_errors = int(os.environ.get('IMPORT_MAX_REPORTED_ERRORS', 1000))
+
+    # Export
+
+    def export(self, entity: str, fmt: str) -> Iterator[str]:
+        """The rows of ``entity`` as CSV or JSON lines, in chunks"""
+        order, columns = EXPORTS[entity]
+        headers = [column.key for column in columns]
+        query = db.session.query(*columns)
+        if entity == 'customers':
+            query = query.outerjoin(CustomerProfile, CustomerProfile.user_id == User.id)
+        query = query.order_by(order).execution_options(yield_per=self.batch_size)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == 'csv' else None
+        if writer:
+            writer.writerow(headers)
+        for row in query:
+            if writer:
+                writer.writerow([_csv_value(value) for value in row])
+            else:
+                buffer.write(json.dumps(dict(zip(headers, row)), default=_json_default))
+                buffer.write('\n')
+            if buffer.tell() >= self.export_chunk_bytes:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    # Import
+
+    def _read(self, stream, fmt: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+        """(line, row, error) for each record of an uploaded file"""
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            for row in reader:
+                if None in row:
+                    yield reader.line_num, None, "more values than columns"
+                else:
+                    yield reader.line_num, {name: _csv_text(value) for name, value in row.items()}, None
+            return
+
+        for line_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"invalid JSON: {str(e)}"
+                continue
+            if isinstance(row, dict):
+                yield line_number, row, None
+            else:
+                yield line_number, None, "not a JSON object"
+
+    def _validate(self, fields: Dict, row: Dict) -> Tuple[Dict, List[str]]:
+        values, errors = {}, []
+        for name, (convert, required) in fields.items():
+            value = row.get(name)
+            if value is None or (isinstance(value, str) and not value.strip()):
+                if required:
+                    errors.append(f"{name} is required")
+                values[name] = None
+                continue
+            try:
+                values[name] = convert(value)
+            except (TypeError, ValueError) as e:
+                errors.append(f"{name}: {str(e)}")
+        return values, errors
+
+    def import_file(self, entity: str, stream, fmt: str, dry_run: bool = False) -> Dict:
+        """Validate and insert every row of an uploaded file, returns the report"""
+        fields = IMPORTS[entity]
+        started = time.monotonic()
+        report = {
+            'entity': entity,
+            'dry_run': dry_run,
+            'processed': 0,
+            'inserted': 0,
+            'failed': 0,
+            'errors': [],
+            'ignored_columns': [],
+        }
+        seen: Dict[str, Set[str]] = {}
+        batch: List[Tuple[int, Dict]] = []
+
+        for line, row, error in self._read(stream, fmt):
+            report['processed'] += 1
+            if row is not None and report['processed'] == 1:
+                report['ignored_columns'] = sorted(set(row) - set(fields) - IGNORED_COLUMNS - {None})
+            if error is None:
+                values, errors = self._validate(fields, row)
+                if not errors:
+                    batch.append((line, values))
+                    if len(batch) >= self.batch_size:
+                        self._flush(entity, batch, seen, report, dry_run)
+                        batch = []
+                    continue
+                error = '; '.join(errors)
+            self._fail(report, line, error)
+        if batch:
+            self._flush(entity, batch, seen, report, dry_run)
+
+        if report['inserted'] and entity == 'services' and not dry_run:
+            # Core INSERTs skip the mapper events that keep these current
+            catalog_cache.invalidate()
+            service_search.invalidate()
+        report['errors'].sort(key=lambda error: error['line'])
+        report['truncated'] = report['failed'] > len(report['errors'])
+        report['seconds'] = round(time.monotonic() - started, 3)
+        logger.info(f"Imported {report['inserted']} of {report['processed']} {entity} rows "
+                    f"({report['failed']} failed, dry run: {dry_run}) in {report['seconds']}s")
+        return report
+
+    def _fail(self, report: Dict, line: int, error: str) -> None:
+        report['failed'] += 1
+        if len(report['errors']) < self.max_reported_errors:
+            report['errors'].append({'line': line, 'error': error})
+
+    def _unique(self, batch: List[Tuple[int, Dict]], seen: Dict[str, Set[str]],
+                report: Dict) -> List[Tuple[int, Dict]]:
+        """Drop customers whose username, email or Stripe id is taken in the file or the database"""
+        unique = {'username': User.username, 'email': User.email, 'stripe_customer_id': User.stripe_customer_id}
+        taken = {}
+        for name, column in unique.items():
+            values = {values[name] for _, values in batch if values[name] is not None}
+            taken[name] = set(db.session.scalars(select(column).where(column.in_(values)))) if values else set()
+
+        accepted = []
+        for line, values in batch:
+            clashes = [name for name in unique if values[name] is not None and
+                       (values[name] in taken[name] or values[name] in seen.setdefault(name, set()))]
+            if clashes:
+                self._fail(report, line, '; '.join(f"{name} {values[name]} already exists" for name in clashes))
+                continue
+            for name in unique:
+                if values[name] is not None:
+                    seen[name].add(values[name])
+            accepted.append((line, values))
+        return accepted
+
+    def _flush(self, entity: str, batch: List[Tuple[int, Dict]], seen: Dict[str, Set[str]],
+               report: Dict, dry_run: bool) -> None:
+        if entity == 'customers':
+            batch = self._unique(batch, seen, report)
+        if not batch:
+            return
+        rows = [values for _, values in batch]
+        try:
+            if entity == 'services':
+                self._insert_services(rows)
+            else:
+                self._insert_customers(rows)
+            if dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+            report['inserted'] += len(rows)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            message = str(getattr(e, 'orig', None) or e).splitlines()[0]
+            logger.error(f"Import batch of {len(rows)} {entity} rows failed: {message}")
+            for line, _ in batch:
+                self._fail(report, line, f"rejected by the database: {message}")
+
+    def _insert_services(self, rows: List[Dict]) -> None:
+        table = Service.__table__
+        now = datetime.utcnow()
+        records = []
+        for values in rows:
+            record = {name: value if value is not None else _default(table.c[name])
+                      for name, value in values.items()}
+            record['created_at'] = values['created_at'] or now
+            records.append(record)
+        db.session.execute(table.insert(), records)
+        platform_counters.adjust({ACTIVE_SERVICES: sum(1 for record in records if record['is_active'])})
+
+    def _insert_customers(self, rows: List[Dict]) -> None:
+        now = datetime.utcnow()
+        users = [{
+            'username': values['username'],
+            'email': values['email'],
+            'password_hash': values['password_hash'] or UNUSABLE_PASSWORD,
+            'is_admin': False,
+            'created_at': values['created_at'] or now,
+            'stripe_customer_id': values['stripe_customer_id'],
+            'two_factor_enabled': False,
+            'auth_version': 0,
+        } for values in rows]
+        db.session.execute(User.__table__.insert(), users)
+
+        ids = dict(db.session.execute(select(User.username, User.id)
+                                      .where(User.username.in_([user['username'] for user in users]))).all())
+        profiles = [dict({'user_id': ids[values['username']]}, **{name: values[name] for name in PROFILE_FIELDS})
+                    for values in rows]
+        db.session.execute(CustomerProfile.__table__.insert(), profiles)
+        platform_counters.adjust({USERS: len(users)})
+
+
+# Create singleton instance
+bulk_transfer = BulkTransfer()
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from database import db, use_primary
+from models import Service
+from utils.version_stamp import VersionStamp
+
+logger = logging.getLogger(__name__)
+
+_CHANGED_KEY = 'catalog_changed'
+
+# What the landing and catalog pages show of a service
+CATALOG_FIELDS = ('id', 'name', 'description', 'price', 'cpu_quota', 'memory_quota',
+                  'storage_quota', 'backup_enabled')
+
+
+@event.listens_for(Service, 'after_insert')
+@event.listens_for(Service, 'after_update')
+@event.listens_for(Service, 'after_delete')
+def _queue_invalidation(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    # Reload only once the change is visible to the other workers
+    if session.info.pop(_CHANGED_KEY, None):
+        catalog_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidation(session):
+    session.info.pop(_CHANGED_KEY, None)
+
+
+class CatalogCache:
+    """Active services, serialized to plain dicts, for the public catalog pages
+
+    Inserting, updating or deleting a Service through the ORM drops the cache
+    at commit and bumps a version stamp so every other worker on the host
+    reloads on its next read; ``CATALOG_CACHE_TTL`` bounds staleness for
+    workers on other hosts and for bulk ``query.update()`` calls, which skip
+    the mapper events. A warm cache serves page views without any query.
+    """
+
+    def __init__(self):
+        self.ttl = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+        self._services: List[Dict] = []
+        self._loaded_at: Optional[float] = None
+        self._version = ''
+        self._last_modified: Optional[datetime] = None
+        self._stamp = VersionStamp('catalog')
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _current(self) -> List[Dict]:
+        stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+        if self._stamp.changed() or stale:
+            self._load()
+        return self._services
+
+    def _load(self) -> None:
+        with self._lock:
+            with use_primary():
+                rows = db.session.query(Service).filter(Service.is_active.is_(True)) \
+                    .order_by(Service.price, Service.id).all()
+            services = [{field: getattr(row, field) for field in CATALOG_FIELDS} for row in rows]
+            newest = max((row.created_at for row in rows if row.created_at), default=None)
+
+            self._services = services
+            self._version = hashlib.sha256(
+                json.dumps(services, sort_keys=True, default=str).encode()).hexdigest()[:32]
+            changed_at = self._stamp.modified_at()
+            self._last_modified = max(filter(None, (newest, changed_at)), default=None)
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+        logger.debug(f"Loaded {len(services)} catalog services")
+
+    def active_services(self) -> List[Dict]:
+        """Active services ordered by price"""
+        return self._current()
+
+    @property
+    def version(self) -> str:
+        """Digest of the cached catalog, changes whenever its content does"""
+        self._current()
+        return self._version
+
+    @property
+    def last_modified(self) -> Optional[datetime]:
+        """When a service last changed, as far as this host can tell"""
+        self._current()
+        return self._last_modified
+
+    def invalidate(self) -> None:
+        """Drop the cache here and in every other worker"""
+        self._loaded_at = None
+        self._stamp.bump()
+
+    def warm(self) -> None:
+        """Load the catalog before the first page view"""
+        try:
+            # Through the stamp check, so the first page view does not load it again
+            self._current()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to warm the catalog cache: {str(e)}")
+
+
+# Create singleton instance
+catalog_cache = CatalogCache()
@@ -0,0 +1,62 @@
+import logging
+from typing import Any, Dict
+
+from sqlalchemy import and_, case, func
+
+from database import db
+from models import Container, Service
+
+logger = logging.getLogger(__name__)
+
+
+def get_dashboard_data(user_id: int, all_active: bool = False) -> Dict[str, Any]:
+    """A user's services with container state and usage totals, in one grouped query
+
+    With ``all_active`` every active service is listed, including those the
+    user has not deployed; only deployed ones get a ``usage`` entry.
+    """
+    running = func.sum(case((Container.status == 'running', 1), else_=0))
+    query = db.session.query(
+        Service,
+        func.count(Container.id),
+        running,
+        func.coalesce(func.sum(Container.cpu_usage), 0),
+        func.coalesce(func.sum(Container.memory_usage), 0),
+        func.coalesce(func.sum(Container.storage_usage), 0)
+    )
+    deployed = and_(Container.service_id == Service.id, Container.user_id == user_id)
+    if all_active:
+        query = query.outerjoin(Container, deployed).filter(Service.is_active.is_(True))
+    else:
+        query = query.join(Container, deployed)
+    rows = query.group_by(Service.id).order_by(Service.name).all()
+
+    services = []
+    usage = {}
+    totals = {'containers': 0, 'running': 0, 'cpu': 0.0, 'memory': 0, 'storage': 0}
+    for service, containers, running_count, cpu, memory, storage in rows:
+        services.append(service)
+        if not containers:
+            continue
+        usage[service.id] = {
+            'containers': containers,
+            'running': running_count or 0,
+            'status': 'running' if running_count else 'stopped',
+            'cpu': cpu,
+            'memory': memory,
+            'storage': storage,
+        }
+        totals['containers'] += containers
+        totals['running'] += running_count or 0
+        totals['cpu'] += cpu
+        totals['memory'] += memory
+        totals['storage'] += storage
+
+    return {
+        'services': services,
+        'usage': usage,
+        'total_cpu_usage': totals['cpu'],
+        'total_memory_usage': totals['memory'],
+        'total_storage_usage': totals['storage'],
+        'totals': totals,
+    }
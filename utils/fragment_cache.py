@@ -0,0 +1,144 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from flask import has_request_context, request
+from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+# Cookies that change how the shared layout renders
+THEME_COOKIES = ('theme', 'brandColor', 'brandName')
+
+
+def variation() -> Tuple:
+    """The role and theme a fragment was rendered for"""
+    if not has_request_context():
+        return ()
+    if not current_user.is_authenticated:
+        role = 'anonymous'
+    else:
+        role = 'admin' if current_user.is_admin else 'customer'
+    return (role,) + tuple(request.cookies.get(name) for name in THEME_COOKIES)
+
+
+class FragmentCache:
+    """LRU of rendered template fragments bounded by their total size
+
+    Sizes are counted in UTF-8 bytes; storing a fragment evicts the least
+    recently used ones until the total fits in ``FRAGMENT_CACHE_MAX_BYTES``.
+    A fragment larger than a quarter of the budget is not stored at all.
+    """
+
+    def __init__(self):
+        self.max_bytes = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+        self.default_ttl = int(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Markup]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, fragment: Markup, ttl: Optional[int] = None) -> None:
+        size = len(fragment.encode('utf-8'))
+        if size > self.max_bytes // 4:
+            return
+        expires = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (fragment, expires, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self.size -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def init_app(self, app) -> None:
+        """Add the ``cache`` tag and keep compiled templates on disk between restarts"""
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        directory = os.environ.get('JINJA_BYTECODE_CACHE_DIR',
+                                   os.path.join(tempfile.gettempdir(), 'portal-jinja-cache'))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+        except OSError as e:
+            logger.warning(f"Template bytecode cache disabled: {str(e)}")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Create singleton instance
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key, ttl %}...{% endcache %}`` for blocks that rarely change
+
+    The key is any expression, and ``ttl`` (seconds) is optional. Fragments
+    are stored per role (anonymous, customer, admin) and theme, so a block
+    may depend on those but on nothing more specific, such as the user's
+    name, unless that goes into the key too.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, ttl, caller):
+        if fragment_cache.max_bytes <= 0:
+            return caller()
+        full_key = (key,) + variation()
+        fragment = fragment_cache.get(full_key)
+        if fragment is None:
+            fragment = caller()
+            fragment_cache.set(full_key, fragment, ttl)
+        return fragment
+
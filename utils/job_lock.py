@@ -0,0 +1,45 @@
+import fcntl
+import os
+import tempfile
+import zlib
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import text
+
+from database import db
+
+
+@contextmanager
+def job_lock(name: str) -> Iterator[bool]:
+    """Hold a lock named ``name`` across every process sharing the database
+
+    Each gunicorn worker starts the same background jobs; a job wraps its
+    run in this and skips it when another process already holds the lock.
+    PostgreSQL uses a session-level advisory lock on a connection held for
+    the run, other databases an exclusive ``flock`` on a file in
+    ``JOB_LOCK_DIR``. Yields whether the lock was acquired.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        key = zlib.crc32(name.encode())
+        with db.engine.connect() as connection:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': key}).scalar()
+            try:
+                yield bool(acquired)
+            finally:
+                if acquired:
+                    connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': key})
+        return
+
+    lock_dir = os.environ.get('JOB_LOCK_DIR', tempfile.gettempdir())
+    os.makedirs(lock_dir, exist_ok=True)
+    with open(os.path.join(lock_dir, f"{name}.lock"), 'a') as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,290 @@
+import base64
+import hashlib
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_
+
+from database import db
+from models import Backup, BackupUploadPart
+from utils.job_lock import job_lock
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+except ImportError:  # offsite replication is optional
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+class OffsiteReplicator:
+    """Replicate finished backups to an S3-compatible bucket
+
+    Backups are sent as multipart uploads with several parts in flight at
+    once. Each worker reads only its own part, so memory stays at
+    ``concurrency * part_size`` regardless of the backup size. Every uploaded
+    part is recorded in ``BackupUploadPart``; an interrupted upload resumes
+    with the parts S3 still has and only re-sends the rest. A backup is marked
+    complete only after S3 accepted each part's MD5 and the final object's size
+    and multipart ETag match what was sent. Backups that failed or were never
+    sent are retried every OFFSITE_RETRY_INTERVAL seconds.
+
+    Configured through BACKUP_S3_BUCKET, BACKUP_S3_ENDPOINT_URL (for MinIO or
+    another local stand-in), BACKUP_S3_PREFIX, BACKUP_S3_PART_SIZE and
+    BACKUP_S3_CONCURRENCY; credentials come from the usual AWS variables.
+    """
+
+    def __init__(self, bucket: Optional[str] = None, endpoint_url: Optional[str] = None,
+                 prefix: Optional[str] = None, part_size: Optional[int] = None,
+                 concurrency: Optional[int] = None, client=None):
+        self.bucket = bucket or os.environ.get('BACKUP_S3_BUCKET')
+        self.endpoint_url = endpoint_url or os.environ.get('BACKUP_S3_ENDPOINT_URL')
+        self.prefix = (prefix if prefix is not None else os.environ.get('BACKUP_S3_PREFIX', 'backups')).strip('/')
+        self.part_size = max(int(part_size or os.environ.get('BACKUP_S3_PART_SIZE', 64 * 1024 * 1024)),
+                             MIN_PART_SIZE)
+        self.concurrency = max(int(concurrency or os.environ.get('BACKUP_S3_CONCURRENCY', 4)), 1)
+        self.interval = int(os.environ.get('OFFSITE_RETRY_INTERVAL', 900))
+        self._client = client
+        self._executor = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bucket) and (self._client is not None or boto3 is not None)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client(
+                's3',
+                endpoint_url=self.endpoint_url,
+                config=BotoConfig(max_pool_connections=self.concurrency + 2,
+                                  retries={'max_attempts': 5, 'mode': 'standard'})
+            )
+        return self._client
+
+    def submit(self, app, backup_id: int):
+        """Replicate a backup in the background, one backup at a time per process"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='offsite')
+        return self._executor.submit(self._replicate_in_context, app, backup_id)
+
+    def _replicate_in_context(self, app, backup_id: int) -> Tuple[bool, str]:
+        with app.app_context():
+            backup = db.session.get(Backup, backup_id)
+            if not backup:
+                return False, "Backup not found"
+            return self.replicate(backup)
+
+    def replicate_pending(self) -> int:
+        """Retry every backup that is not offsite yet, returns how many completed"""
+        completed = 0
+        backups = Backup.query.filter(
+            or_(Backup.offsite_status.is_(None), Backup.offsite_status != 'complete')
+        ).order_by(Backup.created_at).all()
+        for backup in backups:
+            if self._stop.is_set():
+                break
+            success, _ = self.replicate(backup)
+            completed += int(success)
+        return completed
+
+    def replicate(self, backup: Backup) -> Tuple[bool, str]:
+        """Upload a backup with a parallel multipart upload, resuming if one was started"""
+        if not self.enabled:
+            return False, "Offsite replication is not configured"
+        if backup.offsite_status == 'complete':
+            return True, "Backup is already offsite"
+
+        # A backup submitted by one worker may come up in another's retry pass
+        with job_lock(f"offsite-backup-{backup.id}") as acquired:
+            if not acquired:
+                return False, "Backup is already being replicated"
+            return self._replicate(backup)
+
+    def _replicate(self, backup: Backup) -> Tuple[bool, str]:
+        completed = False
+        try:
+            size = os.path.getsize(backup.path)
+            part_size = max(self.part_size, math.ceil(size / MAX_PARTS))
+            part_count = max(math.ceil(size / part_size), 1)
+
+            if not backup.offsite_upload_id:
+                backup.offsite_key = f"{self.prefix}/{backup.service_id}/{backup.filename}".lstrip('/')
+                upload = self.client.create_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=backup.offsite_key,
+                    ContentType='application/gzip',
+                    Metadata={'sha256': backup.checksum or ''}
+                )
+                backup.offsite_upload_id = upload['UploadId']
+            backup.offsite_status = 'uploading'
+            db.session.commit()
+
+            parts = self._resumable_parts(backup, size, part_size)
+            pending = [number for number in range(1, part_count + 1) if number not in parts]
+            if parts:
+                logger.info(f"Resuming offsite upload of {backup.filename}: "
+                            f"{len(parts)}/{part_count} parts already uploaded")
+
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='offsite-part') as pool:
+                futures = [pool.submit(self._upload_part, backup.path, backup.offsite_key,
+                                       backup.offsite_upload_id, number, part_size, size)
+                           for number in pending]
+                error = None
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    try:
+                        number, etag, length = future.result()
+                    except Exception as e:
+                        # Stop queued parts but keep recording the ones in flight
+                        if error is None:
+                            error = e
+                            for queued in futures:
+                                queued.cancel()
+                        continue
+                    parts[number] = etag
+                    db.session.add(BackupUploadPart(
+                        backup_id=backup.id,
+                        upload_id=backup.offsite_upload_id,
+                        part_number=number,
+                        size=length,
+                        etag=etag
+                    ))
+                    db.session.commit()
+                if error is not None:
+                    raise error
+
+            ordered = [{'PartNumber': number, 'ETag': parts[number]} for number in sorted(parts)]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=backup.offsite_key,
+                UploadId=backup.offsite_upload_id,
+                MultipartUpload={'Parts': ordered}
+            )
+            completed = True
+            self._verify_object(backup.offsite_key, size, [part['ETag'] for part in ordered])
+
+            backup.upload_parts.delete()
+            backup.offsite_status = 'complete'
+            backup.offsite_upload_id = None
+            backup.offsite_completed_at = datetime.utcnow()
+            db.session.commit()
+
+            logger.info(f"Backup {backup.filename} replicated offsite in {part_count} parts")
+            return True, "Backup replicated offsite"
+
+        except Exception as e:
+            logger.error(f"Offsite replication of {backup.filename} failed: {str(e)}")
+            db.session.rollback()
+            if completed or getattr(e, 'response', {}).get('Error', {}).get('Code') == 'NoSuchUpload':
+                # The upload was completed, aborted or expired; the next attempt starts a new one
+                backup.upload_parts.delete()
+                backup.offsite_upload_id = None
+            backup.offsite_status = 'failed'
+            db.session.commit()
+            return False, str(e)
+
+    def _resumable_parts(self, backup: Backup, size: int, part_size: int) -> Dict[int, str]:
+        """Recorded parts that S3 still holds with the same ETag and expected size"""
+        recorded = {part.part_number: part for part in
+                    backup.upload_parts.filter_by(upload_id=backup.offsite_upload_id)}
+        if not recorded:
+            return {}
+
+        remote = {}
+        paginator = self.client.get_paginator('list_parts')
+        for page in paginator.paginate(Bucket=self.bucket, Key=backup.offsite_key,
+                                       UploadId=backup.offsite_upload_id):
+            for part in page.get('Parts', []):
+                remote[part['PartNumber']] = part['ETag']
+
+        parts = {}
+        stale = []
+        for number, part in recorded.items():
+            expected_size = min(part_size, size - (number - 1) * part_size)
+            if remote.get(number) == part.etag and part.size == expected_size:
+                parts[number] = part.etag
+            else:
+                stale.append(part)
+        if stale:
+            # These parts are sent again and recorded under the same number
+            for part in stale:
+                db.session.delete(part)
+            db.session.commit()
+        return parts
+
+    def _upload_part(self, path: str, key: str, upload_id: str, number: int,
+                     part_size: int, size: int) -> Tuple[int, str, int]:
+        offset = (number - 1) * part_size
+        length = min(part_size, size - offset)
+        with open(path, 'rb') as f:
+            data = os.pread(f.fileno(), length, offset)
+        if len(data) != length:
+            raise OSError(f"Short read on part {number} of {path}")
+
+        digest = hashlib.md5(data)
+        # S3 rejects the part if the body does not match Content-MD5
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=data,
+            ContentMD5=base64.b64encode(digest.digest()).decode()
+        )
+        return number, response['ETag'], length
+
+    def _verify_object(self, key: str, size: int, etags: List[str]) -> None:
+        head = self.client.head_object(Bucket=self.bucket, Key=key)
+        if head['ContentLength'] != size:
+            raise RuntimeError(f"Offsite object {key} is {head['ContentLength']} bytes, expected {size}")
+
+        # A multipart ETag is the MD5 of the part MD5s followed by the part count
+        etag = head.get('ETag', '').strip('"')
+        if etag.endswith(f"-{len(etags)}"):
+            combined = hashlib.md5(b''.join(bytes.fromhex(e.strip('"')) for e in etags))
+            if etag != f"{combined.hexdigest()}-{len(etags)}":
+                raise RuntimeError(f"Offsite object {key} does not match the uploaded parts")
+
+    def start(self, app) -> None:
+        """Retry backups that are not offsite yet from a background thread"""
+        if self._thread is not None or self.interval <= 0 or not self.enabled:
+            return
+        self._thread = threading.Thread(target=self._run, args=(app,), name='offsite-retry', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, app) -> None:
+        while not self._stop.wait(self.interval):
+            with app.app_context():
+                try:
+                    with job_lock('offsite-retry') as acquired:
+                        if acquired:
+                            self.replicate_pending()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Offsite retry failed: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+# Create singleton instance
+offsite_replicator = OffsiteReplicator()
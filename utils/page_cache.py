@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+from flask import make_response, request, session
+from flask_login import current_user
+
+from utils.catalog_cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+# Cookies the public templates render from, so they are part of the cache key
+VARY_COOKIES = ('theme', 'brandColor', 'brandName')
+
+
+class PageCache:
+    """Rendered public pages for anonymous visitors
+
+    Entries are keyed by path, query string, the branding cookies the
+    templates read and the catalog version, so a Service change makes new
+    keys and old entries simply age out of the LRU. Responses carry a strong
+    ETag (a digest of the body), ``Last-Modified`` from the catalog and a
+    public ``Cache-Control`` that a browser or CDN can honour; matching
+    conditional requests get a 304 without rendering anything.
+    """
+
+    def __init__(self):
+        self.ttl = int(os.environ.get('PAGE_CACHE_TTL', 300))
+        self.max_size = int(os.environ.get('PAGE_CACHE_SIZE', 256))
+        self.max_age = int(os.environ.get('PAGE_CACHE_MAX_AGE', 60))
+        self._entries: "OrderedDict[Tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _key(self) -> Tuple:
+        cookies = tuple(request.cookies.get(name) for name in VARY_COOKIES)
+        return request.path, request.query_string, cookies, catalog_cache.version
+
+    def _get(self, key: Tuple) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[3] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def _store(self, key: Tuple, body: bytes, mimetype: str) -> tuple:
+        entry = (body, hashlib.sha256(body).hexdigest()[:32], mimetype, time.monotonic())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _respond(self, entry: tuple):
+        body, etag, mimetype, _ = entry
+        response = make_response(body)
+        response.mimetype = mimetype
+        response.set_etag(etag)
+        last_modified = catalog_cache.last_modified
+        if last_modified:
+            response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.vary.add('Cookie')
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            self.not_modified += 1
+        return response
+
+    def cached(self, view):
+        """Serve ``view`` from the cache to anonymous visitors without pending flashes"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or current_user.is_authenticated \
+                    or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            key = self._key()
+            entry = self._get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                # Error pages flash a message; those are not worth keeping
+                if response.status_code != 200 or session.modified or response.direct_passthrough:
+                    return response
+                entry = self._store(key, response.get_data(), response.mimetype)
+            return self._respond(entry)
+        return wrapper
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Create singleton instance
+page_cache = PageCache()
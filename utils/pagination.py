@@ -0,0 +1,81 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import func, select, text, tuple_
+
+from database import db
+
+PER_PAGE = 50
+COUNT_CAP = 10000
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    data = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], columns: Sequence) -> Optional[List[Any]]:
+    """Turn a cursor back into typed values for ``columns``, None if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(values) != len(columns):
+            return None
+        return [datetime.fromisoformat(v) if column.type.python_type is datetime and v else v
+                for column, v in zip(columns, values)]
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+def keyset_paginate(query, columns: Sequence, descending: bool = False, cursor: Optional[str] = None,
+                    backwards: bool = False, per_page: int = PER_PAGE) -> dict:
+    """One page of ``query`` ordered by ``columns`` without OFFSET
+
+    ``columns`` must end in a unique column (usually the primary key) so the
+    order is total. The cursor holds the sort values of the row at the edge
+    of the current page; ``backwards`` walks toward the start of the list.
+    With an index on ``columns`` every page is a single index seek.
+    """
+    keyset = tuple_(*columns) if len(columns) > 1 else columns[0]
+    values = decode_cursor(cursor, columns)
+    toward_smaller = descending != backwards
+
+    if values is not None:
+        bound = tuple_(*values) if len(columns) > 1 else values[0]
+        query = query.filter(keyset < bound if toward_smaller else keyset > bound)
+
+    order = [column.desc() if toward_smaller else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_of(row):
+        return encode_cursor([getattr(row, column.key) for column in columns])
+
+    has_next = more if not backwards else values is not None
+    has_prev = more if backwards else values is not None
+    return {
+        'items': rows,
+        'next_cursor': cursor_of(rows[-1]) if rows and has_next else None,
+        'prev_cursor': cursor_of(rows[0]) if rows and has_prev else None,
+    }
+
+
+def estimate_count(query) -> dict:
+    """A cheap row count for a listing: the planner's estimate on PostgreSQL, else a capped count"""
+    statement = query.order_by(None).statement
+    if db.engine.dialect.name == 'postgresql':
+        compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return {'count': int(plan[0]['Plan']['Plan Rows']), 'estimated': True}
+
+    capped = select(func.count()).select_from(statement.limit(COUNT_CAP + 1).subquery())
+    count = db.session.execute(capped).scalar()
+    return {'count': min(count, COUNT_CAP), 'estimated': count > COUNT_CAP}
@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import event, func, inspect
+
+from database import db
+from models import Container, PlatformCounter, Service, User
+from utils.podman import podman_manager
+
+logger = logging.getLogger(__name__)
+
+USERS = 'users'
+ACTIVE_SERVICES = 'services.active'
+CONTAINERS = 'containers'
+CONTAINER_STATUSES = ('created', 'running', 'stopped', 'paused', 'exited', 'error')
+
+
+def _status_counter(status: Optional[str]) -> str:
+    return f"{CONTAINERS}.{status or 'unknown'}"
+
+
+def _bump(connection, deltas: Dict[str, int]) -> None:
+    """Apply counter deltas inside the transaction that changed the rows"""
+    table = PlatformCounter.__table__
+    for name, delta in deltas.items():
+        if delta:
+            # A counter without a row yet is created by the next reconcile
+            connection.execute(
+                table.update()
+                .where(table.c.name == name)
+                .values(value=table.c.value + delta, updated_at=datetime.utcnow())
+            )
+
+
+def _changed(target, attribute: str):
+    """The previous value of an attribute changed in this flush, or the current one"""
+    history = inspect(target).attrs[attribute].history
+    if history.deleted:
+        return True, history.deleted[0]
+    return bool(history.added), getattr(target, attribute)
+
+
+@event.listens_for(Service.is_active, 'set', active_history=True)
+@event.listens_for(Container.status, 'set', active_history=True)
+def _load_previous_value(target, value, oldvalue, initiator):
+    # active_history loads the old value of an expired attribute before it is
+    # replaced, so the update hooks below can tell what it changed from
+    pass
+
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    _bump(connection, {USERS: 1})
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    _bump(connection, {USERS: -1})
+
+
+@event.listens_for(Service, 'after_insert')
+def _service_inserted(mapper, connection, target):
+    _bump(connection, {ACTIVE_SERVICES: int(bool(target.is_active))})
+
+
+@event.listens_for(Service, 'after_delete')
+def _service_deleted(mapper, connection, target):
+    _bump(connection, {ACTIVE_SERVICES: -int(bool(target.is_active))})
+
+
+@event.listens_for(Service, 'after_update')
+def _service_updated(mapper, connection, target):
+    changed, was_active = _changed(target, 'is_active')
+    if changed:
+        _bump(connection, {ACTIVE_SERVICES: int(bool(target.is_active)) - int(bool(was_active))})
+
+
+@event.listens_for(Container, 'after_insert')
+def _container_inserted(mapper, connection, target):
+    _bump(connection, {CONTAINERS: 1, _status_counter(target.status): 1})
+
+
+@event.listens_for(Container, 'after_delete')
+def _container_deleted(mapper, connection, target):
+    _bump(connection, {CONTAINERS: -1, _status_counter(target.status): -1})
+
+
+@event.listens_for(Container, 'after_update')
+def _container_updated(mapper, connection, target):
+    changed, old_status = _changed(target, 'status')
+    if changed and old_status != target.status:
+        _bump(connection, {_status_counter(old_status): -1, _status_counter(target.status): 1})
+
+
+class PlatformCounters:
+    """Platform totals for the admin dashboard without counting tables per request
+
+    Inserts, deletes and status changes adjust the counters in the same
+    transaction through mapper events. Bulk ``query.update()``/``delete()``
+    calls bypass those events, so a background thread periodically reconciles
+    the counters with real counts and logs any drift it corrects. The same
+    thread samples podman's health so dashboard loads don't run ``podman
+    info`` themselves.
+    """
+
+    def __init__(self):
+        self.interval = int(os.environ.get('COUNTER_RECONCILE_INTERVAL', 300))
+        self.health_interval = int(os.environ.get('HEALTH_SAMPLE_INTERVAL', 30))
+        self._health = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def snapshot(self) -> Dict[str, int]:
+        """All counters, read with one query on a table of a few rows"""
+        counters = dict(db.session.query(PlatformCounter.name, PlatformCounter.value).all())
+        if USERS not in counters:
+            # Fresh database: seed the counters before the first read
+            counters = self.reconcile()
+        return counters
+
+    def system_health(self) -> str:
+        """The last sampled podman health, sampling now if nothing ran yet"""
+        if self._health is None:
+            self._health = podman_manager.get_system_health()
+        return self._health
+
+    def adjust(self, deltas: Dict[str, int]) -> None:
+        """Apply deltas for rows written without the ORM, in the session's transaction"""
+        _bump(db.session.connection(), deltas)
+
+    def reconcile(self) -> Dict[str, int]:
+        """Reset every counter to the real count, returns the corrected values"""
+        actual = {
+            USERS: User.query.count(),
+            ACTIVE_SERVICES: Service.query.filter_by(is_active=True).count(),
+            CONTAINERS: 0,
+        }
+        actual.update({_status_counter(status): 0 for status in CONTAINER_STATUSES})
+        for status, total in db.session.query(Container.status, func.count()).group_by(Container.status):
+            actual[_status_counter(status)] = total
+            actual[CONTAINERS] += total
+
+        existing = {counter.name: counter for counter in PlatformCounter.query.all()}
+        for name in existing:
+            if name.startswith(f"{CONTAINERS}.") and name not in actual:
+                actual[name] = 0
+
+        drift = {}
+        for name, value in actual.items():
+            counter = existing.get(name)
+            if counter is None:
+                db.session.add(PlatformCounter(name=name, value=value))
+            elif counter.value != value:
+                drift[name] = counter.value - value
+                counter.value = value
+        db.session.commit()
+
+        if drift:
+            logger.warning(f"Corrected platform counter drift: {drift}")
+        return actual
+
+    def start(self, app) -> None:
+        """Reconcile counters and sample health from a background thread"""
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, args=(app,), name='platform-counters', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, app) -> None:
+        next_reconcile = 0.0
+        while not self._stop.is_set():
+            self._health = podman_manager.get_system_health()
+            if time.monotonic() >= next_reconcile:
+                with app.app_context():
+                    try:
+                        self.reconcile()
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Platform counter reconcile failed: {str(e)}")
+                    finally:
+                        db.session.remove()
+                next_reconcile = time.monotonic() + self.interval
+            self._stop.wait(min(self.health_interval, self.interval))
+
+
+# Create singleton instance
+platform_counters = PlatformCounters()
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(statement: str) -> str:
+    """The shape of a statement: literals and IN-lists collapse to ``?``"""
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _PLACEHOLDER_LIST.sub('(?)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(normalize(statement).encode()).hexdigest()[:12]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCollector:
+    """Statements run on the current thread while the collector is active"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter = Counter()
+        self.statements: Dict[str, str] = {}
+
+    def record(self, statement: str, duration: float) -> None:
+        key = fingerprint(statement)
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[key] += 1
+        self.statements.setdefault(key, normalize(statement))
+
+    def repeated(self, threshold: int = 2) -> List[dict]:
+        """Statements that ran at least ``threshold`` times, most frequent first"""
+        return [{'fingerprint': key, 'count': count, 'statement': self.statements[key]}
+                for key, count in self.fingerprints.most_common() if count >= threshold]
+
+
+class QueryStats:
+    """Count the SQL each request runs and flag likely N+1 patterns
+
+    Cursor execution events on every engine feed the collectors active on
+    the current thread: one per request, plus any ``query_budget`` blocks.
+    At the end of a request the totals are folded into per-endpoint
+    aggregates (see ``stats``), statements repeated ``QUERY_REPEAT_THRESHOLD``
+    times or more are logged as possible N+1 queries, and in debug mode, or
+    with ``QUERY_STATS_HEADERS=1``, the totals are sent back as
+    ``X-Query-Count``, ``X-Query-Time`` and ``Server-Timing`` headers.
+    """
+
+    def __init__(self):
+        self.repeat_threshold = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5))
+        self.headers = os.environ.get('QUERY_STATS_HEADERS') == '1'
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, dict] = {}
+        self._installed = False
+
+    def _active(self) -> List[QueryCollector]:
+        if not hasattr(self._local, 'collectors'):
+            self._local.collectors = []
+        return self._local.collectors
+
+    def install(self) -> None:
+        if self._installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._installed = True
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('query_start_time')
+        if not started:
+            return
+        duration = time.perf_counter() - started.pop()
+        for collector in self._active():
+            collector.record(statement, duration)
+
+    def init_app(self, app) -> None:
+        self.install()
+
+        @app.before_request
+        def _start_query_collection():
+            collector = QueryCollector()
+            self._local.request = collector
+            self._active().append(collector)
+
+        @app.after_request
+        def _report_queries(response):
+            collector = getattr(self._local, 'request', None)
+            if collector is None:
+                return response
+            endpoint = request.endpoint or 'unknown'
+            repeated = collector.repeated(self.repeat_threshold)
+            self._aggregate(endpoint, collector, repeated)
+            for item in repeated:
+                logger.warning(f"Possible N+1 on {endpoint}: {item['count']}x {item['statement'][:200]}")
+
+            if self.headers or app.debug:
+                db_ms = collector.duration * 1000
+                response.headers['X-Query-Count'] = str(collector.count)
+                response.headers['X-Query-Time'] = f"{db_ms:.1f}"
+                if repeated:
+                    response.headers['X-Query-Repeated'] = ', '.join(
+                        f"{item['fingerprint']}={item['count']}" for item in repeated)
+                response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{collector.count} queries"')
+            return response
+
+        @app.teardown_request
+        def _stop_query_collection(exc):
+            collector = getattr(self._local, 'request', None)
+            self._local.request = None
+            if collector is not None and collector in self._active():
+                self._active().remove(collector)
+
+    def _aggregate(self, endpoint: str, collector: QueryCollector, repeated: List[dict]) -> None:
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time': 0.0, 'n_plus_one': 0,
+            })
+            stats['requests'] += 1
+            stats['queries'] += collector.count
+            stats['max_queries'] = max(stats['max_queries'], collector.count)
+            stats['db_time'] += collector.duration
+            if repeated:
+                stats['n_plus_one'] += 1
+                stats['last_repeated'] = repeated[0]['statement'][:500]
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-endpoint totals since the worker started"""
+        with self._lock:
+            snapshot = {endpoint: dict(values) for endpoint, values in self._endpoints.items()}
+        for values in snapshot.values():
+            values['avg_queries'] = round(values['queries'] / values['requests'], 2)
+            values['avg_db_ms'] = round(values['db_time'] * 1000 / values['requests'], 2)
+            values['db_time'] = round(values['db_time'], 4)
+        return snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+    @contextmanager
+    def collect(self):
+        """Collect the statements run on this thread inside the block"""
+        self.install()
+        collector = QueryCollector()
+        self._active().append(collector)
+        try:
+            yield collector
+        finally:
+            self._active().remove(collector)
+
+
+# Create singleton instance
+query_stats = QueryStats()
+
+
+@contextmanager
+def query_budget(limit: int, repeat_limit: Optional[int] = None):
+    """Fail when the block runs more than ``limit`` statements
+
+    Meant for tests and scripts, e.g. ``with query_budget(6): client.get('/dashboard')``.
+    With ``repeat_limit`` it also fails when any single statement shape runs
+    more often than that, which is how an N+1 loop usually shows up.
+    """
+    with query_stats.collect() as collector:
+        yield collector
+
+    if collector.count > limit:
+        shapes = '\n'.join(f"  {item['count']}x {item['statement']}" for item in collector.repeated(1)[:10])
+        raise QueryBudgetExceeded(f"{collector.count} queries run, budget is {limit}:\n{shapes}")
+    if repeat_limit is not None:
+        repeated = collector.repeated(repeat_limit + 1)
+        if repeated:
+            worst = repeated[0]
+            raise QueryBudgetExceeded(
+                f"Statement ran {worst['count']} times, limit is {repeat_limit}: {worst['statement']}")
@@ -0,0 +1,316 @@
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from database import db, use_primary
+from models import Service
+from utils.version_stamp import VersionStamp
+
+logger = logging.getLogger(__name__)
+
+_CHANGES_KEY = 'search_changes'
+_TOKEN = re.compile(r'[a-z0-9]+')
+_FILTER = re.compile(r'^(cpu|memory|mem|storage|disk|price|backups?|active)(>=|<=|=|>|<|:)([a-z0-9.]+)$')
+
+# Weight of a match in each indexed field, and of each kind of match
+FIELD_WEIGHTS = {'name': 3.0, 'description': 1.0}
+EXACT, PREFIX, FUZZY = 1.0, 0.6, 0.4
+
+# Numeric attributes that filters can use, by filter name
+NUMERIC = {'cpu': 'cpu_quota', 'memory': 'memory_quota', 'mem': 'memory_quota',
+           'storage': 'storage_quota', 'disk': 'storage_quota', 'price': 'price'}
+FLAGS = {'backup': 'backup_enabled', 'backups': 'backup_enabled', 'active': 'is_active'}
+DOC_FIELDS = ('id', 'name', 'description', 'price', 'cpu_quota', 'memory_quota', 'storage_quota',
+              'backup_enabled', 'is_active')
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall((text or '').lower())
+
+
+def _deletes(token: str) -> Set[str]:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _one_edit_apart(a: str, b: str) -> bool:
+    """One substitution, insertion, deletion or adjacent swap turns ``a`` into ``b``"""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return a == b
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (len(diff) == 2 and diff[1] == diff[0] + 1
+                                  and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def _parse_value(text: str) -> Optional[float]:
+    """A number, with gb/mb for sizes in MB"""
+    match = re.match(r'^(\d+(?:\.\d+)?)(gb|g|mb|m)?$', text)
+    if not match:
+        return None
+    value = float(match.group(1))
+    return value * 1024 if match.group(2) in ('gb', 'g') else value
+
+
+def _snapshot(service: Service) -> Dict:
+    return {field: getattr(service, field) for field in DOC_FIELDS}
+
+
+@event.listens_for(Service, 'after_insert')
+@event.listens_for(Service, 'after_update')
+def _queue_upsert(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGES_KEY, {})[target.id] = _snapshot(target)
+
+
+@event.listens_for(Service, 'after_delete')
+def _queue_removal(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGES_KEY, {})[target.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed(session):
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if changes:
+        service_search.apply(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_CHANGES_KEY, None)
+
+
+class ServiceSearch:
+    """In-memory inverted index over services for the catalog and admin search
+
+    Names and descriptions are tokenized into postings (token -> service ->
+    weight) next to a sorted vocabulary for prefix lookups and a map of
+    one-letter deletions for typo tolerance (one edit, from five letters
+    up). Quotas and price sit in sorted lists so filters like
+    ``memory>=2048`` or ``price<30`` are binary searches. Committed Service
+    changes are applied to the index in place; other workers see a version
+    stamp move and rebuild, and ``SEARCH_INDEX_TTL`` bounds staleness beyond
+    that.
+    """
+
+    def __init__(self):
+        self.ttl = int(os.environ.get('SEARCH_INDEX_TTL', 600))
+        self.fuzzy_min_length = 5
+        self._lock = threading.RLock()
+        self._stamp = VersionStamp('search')
+        self._built_at: Optional[float] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._docs: Dict[int, Dict] = {}
+        self._active: Set[int] = set()
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._vocabulary: List[str] = []
+        self._deletions: Dict[str, Set[str]] = {}
+        self._numeric: Dict[str, List[Tuple[float, int]]] = {column: [] for column in set(NUMERIC.values())}
+
+    # Index maintenance
+
+    def _add(self, doc: Dict) -> None:
+        service_id = doc['id']
+        self._docs[service_id] = doc
+        if doc['is_active']:
+            self._active.add(service_id)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(doc[field]):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    bisect.insort(self._vocabulary, token)
+                    if len(token) >= self.fuzzy_min_length:
+                        for variant in _deletes(token):
+                            self._deletions.setdefault(variant, set()).add(token)
+                postings[service_id] = max(postings.get(service_id, 0), weight)
+        for column, values in self._numeric.items():
+            bisect.insort(values, (float(doc[column] or 0), service_id))
+
+    def _remove(self, service_id: int) -> None:
+        doc = self._docs.pop(service_id, None)
+        if doc is None:
+            return
+        self._active.discard(service_id)
+        for field in FIELD_WEIGHTS:
+            for token in tokenize(doc[field]):
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(service_id, None)
+                if not postings:
+                    del self._postings[token]
+                    index = bisect.bisect_left(self._vocabulary, token)
+                    if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                        del self._vocabulary[index]
+                    if len(token) >= self.fuzzy_min_length:
+                        for variant in _deletes(token):
+                            tokens = self._deletions.get(variant)
+                            if tokens is not None:
+                                tokens.discard(token)
+                                if not tokens:
+                                    del self._deletions[variant]
+        for column, values in self._numeric.items():
+            entry = (float(doc[column] or 0), service_id)
+            index = bisect.bisect_left(values, entry)
+            if index < len(values) and values[index] == entry:
+                del values[index]
+
+    def rebuild(self) -> None:
+        """Index every service from scratch with one query"""
+        with use_primary():
+            rows = db.session.query(*(getattr(Service, field) for field in DOC_FIELDS)).all()
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(dict(zip(DOC_FIELDS, row)))
+            self._built_at = time.monotonic()
+        logger.debug(f"Built the search index over {len(rows)} services")
+
+    def apply(self, changes: Dict[int, Optional[Dict]]) -> None:
+        """Update the index for committed changes and tell the other workers"""
+        with self._lock:
+            if self._built_at is not None:
+                for service_id, doc in changes.items():
+                    self._remove(service_id)
+                    if doc is not None:
+                        self._add(doc)
+        self._stamp.bump()
+        # This worker is already current; don't rebuild for its own bump
+        self._stamp.changed()
+
+    def invalidate(self) -> None:
+        """Rebuild here and in every other worker, after writes that skip the mapper events"""
+        self._built_at = None
+        self._stamp.bump()
+
+    def _ensure_current(self) -> None:
+        stale = self._built_at is None or time.monotonic() - self._built_at > self.ttl
+        if self._stamp.changed() or stale:
+            self.rebuild()
+
+    def warm(self) -> None:
+        try:
+            self._ensure_current()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to build the search index: {str(e)}")
+
+    # Queries
+
+    def _expand(self, term: str, last: bool) -> Dict[str, float]:
+        """Vocabulary tokens a query term stands for, with the strength of the match"""
+        matches = {}
+        if term in self._postings:
+            matches[term] = EXACT
+        # Every term is a prefix while typing, the last one most of all
+        if last or len(term) >= 3:
+            index = bisect.bisect_left(self._vocabulary, term)
+            while index < len(self._vocabulary) and self._vocabulary[index].startswith(term):
+                matches.setdefault(self._vocabulary[index], PREFIX)
+                index += 1
+        if not matches and len(term) >= self.fuzzy_min_length - 1:
+            candidates = set(self._deletions.get(term, ()))
+            for variant in _deletes(term):
+                candidates.update(self._deletions.get(variant, ()))
+                if variant in self._postings:
+                    candidates.add(variant)
+            for token in candidates:
+                if _one_edit_apart(term, token):
+                    matches[token] = FUZZY
+        return matches
+
+    def _filter(self, name: str, operator: str, raw: str) -> Optional[Set[int]]:
+        if name in FLAGS:
+            wanted = raw not in ('0', 'no', 'false', 'off')
+            if FLAGS[name] == 'is_active':
+                return set(self._active) if wanted else set(self._docs) - self._active
+            return {service_id for service_id, doc in self._docs.items()
+                    if bool(doc[FLAGS[name]]) == wanted}
+
+        value = _parse_value(raw)
+        if value is None:
+            return None
+        values = self._numeric[NUMERIC[name]]
+        low = bisect.bisect_left(values, (value, float('-inf')))
+        high = bisect.bisect_right(values, (value, float('inf')))
+        if operator in ('=', ':'):
+            selected = values[low:high]
+        elif operator == '>=':
+            selected = values[low:]
+        elif operator == '>':
+            selected = values[high:]
+        elif operator == '<=':
+            selected = values[:high]
+        else:
+            selected = values[:low]
+        return {service_id for _, service_id in selected}
+
+    def search(self, query: str, limit: int = 20, include_inactive: bool = False) -> Dict:
+        """Services matching every word and filter in ``query``, best first"""
+        self._ensure_current()
+        terms, filters = [], []
+        for word in (query or '').lower().split():
+            match = _FILTER.match(word)
+            if match:
+                filters.append(match.groups())
+            else:
+                terms.extend(tokenize(word))
+
+        with self._lock:
+            candidates: Optional[Set[int]] = None
+            if not include_inactive:
+                candidates = set(self._active)
+            for name, operator, raw in filters:
+                selected = self._filter(name, operator, raw)
+                if selected is not None:
+                    candidates = selected if candidates is None else candidates & selected
+
+            matches: List[Dict[int, float]] = []
+            for position, term in enumerate(terms):
+                term_scores: Dict[int, float] = {}
+                for token, strength in self._expand(term, position == len(terms) - 1).items():
+                    for service_id, weight in self._postings[token].items():
+                        score = weight * strength
+                        if score > term_scores.get(service_id, 0):
+                            term_scores[service_id] = score
+                matches.append(term_scores)
+                candidates = set(term_scores) if candidates is None else candidates.intersection(term_scores)
+
+            if candidates is None:
+                candidates = set(self._docs)
+            docs = self._docs
+            keyed = [(-sum(term_scores[service_id] for term_scores in matches), docs[service_id]['price'] or 0,
+                      service_id) for service_id in candidates]
+            results = [dict(docs[service_id], score=round(-score, 2))
+                       for score, _, service_id in heapq.nsmallest(limit, keyed)]
+        return {'results': results, 'total': len(candidates)}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'services': len(self._docs),
+            'tokens': len(self._vocabulary),
+            'deletions': len(self._deletions),
+        }
+
+
+# Create singleton instance
+service_search = ServiceSearch()
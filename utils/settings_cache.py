@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from database import db, use_primary
+from models import SystemSettings
+from utils.version_stamp import VersionStamp
+
+logger = logging.getLogger(__name__)
+
+REDACTED = '********'
+_CHANGED_KEY = 'settings_changed'
+
+
+@event.listens_for(SystemSettings, 'after_insert')
+@event.listens_for(SystemSettings, 'after_update')
+@event.listens_for(SystemSettings, 'after_delete')
+def _queue_invalidation(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    # Reload only once the change is visible to the other workers
+    if session.info.pop(_CHANGED_KEY, None):
+        settings_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidation(session):
+    session.info.pop(_CHANGED_KEY, None)
+
+
+class SettingsCache:
+    """All SystemSettings rows held in memory, loaded with one query
+
+    Inserting, updating or deleting a setting through the ORM, as
+    ``SystemSettings.set_setting`` does, drops the cache at commit and bumps
+    a version stamp, which makes every worker on the host reload on its next
+    read. ``SETTINGS_CACHE_TTL`` bounds
+    how long a worker on another host can serve a value it has not reloaded.
+    Only keys are ever logged; use ``redacted()`` when values must be shown.
+    """
+
+    def __init__(self):
+        self.ttl = int(os.environ.get('SETTINGS_CACHE_TTL', 60))
+        self._values: Dict[str, Optional[str]] = {}
+        self._secret: Set[str] = set()
+        self._loaded_at: Optional[float] = None
+        self._stamp = VersionStamp('settings')
+        self._lock = threading.Lock()
+
+    def _current(self) -> Dict[str, Optional[str]]:
+        stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+        if self._stamp.changed() or stale:
+            self._load()
+        return self._values
+
+    def _load(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+            with use_primary():
+                rows = db.session.query(SystemSettings.key, SystemSettings.value, SystemSettings.is_secret).all()
+            self._values = {key: value for key, value, _ in rows}
+            self._secret = {key for key, _, is_secret in rows if is_secret}
+            self._loaded_at = time.monotonic()
+        logger.debug(f"Loaded {len(rows)} system settings")
+
+    def get(self, key: str, default=None) -> Optional[str]:
+        values = self._current()
+        return values[key] if key in values else default
+
+    def all(self) -> Dict[str, Optional[str]]:
+        return dict(self._current())
+
+    def redacted(self) -> Dict[str, Optional[str]]:
+        """Every setting with secret values masked, safe to log or display"""
+        values = self._current()
+        return {key: REDACTED if key in self._secret and value else value
+                for key, value in values.items()}
+
+    def invalidate(self) -> None:
+        """Drop the cache here and in every other worker"""
+        self._loaded_at = None
+        self._stamp.bump()
+
+
+# Create singleton instance
+settings_cache = SettingsCache()
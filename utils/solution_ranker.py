@@ -0,0 +1,188 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.catalog_cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+# Columns of the feature matrix
+FEATURES = ('cpu_quota', 'memory_quota', 'storage_quota', 'price', 'backup_enabled')
+CPU, MEMORY, STORAGE, PRICE, BACKUP = range(len(FEATURES))
+
+# What each quiz answer asks of a service: minimum resources and criterion weights
+WEBSITE_TYPES = {
+    'blog': {'cpu': 0.5, 'memory': 512, 'weights': {CPU: 1, MEMORY: 1}},
+    'business': {'cpu': 1, 'memory': 1024, 'weights': {CPU: 2, MEMORY: 2}},
+    'enterprise': {'cpu': 2, 'memory': 2048, 'backup': True, 'weights': {CPU: 3, MEMORY: 3, BACKUP: 2}},
+}
+TRAFFIC = {
+    'small': {'memory': 512, 'weights': {MEMORY: 1}},
+    'medium': {'memory': 1024, 'weights': {MEMORY: 2}},
+    'large': {'memory': 2048, 'weights': {MEMORY: 3, CPU: 1}},
+}
+PRIORITIES = {
+    'performance': {'cpu': 1, 'weights': {CPU: 2}},
+    'security': {'backup': True, 'weights': {BACKUP: 3}},
+    'support': {'weights': {STORAGE: 1}},
+}
+BUDGETS = {
+    'basic': (0, 30),
+    'standard': (30, 100),
+    'premium': (100, None),
+}
+BUDGET_WEIGHT = 3
+# Services cheaper than the budget still fit, just slightly less well
+UNDER_BUDGET_FIT = 0.9
+
+
+def _requirements(answers: Dict) -> Tuple[Dict[str, float], Dict[int, float], Optional[Tuple]]:
+    """Turn quiz answers into minimum resources, criterion weights and a budget"""
+    needs: Dict[str, float] = {}
+    weights: Dict[int, float] = {}
+    for table, answer in ((WEBSITE_TYPES, answers.get('1')), (TRAFFIC, answers.get('2')),
+                          (PRIORITIES, answers.get('3'))):
+        option = table.get(answer)
+        if not option:
+            continue
+        for resource in ('cpu', 'memory'):
+            if resource in option:
+                needs[resource] = max(needs.get(resource, 0), option[resource])
+        if option.get('backup'):
+            needs['backup'] = 1
+        for column, weight in option['weights'].items():
+            weights[column] = weights.get(column, 0) + weight
+
+    budget = BUDGETS.get(answers.get('4'))
+    if budget:
+        weights[PRICE] = BUDGET_WEIGHT
+    return needs, weights, budget
+
+
+class SolutionRanker:
+    """Rank active services against solution finder answers
+
+    A feature matrix over the cached catalog (cpu, memory, storage, price,
+    backups) is rebuilt only when the catalog's version changes, so a quiz
+    submission runs no query. Answers become minimum resources, a budget and
+    a weight per criterion; each service scores the weighted mean of how far
+    it satisfies each criterion, between 0 and 1, in a few NumPy array
+    operations over all services at once.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._services: List[Dict] = []
+        self._matrix = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def _refresh(self) -> None:
+        services = catalog_cache.active_services()
+        version = catalog_cache.version
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            rows = [[float(service[feature] or 0) for feature in FEATURES] for service in services]
+            self._matrix = np.array(rows, dtype=float).reshape(len(rows), len(FEATURES))
+            self._services = services
+            self._version = version
+            self.rebuilds += 1
+        logger.debug(f"Rebuilt the solution finder matrix for {len(services)} services")
+
+    def _satisfaction(self, needs: Dict[str, float], budget: Optional[Tuple]):
+        """Per service and criterion, how well the requirement is met (0 to 1)"""
+        matrix = self._matrix
+        cpu, memory, backup = needs.get('cpu'), needs.get('memory'), needs.get('backup')
+        low, high = budget or (None, None)
+
+        satisfied = np.ones_like(matrix)
+        if cpu:
+            satisfied[:, CPU] = np.minimum(matrix[:, CPU] / cpu, 1)
+        if memory:
+            satisfied[:, MEMORY] = np.minimum(matrix[:, MEMORY] / memory, 1)
+        # More storage is always better, relative to the largest plan
+        largest = matrix[:, STORAGE].max() if len(matrix) else 0
+        if largest:
+            satisfied[:, STORAGE] = matrix[:, STORAGE] / largest
+        if backup:
+            satisfied[:, BACKUP] = matrix[:, BACKUP]
+        if budget:
+            price = matrix[:, PRICE]
+            fit = np.ones(len(price))
+            if high is not None:
+                fit = np.where(price > high, high / np.maximum(price, 1e-9), fit)
+            if low:
+                fit = np.where(price < low, UNDER_BUDGET_FIT, fit)
+            satisfied[:, PRICE] = fit
+        return satisfied
+
+    def rank(self, answers: Dict, top_k: int = 3) -> List[Dict]:
+        """The ``top_k`` best services for ``answers``, best first, with the reasons"""
+        self._refresh()
+        if not self._services:
+            return []
+        needs, weights, budget = _requirements(answers or {})
+        weight_vector = [float(weights.get(column, 0)) for column in range(len(FEATURES))]
+        total = sum(weight_vector)
+        satisfied = self._satisfaction(needs, budget)
+
+        w = np.array(weight_vector)
+        scores = satisfied @ w / total if total else np.zeros(len(self._services))
+        # Cheaper wins a tie
+        order = np.lexsort((self._matrix[:, PRICE], -np.round(scores, 6)))[:top_k]
+        ranked = [(int(i), float(scores[i]), satisfied[i].tolist()) for i in order]
+
+        return [self._result(self._services[i], score, row, needs, weights, budget)
+                for i, score, row in ranked]
+
+    def _result(self, service: Dict, score: float, satisfied: List[float], needs: Dict,
+                weights: Dict, budget: Optional[Tuple]) -> Dict:
+        return {
+            'id': service['id'],
+            'name': service['name'],
+            'description': service['description'],
+            'price': float(service['price']),
+            'score': round(score * 100),
+            'features': [
+                f"{service['cpu_quota']} CPU Cores",
+                f"{service['memory_quota']}MB Memory",
+                f"{service['storage_quota']}MB Storage",
+                "Daily Backups" if service['backup_enabled'] else None
+            ],
+            'reasons': self._explain(service, satisfied, needs, weights, budget),
+        }
+
+    def _explain(self, service: Dict, satisfied: List[float], needs: Dict, weights: Dict,
+                 budget: Optional[Tuple]) -> List[str]:
+        reasons = []
+        if CPU in weights and needs.get('cpu'):
+            if satisfied[CPU] >= 1:
+                reasons.append(f"Meets the {needs['cpu']:g} CPU cores your site needs")
+            else:
+                reasons.append(f"{service['cpu_quota']:g} of the {needs['cpu']:g} CPU cores your site needs")
+        if MEMORY in weights and needs.get('memory'):
+            if satisfied[MEMORY] >= 1:
+                reasons.append(f"Meets the {needs['memory']:g}MB memory for your traffic")
+            else:
+                reasons.append(f"{service['memory_quota']}MB of the {needs['memory']:g}MB memory for your traffic")
+        if BACKUP in weights and needs.get('backup'):
+            reasons.append("Daily backups included" if service['backup_enabled'] else "No daily backups")
+        if budget:
+            low, high = budget
+            price = float(service['price'])
+            if high is not None and price > high:
+                reasons.append(f"${price:.2f}/month is above your ${high} budget")
+            elif low and price < low:
+                reasons.append(f"${price:.2f}/month, below your budget")
+            else:
+                reasons.append(f"${price:.2f}/month fits your budget")
+        return reasons
+
+
+# Create singleton instance
+solution_ranker = SolutionRanker()
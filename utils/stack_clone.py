@@ -0,0 +1,248 @@
+import errno
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import socket
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+from models import Container, Service
+
+logger = logging.getLogger(__name__)
+
+# ioctl(2) request that makes the destination share the source's extents
+FICLONE = 0x40049409
+_NO_REFLINK = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS}
+
+
+def _copy_file(src: str, dst: str, stats: Dict[str, int], reflink: bool) -> bool:
+    """Copy one file, sharing extents when possible; returns whether reflinks still work"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        if reflink:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                stats['reflinked'] += 1
+                return True
+            except OSError as e:
+                if e.errno not in _NO_REFLINK:
+                    raise
+                reflink = False
+
+        # copy_file_range stays in the kernel and still shares blocks on
+        # filesystems that support server-side or block cloning
+        size = os.fstat(fsrc.fileno()).st_size
+        copied = 0
+        try:
+            while copied < size:
+                sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError:
+            fsrc.seek(copied)
+            fdst.seek(copied)
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+        stats['copied'] += 1
+        stats['bytes_copied'] += size
+        return reflink
+
+
+def clone_tree(src: str, dst: str) -> Dict[str, int]:
+    """Copy a directory tree with copy-on-write clones where the filesystem allows
+
+    Ownership, permissions and timestamps are preserved so the clone can be
+    mounted into the same images. Returns how many files were reflinked and
+    how many had to be copied.
+    """
+    stats = {'reflinked': 0, 'copied': 0, 'bytes_copied': 0}
+    reflink = True
+    os.makedirs(dst, exist_ok=True)
+
+    for dirpath, dirnames, filenames in os.walk(src):
+        target_dir = os.path.join(dst, os.path.relpath(dirpath, src))
+        for name in dirnames + filenames:
+            source = os.path.join(dirpath, name)
+            target = os.path.join(target_dir, name)
+            st = os.lstat(source)
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), target)
+            elif os.path.isdir(source):
+                os.makedirs(target, exist_ok=True)
+            elif os.path.isfile(source):
+                reflink = _copy_file(source, target, stats, reflink)
+            else:
+                continue
+            try:
+                os.lchown(target, st.st_uid, st.st_gid)
+            except PermissionError:
+                pass
+            if not os.path.islink(target):
+                os.chmod(target, st.st_mode & 0o7777)
+                os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    st = os.stat(src)
+    os.chmod(dst, st.st_mode & 0o7777)
+    return stats
+
+
+class StackCloner:
+    """Create a staging copy of a tenant's stack from its volumes"""
+
+    def __init__(self):
+        self.staging_domain = os.environ.get('STAGING_BASE_DOMAIN', 'staging.localhost')
+
+    def clone(self, service: Service, container: Container) -> Tuple[Optional[Container], str]:
+        """Clone a deployed stack into a new stack with its own volumes, port and domain
+
+        The source containers are paused only while their volumes are cloned,
+        which on reflink-capable filesystems takes metadata time, not data time.
+        """
+        environment = container.environment or {}
+        stack_name = environment.get('stack_name') or container.name
+        clone_name = self._clone_name(stack_name)
+        sources = self._stack_containers(stack_name) or [container.container_id]
+
+        try:
+            inspected = {name: self._inspect(name) for name in sources}
+        except Exception as e:
+            logger.error(f"Failed to inspect stack {stack_name}: {str(e)}")
+            return None, "Could not read the source stack"
+
+        created_volumes: List[str] = []
+        created_containers: List[str] = []
+        stats = {'reflinked': 0, 'copied': 0, 'bytes_copied': 0}
+        # Stopped containers aren't writing to their volumes and can't be paused
+        running = [name for name in sources if inspected[name].get('State', {}).get('Running')]
+        try:
+            try:
+                if running:
+                    paused = subprocess.run(['podman', 'pause', *running], capture_output=True, text=True)
+                    if paused.returncode != 0:
+                        raise RuntimeError(f"could not pause the source stack: {paused.stderr.strip()}")
+                volume_map = {}
+                for info in inspected.values():
+                    for mount in info.get('Mounts', []):
+                        if mount.get('Type') != 'volume' or mount['Name'] in volume_map:
+                            continue
+                        new_volume = mount['Name'].replace(stack_name, clone_name, 1)
+                        if new_volume == mount['Name']:
+                            new_volume = f"{clone_name}-{mount['Name']}"
+                        subprocess.run(['podman', 'volume', 'create', new_volume],
+                                       check=True, capture_output=True)
+                        created_volumes.append(new_volume)
+                        result = clone_tree(self._volume_mountpoint(mount['Name']),
+                                            self._volume_mountpoint(new_volume))
+                        for key in stats:
+                            stats[key] += result[key]
+                        volume_map[mount['Name']] = new_volume
+            finally:
+                if running:
+                    resumed = subprocess.run(['podman', 'unpause', *running], capture_output=True, text=True)
+                    if resumed.returncode != 0:
+                        logger.error(f"Failed to unpause {stack_name}: {resumed.stderr.strip()}")
+
+            port = self._allocate_port()
+            main_name = None
+            for name, info in inspected.items():
+                source_name = info.get('Name') or name
+                new_name = source_name.replace(stack_name, clone_name, 1)
+                if new_name == source_name:
+                    new_name = clone_name
+                command = ['podman', 'create', '--name', new_name]
+                for env in info.get('Config', {}).get('Env', []):
+                    command.extend(['--env', env])
+                for mount in info.get('Mounts', []):
+                    if mount.get('Type') == 'volume':
+                        command.extend(['-v', f"{volume_map[mount['Name']]}:{mount['Destination']}"])
+                if self._is_container(container.container_id, name, info):
+                    main_name = new_name
+                    if container.port:
+                        command.extend(['-p', f"{port}:{container.port}"])
+                command.append(info.get('ImageName') or info['Image'])
+                subprocess.run(command, check=True, capture_output=True)
+                created_containers.append(new_name)
+
+            for name in created_containers:
+                subprocess.run(['podman', 'start', name], check=True, capture_output=True)
+
+        except Exception as e:
+            logger.error(f"Failed to clone stack {stack_name}: {str(e)}")
+            for name in created_containers:
+                subprocess.run(['podman', 'rm', '-f', name], capture_output=True)
+            for volume in created_volumes:
+                subprocess.run(['podman', 'volume', 'rm', '-f', volume], capture_output=True)
+            return None, f"Clone failed: {str(e)}"
+
+        logger.info(
+            f"Cloned {stack_name} to {clone_name}: {stats['reflinked']} files reflinked, "
+            f"{stats['copied']} copied ({stats['bytes_copied']} bytes)"
+        )
+
+        clone_environment = dict(environment)
+        clone_environment.update({
+            'stack_name': clone_name,
+            'cloned_from': container.id,
+            'volumes': list(volume_map.values()),
+        })
+        clone = Container(
+            container_id=main_name or created_containers[0],
+            name=clone_name,
+            status='running',
+            user_id=container.user_id,
+            service_id=service.id,
+            port=port,
+            domain=f"{clone_name}.{self.staging_domain}",
+            parent_id=container.id,
+            environment=clone_environment
+        )
+        return clone, "Staging copy created"
+
+    def _clone_name(self, stack_name: str) -> str:
+        names = self._container_names()
+        suffix = 1
+        while any(re.match(rf"{re.escape(stack_name)}-staging{suffix}(-|$)", name) for name in names):
+            suffix += 1
+        return f"{stack_name}-staging{suffix}"
+
+    @staticmethod
+    def _container_names() -> List[str]:
+        result = subprocess.run(['podman', 'ps', '-a', '--format', '{{.Names}}'],
+                                capture_output=True, text=True)
+        return result.stdout.split() if result.returncode == 0 else []
+
+    def _stack_containers(self, stack_name: str) -> List[str]:
+        """The stack's own containers, without the staging clones made from it"""
+        clone = re.compile(rf"{re.escape(stack_name)}-staging\d+(-|$)")
+        return [name for name in self._container_names()
+                if (name == stack_name or name.startswith(f"{stack_name}-")) and not clone.match(name)]
+
+    @staticmethod
+    def _is_container(reference: str, name: str, info: Dict[str, Any]) -> bool:
+        """Whether a stored container reference, a name or a (short) hex id, is this container"""
+        if not reference:
+            return False
+        return reference in (name, info.get('Name')) or info.get('Id', '').startswith(reference)
+
+    @staticmethod
+    def _inspect(name: str) -> Dict[str, Any]:
+        result = subprocess.run(['podman', 'inspect', name], capture_output=True, text=True, check=True)
+        return json.loads(result.stdout)[0]
+
+    @staticmethod
+    def _volume_mountpoint(volume: str) -> str:
+        result = subprocess.run(['podman', 'volume', 'inspect', '--format', '{{.Mountpoint}}', volume],
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+
+    @staticmethod
+    def _allocate_port() -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(('', 0))
+            return sock.getsockname()[1]
+
+
+# Create singleton instance
+stack_cloner = StackCloner()
@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, literal, union_all
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import Container, DailyStat, User
+
+logger = logging.getLogger(__name__)
+
+
+def _as_date(value) -> date:
+    # func.date() returns a date on PostgreSQL and an ISO string on SQLite
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _daily_counts(since: Optional[date], until: date) -> Dict[date, List[int]]:
+    """Signups and containers running now by creation day, from a single grouped query"""
+    end = datetime.combine(until + timedelta(days=1), time.min)
+    user_day = func.date(User.created_at)
+    container_day = func.date(Container.created_at)
+
+    users = db.select(literal(0).label('kind'), user_day.label('day'), func.count().label('total')) \
+        .where(User.created_at < end)
+    containers = db.select(literal(1), container_day, func.count()) \
+        .where(Container.status == 'running', Container.created_at < end)
+    if since:
+        start = datetime.combine(since, time.min)
+        users = users.where(User.created_at >= start)
+        containers = containers.where(Container.created_at >= start)
+
+    counts: Dict[date, List[int]] = {}
+    rows = db.session.execute(union_all(users.group_by(user_day), containers.group_by(container_day)))
+    for kind, day, total in rows:
+        counts.setdefault(_as_date(day), [0, 0])[kind] = total
+    return counts
+
+
+class StatsRollup:
+    """Maintain one DailyStat row per finished day
+
+    Each run only rolls up the days after the newest stored row, so the cost
+    depends on how long the job was idle rather than on the size of the user
+    table. Charts then read any range with a single indexed query.
+
+    ``running_containers`` is a snapshot taken when the row is written: the
+    containers running at that moment that already existed on the day. Rows
+    are never rewritten, so with the job running daily each row keeps the
+    count from the end of its day.
+    """
+
+    def __init__(self):
+        self.interval = int(os.environ.get('STATS_ROLLUP_INTERVAL', 3600))
+        self._thread = None
+        self._stop = threading.Event()
+
+    def rollup(self, until: Optional[date] = None) -> int:
+        """Write rows for every finished day not rolled up yet, returns how many were added"""
+        until = until or datetime.utcnow().date() - timedelta(days=1)
+        last = DailyStat.query.order_by(DailyStat.day.desc()).first()
+        if last and last.day >= until:
+            return 0
+
+        since = last.day + timedelta(days=1) if last else None
+        counts = _daily_counts(since, until)
+        if since is None:
+            since = min(counts) if counts else until
+            since = min(since, until)
+
+        total_users = last.total_users if last else 0
+        # Counted from current state rather than carried over from the last
+        # row, which would never drop containers that have stopped since
+        running = Container.query.filter(
+            Container.status == 'running',
+            Container.created_at < datetime.combine(since, time.min)
+        ).count()
+        rows = []
+        day = since
+        while day <= until:
+            signups, started = counts.get(day, (0, 0))
+            total_users += signups
+            running += started
+            rows.append({'day': day, 'signups': signups, 'total_users': total_users,
+                         'running_containers': running, 'created_at': datetime.utcnow()})
+            day += timedelta(days=1)
+
+        try:
+            db.session.execute(db.insert(DailyStat), rows)
+            db.session.commit()
+        except IntegrityError:
+            # Another worker rolled up the same days first
+            db.session.rollback()
+            return 0
+        logger.info(f"Rolled up daily stats for {len(rows)} day(s) up to {until}")
+        return len(rows)
+
+    def series(self, days: int = 7) -> Tuple[List[DailyStat], date, date]:
+        """Rows for the ``days`` finished days ending yesterday, oldest first"""
+        end = datetime.utcnow().date() - timedelta(days=1)
+        start = end - timedelta(days=days - 1)
+        query = DailyStat.query.filter(DailyStat.day.between(start, end)).order_by(DailyStat.day)
+        rows = query.all()
+        if not rows or rows[-1].day < end:
+            # The job has not caught up yet, fill the gap before answering
+            self.rollup(end)
+            rows = query.all()
+        return rows, start, end
+
+    def start(self, app) -> None:
+        """Keep the rollup current from a background thread"""
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, args=(app,), name='stats-rollup', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, app) -> None:
+        while not self._stop.is_set():
+            with app.app_context():
+                try:
+                    self.rollup()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Daily stats rollup failed: {str(e)}")
+                finally:
+                    db.session.remove()
+            self._stop.wait(self.interval)
+
+
+# Create singleton instance
+stats_rollup = StatsRollup()
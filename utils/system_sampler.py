@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class SystemSampler:
+    """CPU, memory, disk and network usage sampled in the background
+
+    ``psutil.cpu_percent(interval=1)`` blocks its caller for a second; here
+    a daemon thread per process takes a non-blocking sample every
+    ``SYSTEM_SAMPLE_INTERVAL`` seconds (CPU is measured since the previous
+    sample) into a ring buffer of ``SYSTEM_SAMPLE_HISTORY`` entries, so
+    health endpoints read the latest sample or a window of them from memory.
+    Without the thread (scripts, or an interval of 0) a read samples inline
+    when the latest sample is older than the interval.
+    """
+
+    def __init__(self):
+        self.interval = float(os.environ.get('SYSTEM_SAMPLE_INTERVAL', 2))
+        self.history = int(os.environ.get('SYSTEM_SAMPLE_HISTORY', 300))
+        self.disk_path = os.environ.get('SYSTEM_SAMPLE_DISK_PATH', '/')
+        self.boot_time = psutil.boot_time()
+        self._samples: deque = deque(maxlen=self.history)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        # The first non-blocking reading only starts the measurement
+        psutil.cpu_percent(interval=None)
+
+    def sample(self) -> Dict:
+        """Take a sample now and add it to the buffer"""
+        with self._lock:
+            now = time.time()
+            memory = psutil.virtual_memory()
+            disk = psutil.disk_usage(self.disk_path)
+            network = psutil.net_io_counters()
+            previous = self._samples[-1] if self._samples else None
+            elapsed = now - previous['timestamp'] if previous else 0
+
+            sample = {
+                'timestamp': now,
+                'cpu': psutil.cpu_percent(interval=None),
+                'memory': memory.percent,
+                'memory_used': memory.used,
+                'memory_total': memory.total,
+                'load': os.getloadavg() if hasattr(os, 'getloadavg') else None,
+                'disk': {
+                    'total': disk.total,
+                    'used': disk.used,
+                    'free': disk.free,
+                    'percent': disk.percent
+                },
+                'network': {
+                    'bytes_sent': network.bytes_sent,
+                    'bytes_recv': network.bytes_recv,
+                    'sent_per_sec': round((network.bytes_sent - previous['network']['bytes_sent']) / elapsed)
+                    if elapsed > 0 else 0,
+                    'recv_per_sec': round((network.bytes_recv - previous['network']['bytes_recv']) / elapsed)
+                    if elapsed > 0 else 0,
+                }
+            }
+            self._samples.append(sample)
+            return sample
+
+    def latest(self) -> Dict:
+        """The most recent sample"""
+        sample = self._samples[-1] if self._samples else None
+        if sample is None or (self._thread is None and time.time() - sample['timestamp'] >= self.interval):
+            sample = self.sample()
+        return sample
+
+    def window(self, seconds: float) -> List[Dict]:
+        """Samples from the last ``seconds``, oldest first"""
+        self.latest()
+        since = time.time() - seconds
+        return [sample for sample in list(self._samples) if sample['timestamp'] >= since]
+
+    def uptime(self) -> float:
+        return time.time() - self.boot_time
+
+    def start(self) -> None:
+        """Sample from a background thread"""
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name='system-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"System sampling failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+
+# Create singleton instance
+system_sampler = SystemSampler()
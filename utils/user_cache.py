@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from database import db, use_primary
+from models import User
+from utils.version_stamp import VersionStamp
+
+logger = logging.getLogger(__name__)
+
+# Changing any of these bumps User.auth_version
+SECURITY_FIELDS = ('password_hash', 'two_factor_enabled', 'two_factor_secret', 'is_admin')
+_EVICT_KEY = 'user_cache_evict'
+
+
+@event.listens_for(User, 'before_update')
+def _bump_auth_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in SECURITY_FIELDS):
+        target.auth_version = (target.auth_version or 0) + 1
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _queue_eviction(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_EVICT_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_committed(session):
+    # Evict only once the change is visible to the other workers
+    user_ids = session.info.pop(_EVICT_KEY, None)
+    if user_ids:
+        user_cache.evict(user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_evictions(session):
+    session.info.pop(_EVICT_KEY, None)
+
+
+class UserCache:
+    """Identity cache behind the Flask-Login user_loader
+
+    Cached users are kept detached and merged into the request's session
+    without a SELECT. A worker that updates or deletes a user evicts it at
+    commit and bumps a shared version stamp; the other workers then check
+    the ``auth_version`` of everything they cache in one query and drop any
+    entry whose version moved, so a changed password, 2FA setting or admin
+    flag is never served from cache. Entries also expire after
+    ``USER_CACHE_TTL`` seconds, which bounds staleness of other profile fields
+    and of workers on other hosts.
+    """
+
+    def __init__(self):
+        self.ttl = int(os.environ.get('USER_CACHE_TTL', 60))
+        self.max_size = int(os.environ.get('USER_CACHE_SIZE', 10000))
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = VersionStamp('users')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+
+    def get(self, user_id: int) -> Optional[User]:
+        """Return the user attached to the current session, from cache when possible"""
+        self._revalidate()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+
+        if entry:
+            return db.session.merge(entry[0], load=False)
+
+        # A replica could still hold the credentials from before a change
+        with use_primary():
+            user = db.session.get(User, user_id)
+        if user is not None:
+            self._store(user)
+        return user
+
+    def _store(self, user: User) -> None:
+        template = User()
+        for attr in inspect(User).column_attrs:
+            setattr(template, attr.key, getattr(user, attr.key))
+        make_transient_to_detached(template)
+        with self._lock:
+            self._entries[user.id] = (template, time.monotonic())
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _revalidate(self) -> None:
+        if not self._stamp.changed():
+            return
+        with self._lock:
+            cached = {user_id: entry[0].auth_version for user_id, entry in self._entries.items()}
+        if not cached:
+            return
+
+        self.revalidations += 1
+        current: Dict[int, int] = {}
+        ids = list(cached)
+        with use_primary():
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                current.update(db.session.query(User.id, User.auth_version).filter(User.id.in_(chunk)))
+
+        stale = [user_id for user_id, version in cached.items() if current.get(user_id) != version]
+        self._drop(stale)
+        if stale:
+            logger.debug(f"Dropped {len(stale)} stale cached user(s)")
+
+    def _drop(self, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                if self._entries.pop(user_id, None) is not None:
+                    self.evictions += 1
+
+    def evict(self, user_ids: Iterable[int]) -> None:
+        """Drop users here and make every other worker recheck its entries"""
+        self._drop(user_ids)
+        self._stamp.bump()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'revalidations': self.revalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Create singleton instance
+user_cache = UserCache()
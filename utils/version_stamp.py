@@ -0,0 +1,71 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STAMP_DIR = os.environ.get('CACHE_STAMP_DIR', os.path.join(tempfile.gettempdir(), 'portal-cache-stamps'))
+
+
+class VersionStamp:
+    """A version shared by every worker process on this host
+
+    ``bump`` atomically replaces a small file; readers compare its inode and
+    mtime with the last value they saw. Checks are throttled to one ``stat``
+    per ``check_interval`` seconds, so a cache guarded by a stamp costs a dict
+    lookup on almost every read and sees other workers' writes within that
+    interval. A bump in this process is seen immediately.
+    """
+
+    def __init__(self, name: str, check_interval: float = 1.0, directory: Optional[str] = None):
+        self.path = os.path.join(directory or STAMP_DIR, f"{name}.version")
+        self.check_interval = check_interval
+        self._seen: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _read(self) -> Tuple[int, int]:
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_mtime_ns
+        except FileNotFoundError:
+            return 0, 0
+
+    def changed(self) -> bool:
+        """Whether the stamp moved since this process last saw it"""
+        now = time.monotonic()
+        if self._seen is not None and now - self._checked_at < self.check_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            current = self._read()
+            if current == self._seen:
+                return False
+            self._seen = current
+            return True
+
+    def modified_at(self) -> Optional[datetime]:
+        """When the stamp was last bumped, as naive UTC, None if it never was"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+        return datetime.fromtimestamp(mtime, timezone.utc).replace(tzinfo=None)
+
+    def bump(self) -> None:
+        """Tell every worker that the guarded data changed"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w') as f:
+                f.write(f"{os.getpid()} {time.time()}\n")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"Failed to bump version stamp {self.path}: {str(e)}")
+        with self._lock:
+            # Force the next read in this process to reload
+            self._seen = None